@@ -0,0 +1,180 @@
+"""Event analytics: handler menulis event ringkas ke stream capped, lalu
+aggregator di background menggulungnya ke bucket per menit/jam/hari.
+
+Dashboard dan /adminstats cukup membaca hash rollup (plus HyperLogLog user
+unik per bucket), tanpa KEYS/SCAN ke key mentah.
+
+Event: search_started, matched, message_relayed, stopped, premium_granted.
+Rollup at-least-once: kalau proses mati setelah rollup ditulis tapi sebelum
+ACK, batch itu bisa terhitung dua kali.
+"""
+import time
+import asyncio
+import logging
+from collections import Counter, defaultdict
+from typing import Optional, List, Tuple
+from config import (
+    ANALYTICS_ENABLED, ANALYTICS_STREAM_MAXLEN, ANALYTICS_BATCH_SIZE,
+    ANALYTICS_POLL_INTERVAL, ANALYTICS_CONSUMER
+)
+from utils import r
+from breaker import StorageUnavailable
+from keyschema import ANALYTICS_STREAM, rollup_key, rollup_users_key
+from streams import ensure_group, GroupReader
+
+logger = logging.getLogger(__name__)
+
+STREAM = ANALYTICS_STREAM
+GROUP = "analytics"
+
+EVENTS = ("search_started", "matched", "message_relayed", "stopped", "premium_granted")
+
+# period -> (format bucket UTC, panjang bucket detik, TTL rollup detik)
+PERIODS = {
+    "minute": ("%Y%m%d%H%M", 60, 2 * 86400),
+    "hour": ("%Y%m%d%H", 3600, 35 * 86400),
+    "day": ("%Y%m%d", 86400, 400 * 86400),
+}
+
+def bucket_for(period: str, ts: float) -> str:
+    return time.strftime(PERIODS[period][0], time.gmtime(ts))
+
+# --- emit (dipanggil dari handler) ---
+def emit(event: str, user_id: int, **fields):
+    """Tulis satu event ke stream (field None dibuang).
+
+    Best-effort: error tidak boleh ganggu handler.
+    """
+    if not ANALYTICS_ENABLED:
+        return
+    try:
+        emit_to(r, event, user_id, **fields)
+    except Exception as e:
+        logger.debug(f"Gagal menulis event analytics {event}: {e}")
+
+def emit_to(pipe, event: str, user_id: int, **fields):
+    """Antrikan event ke pipeline milik pemanggil (tanpa round-trip sendiri)"""
+    if not ANALYTICS_ENABLED:
+        return
+    fields = {name: value for name, value in fields.items() if value is not None}
+    pipe.xadd(STREAM, {"e": event, "u": user_id, **fields},
+              maxlen=ANALYTICS_STREAM_MAXLEN, approximate=True)
+
+def seconds_since(started) -> Optional[int]:
+    """Detik sejak timestamp (string/int dari Redis), None kalau tidak ada"""
+    return max(0, int(time.time()) - int(started)) if started else None
+
+# --- aggregator ---
+def rollup_entries(entries: List[tuple]) -> int:
+    """Gulung batch entry stream ke semua bucket dalam satu pipeline"""
+    counters = defaultdict(Counter)
+    users = defaultdict(set)
+
+    for entry_id, fields in entries:
+        if not fields:
+            continue
+        event = fields.get("e")
+        if event not in EVENTS:
+            continue
+        # Timestamp diambil dari ID stream (ms), tidak perlu field ts
+        ts = int(entry_id.split("-")[0]) / 1000
+        for period in PERIODS:
+            bucket = bucket_for(period, ts)
+            counter = counters[(period, bucket)]
+            counter[event] += 1
+            if event == "matched" and fields.get("w"):
+                counter["match_wait_seconds"] += int(fields["w"])
+                counter["matches_timed"] += 1
+            elif event == "stopped" and fields.get("d"):
+                counter["chat_seconds"] += int(fields["d"])
+                counter["chats_timed"] += 1
+            users[(period, bucket)].add(fields.get("u"))
+            if fields.get("p"):
+                users[(period, bucket)].add(fields["p"])
+
+    if not counters:
+        return 0
+
+    pipe = r.pipeline(transaction=False)
+    for (period, bucket), counter in counters.items():
+        ttl = PERIODS[period][2]
+        key = rollup_key(period, bucket)
+        for field, amount in counter.items():
+            pipe.hincrby(key, field, amount)
+        pipe.expire(key, ttl)
+        members = users[(period, bucket)] - {None}
+        if members:
+            users_key = rollup_users_key(period, bucket)
+            pipe.pfadd(users_key, *members)
+            pipe.expire(users_key, ttl)
+    pipe.execute()
+    return len(counters)
+
+async def run_analytics_aggregator(consumer: str = ANALYTICS_CONSUMER):
+    """Consumer stream analytics: rollup per batch, lalu ACK"""
+    ensure_group(STREAM, GROUP)
+    reader = GroupReader(STREAM, GROUP, consumer, ANALYTICS_BATCH_SIZE)
+
+    while True:
+        try:
+            entries = reader.read()
+            if entries:
+                rollup_entries(entries)
+                r.xack(STREAM, GROUP, *(entry_id for entry_id, _ in entries))
+        except Exception as e:
+            log = logger.debug if isinstance(e, StorageUnavailable) else logger.warning
+            log(f"Gagal memproses stream analytics: {e}")
+            await asyncio.sleep(ANALYTICS_POLL_INTERVAL)
+            continue
+
+        if reader.idle(entries):
+            await asyncio.sleep(ANALYTICS_POLL_INTERVAL)
+        else:
+            # Beri kesempatan handler lain jalan di antara batch besar
+            await asyncio.sleep(0)
+
+# --- query rollup ---
+def _parse_rollup(counts: dict, unique_users: int) -> dict:
+    rollup = {event: 0 for event in EVENTS}
+    rollup.update({field: int(value) for field, value in counts.items()})
+    rollup["users"] = unique_users
+    timed = rollup.get("chats_timed", 0)
+    rollup["avg_chat_seconds"] = round(rollup.get("chat_seconds", 0) / timed, 1) if timed else 0
+    timed = rollup.get("matches_timed", 0)
+    rollup["avg_match_seconds"] = round(rollup.get("match_wait_seconds", 0) / timed, 1) if timed else 0
+    return rollup
+
+def get_series(period: str, count: int, ts: Optional[float] = None) -> List[Tuple[str, dict]]:
+    """Rollup `count` bucket terakhir (terlama dulu), dibaca dengan satu pipeline"""
+    ts = time.time() if ts is None else ts
+    step = PERIODS[period][1]
+    buckets = [bucket_for(period, ts - step * i) for i in reversed(range(count))]
+
+    pipe = r.pipeline(transaction=False)
+    for bucket in buckets:
+        pipe.hgetall(rollup_key(period, bucket))
+        pipe.pfcount(rollup_users_key(period, bucket))
+    results = pipe.execute()
+    return [
+        (bucket, _parse_rollup(results[2 * i], results[2 * i + 1]))
+        for i, bucket in enumerate(buckets)
+    ]
+
+def get_rollup(period: str, ts: Optional[float] = None) -> dict:
+    """Rollup satu bucket (default: bucket saat ini)"""
+    return get_series(period, 1, ts)[0][1]
+
+def get_summary() -> dict:
+    """Ringkasan untuk /adminstats: hari ini (UTC) + satu jam terakhir"""
+    today = get_rollup("day")
+    last_hour = get_series("minute", 60)
+    return {
+        "dau": today["users"],
+        "matches_today": today["matched"],
+        "messages_today": today["message_relayed"],
+        "premium_today": today["premium_granted"],
+        "avg_chat_seconds": today["avg_chat_seconds"],
+        "avg_match_seconds": today["avg_match_seconds"],
+        "messages_last_hour": sum(rollup["message_relayed"] for _, rollup in last_hour),
+        "searches_last_hour": sum(rollup["search_started"] for _, rollup in last_hour),
+    }
@@ -0,0 +1,387 @@
+"""Backup & restore state bot (key milik bot saja, bukan seluruh instance Redis).
+
+Dump membaca key dengan SCAN + pipeline per batch, per tipe (string, hash,
+list, set, zset, stream + consumer group), lalu menulis file berformat:
+
+    MAGIC, satu baris JSON header,
+    frame: [panjang terkompresi u32][jumlah record u32][record... (zlib)],
+    frame kosong (0, 0) sebagai penanda file lengkap.
+
+Record: [tipe u8][pttl i64][first u8][jumlah item u32][key][item...], tiap
+bytes diawali panjang u32. Key besar dipecah jadi beberapa record (first=0
+untuk lanjutan), jadi memori dibatasi ukuran chunk, bukan ukuran dataset.
+
+TTL disimpan sebagai sisa waktu saat dump. Restore menghapus key tujuan
+sebelum record pertamanya, menulis dengan pipeline per chunk, lalu PEXPIRE.
+Entry pending consumer group stream tidak ikut (group lanjut dari
+last-delivered-id).
+
+Tanpa --prefix/--tenant, dump juga mencakup key semua bot di BOT_TOKENS
+(prefix "<nama>:" dari multibot.py). Tenant yang tidak lagi ada di
+BOT_TOKENS harus di-dump dengan --tenant.
+
+Contoh:
+    python backup.py dump state.scb
+    python backup.py restore state.scb --redis-url redis://localhost:6380/0
+    python backup.py restore state.scb --dry-run
+"""
+import sys
+import zlib
+import json
+import time
+import struct
+import argparse
+from collections import Counter
+
+import redis
+from config import REDIS_URL, STORAGE_BACKEND, KEY_SCHEMA, BOT_TOKENS
+from keyschema import BOT_KEY_PREFIXES
+
+MAGIC = b"SCBAK1\n"
+SCAN_COUNT = 1000
+BATCH_SIZE = 1000
+BIG_KEY = 1000  # key dengan item lebih banyak dibaca bertahap (HSCAN/SSCAN/...)
+CHUNK_BYTES = 1 << 20
+
+STRING, HASH, LIST, SET, ZSET, STREAM, GROUPS = range(1, 8)
+TYPES = {"string": STRING, "hash": HASH, "list": LIST, "set": SET, "zset": ZSET, "stream": STREAM}
+TYPE_NAMES = {code: name for name, code in TYPES.items()}
+TYPE_NAMES[GROUPS] = "stream_group"
+
+_FRAME = struct.Struct(">II")
+_RECORD = struct.Struct(">BqBI")
+_LEN = struct.Struct(">I")
+
+def connect(url: str):
+    """Client tanpa decode: value disalin apa adanya (termasuk HyperLogLog)"""
+    if STORAGE_BACKEND == "memory":
+        raise SystemExit("Backup butuh Redis (STORAGE_BACKEND=memory tidak menyimpan apa pun)")
+    if STORAGE_BACKEND == "cluster":
+        return redis.RedisCluster.from_url(url)
+    return redis.from_url(url)
+
+# --- format file ---
+class ChunkWriter:
+    def __init__(self, f, level: int, stats: Counter):
+        self.f = f
+        self.level = level
+        self.stats = stats
+        self.buf = bytearray()
+        self.count = 0
+
+    def add(self, kind: int, key: bytes, pttl: int, first: bool, items: list):
+        buf = self.buf
+        buf += _RECORD.pack(kind, pttl, first, len(items))
+        buf += _LEN.pack(len(key))
+        buf += key
+        for item in items:
+            buf += _LEN.pack(len(item))
+            buf += item
+        self.count += 1
+        self.stats[TYPE_NAMES[kind]] += first or kind == GROUPS
+        self.stats["keys"] += first and kind != GROUPS
+        if len(buf) >= CHUNK_BYTES:
+            self.flush()
+
+    def flush(self):
+        if not self.count:
+            return
+        data = zlib.compress(bytes(self.buf), self.level)
+        self.f.write(_FRAME.pack(len(data), self.count))
+        self.f.write(data)
+        self.stats["records"] += self.count
+        self.stats["raw_bytes"] += len(self.buf)
+        self.stats["file_bytes"] += _FRAME.size + len(data)
+        self.buf.clear()
+        self.count = 0
+
+    def close(self):
+        self.flush()
+        self.f.write(_FRAME.pack(0, 0))
+
+def read_header(f) -> dict:
+    if f.read(len(MAGIC)) != MAGIC:
+        raise SystemExit("Bukan file backup ShadowChat")
+    return json.loads(f.readline())
+
+def read_chunks(f):
+    """Yield list record (kind, key, pttl, first, items) per chunk"""
+    while True:
+        head = f.read(_FRAME.size)
+        if len(head) < _FRAME.size:
+            raise SystemExit("File backup terpotong (penanda akhir tidak ada)")
+        size, count = _FRAME.unpack(head)
+        if not size:
+            return
+        data = zlib.decompress(f.read(size))
+        yield _parse_records(data, count)
+
+def _parse_records(data: bytes, count: int) -> list:
+    records, pos = [], 0
+    view = memoryview(data)
+    for _ in range(count):
+        kind, pttl, first, n = _RECORD.unpack_from(data, pos)
+        pos += _RECORD.size
+        fields = []
+        for _ in range(n + 1):  # key + item
+            (length,) = _LEN.unpack_from(data, pos)
+            pos += _LEN.size
+            fields.append(bytes(view[pos:pos + length]))
+            pos += length
+        records.append((kind, fields[0], pttl, first, fields[1:]))
+    return records
+
+# --- dump ---
+def _flatten(pairs) -> list:
+    items = []
+    for a, b in pairs:
+        items.append(a)
+        items.append(b)
+    return items
+
+def _zset_items(entries) -> list:
+    return _flatten((member, repr(score).encode()) for member, score in entries)
+
+def _stream_items(entries) -> list:
+    items = []
+    for entry_id, fields in entries:
+        items.append(entry_id)
+        items.append(str(len(fields)).encode())
+        items.extend(_flatten(fields.items()))
+    return items
+
+def _group_items(groups) -> list:
+    return _flatten((group["name"], group["last-delivered-id"]) for group in groups)
+
+_SIZE = {HASH: "hlen", LIST: "llen", SET: "scard", ZSET: "zcard", STREAM: "xlen"}
+
+def _dump_big(client, writer: ChunkWriter, kind: int, key: bytes, pttl: int):
+    """Key besar: baca dan tulis per BIG_KEY item"""
+    first = True
+
+    def emit(items):
+        nonlocal first
+        writer.add(kind, key, pttl, first, items)
+        first = False
+
+    if kind == LIST:
+        start = 0
+        while True:
+            values = client.lrange(key, start, start + BIG_KEY - 1)
+            if values:
+                emit(values)
+            if len(values) < BIG_KEY:
+                break
+            start += BIG_KEY
+    elif kind == STREAM:
+        low = "-"
+        while True:
+            entries = client.xrange(key, min=low, count=BIG_KEY)
+            if entries:
+                emit(_stream_items(entries))
+                low = b"(" + entries[-1][0]
+            if len(entries) < BIG_KEY:
+                break
+        groups = client.xinfo_groups(key)
+        if groups:
+            writer.add(GROUPS, key, pttl, first, _group_items(groups))
+    else:
+        scan = {HASH: client.hscan_iter, SET: client.sscan_iter, ZSET: client.zscan_iter}[kind]
+        batch = []
+        for item in scan(key, count=BIG_KEY):
+            batch.append(item)
+            if len(batch) >= BIG_KEY:
+                emit(_encode_scan(kind, batch))
+                batch = []
+        if batch:
+            emit(_encode_scan(kind, batch))
+
+def _encode_scan(kind: int, batch: list) -> list:
+    if kind == HASH:
+        return _flatten(batch)
+    if kind == ZSET:
+        return _zset_items(batch)
+    return batch
+
+def _dump_batch(client, writer: ChunkWriter, keys: list, stats: Counter):
+    pipe = client.pipeline(transaction=False)
+    for key in keys:
+        pipe.type(key)
+        pipe.pttl(key)
+    meta = pipe.execute()
+
+    # Ukuran dulu, supaya key besar tidak dibaca sekaligus
+    entries = []
+    pipe = client.pipeline(transaction=False)
+    for i, key in enumerate(keys):
+        kind = TYPES.get(meta[2 * i].decode())
+        if kind is None:
+            if meta[2 * i] != b"none":
+                stats["skipped"] += 1
+            continue
+        pttl = meta[2 * i + 1]
+        entries.append((key, kind, pttl if pttl > 0 else -1))
+        if kind == STRING:
+            pipe.get(key)
+        else:
+            getattr(pipe, _SIZE[kind])(key)
+    first_read = pipe.execute()
+
+    small = []
+    pipe = client.pipeline(transaction=False)
+    for (key, kind, pttl), value in zip(entries, first_read):
+        if kind == STRING:
+            if value is not None:
+                writer.add(STRING, key, pttl, True, [value])
+        elif value > BIG_KEY:
+            _dump_big(client, writer, kind, key, pttl)
+        else:
+            small.append((key, kind, pttl))
+            if kind == HASH:
+                pipe.hgetall(key)
+            elif kind == LIST:
+                pipe.lrange(key, 0, -1)
+            elif kind == SET:
+                pipe.smembers(key)
+            elif kind == ZSET:
+                pipe.zrange(key, 0, -1, withscores=True)
+            else:
+                pipe.xrange(key)
+                pipe.xinfo_groups(key)
+    results = iter(pipe.execute() if small else [])
+
+    for key, kind, pttl in small:
+        value = next(results)
+        if kind == HASH:
+            items = _flatten(value.items())
+        elif kind == ZSET:
+            items = _zset_items(value)
+        elif kind == STREAM:
+            items = _stream_items(value)
+            groups = next(results)
+            writer.add(STREAM, key, pttl, True, items)
+            if groups:
+                writer.add(GROUPS, key, pttl, False, _group_items(groups))
+            continue
+        else:
+            items = list(value)
+        # Key yang habis di antara dua pipeline tidak ditulis
+        if items:
+            writer.add(kind, key, pttl, True, items)
+
+def dump(client, path: str, prefixes, level: int) -> Counter:
+    stats = Counter()
+    prefixes = tuple(prefix.encode() for prefix in prefixes)
+    header = {"version": 1, "created": int(time.time()), "key_schema": KEY_SCHEMA}
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(json.dumps(header).encode() + b"\n")
+        writer = ChunkWriter(f, level, stats)
+        batch = []
+        # SCAN bisa mengembalikan key yang sama dua kali; restore-nya idempoten
+        for key in client.scan_iter(count=SCAN_COUNT):
+            if not key.startswith(prefixes):
+                continue
+            batch.append(key)
+            if len(batch) >= BATCH_SIZE:
+                _dump_batch(client, writer, batch, stats)
+                batch = []
+        if batch:
+            _dump_batch(client, writer, batch, stats)
+        writer.close()
+    return stats
+
+# --- restore ---
+def _restore_record(pipe, kind: int, key: bytes, items: list):
+    if kind == STRING:
+        pipe.set(key, items[0])
+    elif kind == HASH:
+        pipe.hset(key, mapping=dict(zip(items[0::2], items[1::2])))
+    elif kind == LIST:
+        pipe.rpush(key, *items)
+    elif kind == SET:
+        pipe.sadd(key, *items)
+    elif kind == ZSET:
+        pipe.zadd(key, {member: float(score) for member, score in zip(items[0::2], items[1::2])})
+    elif kind == STREAM:
+        pos = 0
+        while pos < len(items):
+            entry_id, n = items[pos], int(items[pos + 1])
+            fields = items[pos + 2: pos + 2 + 2 * n]
+            pipe.xadd(key, dict(zip(fields[0::2], fields[1::2])), id=entry_id)
+            pos += 2 + 2 * n
+    elif kind == GROUPS:
+        for name, last_id in zip(items[0::2], items[1::2]):
+            pipe.xgroup_create(key, name, id=last_id, mkstream=True)
+
+def restore(client, path: str, dry_run: bool) -> Counter:
+    stats = Counter()
+    with open(path, "rb") as f:
+        header = read_header(f)
+        if header.get("key_schema") != KEY_SCHEMA:
+            print(f"⚠️ Backup memakai KEY_SCHEMA={header.get('key_schema')}, "
+                  f"bot sekarang {KEY_SCHEMA} (jalankan migrate_keys.py setelah restore)")
+        for records in read_chunks(f):
+            pipe = client.pipeline(transaction=False)
+            for kind, key, pttl, first, items in records:
+                stats["records"] += 1
+                stats[TYPE_NAMES[kind]] += first or kind == GROUPS
+                stats["keys"] += first and kind != GROUPS
+                if dry_run:
+                    continue
+                if first:
+                    pipe.delete(key)
+                _restore_record(pipe, kind, key, items)
+                if pttl > 0:
+                    pipe.pexpire(key, pttl)
+            if len(pipe):
+                pipe.execute()
+        stats["file_bytes"] = f.tell()
+    return stats
+
+def report(action: str, stats: Counter, elapsed: float):
+    keys = stats.pop("keys", 0)
+    size = stats.pop("file_bytes", 0)
+    raw = stats.pop("raw_bytes", 0)
+    rate = keys / elapsed if elapsed else 0
+    print(f"{action}: {keys} key dalam {elapsed:.2f} s ({rate:,.0f} key/s, "
+          f"{size / 1e6 / elapsed if elapsed else 0:.1f} MB/s file)")
+    if raw:
+        print(f"  file {size / 1e6:.1f} MB, data {raw / 1e6:.1f} MB (rasio {raw / max(1, size):.1f}x)")
+    for name, count in sorted(stats.items()):
+        print(f"  {name}: {count}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backup & restore state ShadowChat")
+    parser.add_argument("--redis-url", default=REDIS_URL)
+    sub = parser.add_subparsers(dest="action", required=True)
+
+    dump_parser = sub.add_parser("dump", help="tulis key milik bot ke file")
+    dump_parser.add_argument("path")
+    dump_parser.add_argument("--prefix", action="append", help="batasi prefix key (default: semua milik bot)")
+    dump_parser.add_argument("--tenant", help="hanya key bot ini di proses multibot (prefix \"<tenant>:\")")
+    dump_parser.add_argument("--level", type=int, default=1, help="level zlib (1 cepat .. 9 kecil)")
+
+    restore_parser = sub.add_parser("restore", help="tulis isi file ke Redis")
+    restore_parser.add_argument("path")
+    restore_parser.add_argument("--dry-run", action="store_true", help="baca & validasi saja, tanpa menulis")
+    args = parser.parse_args(argv)
+
+    client = connect(args.redis_url)
+    started = time.perf_counter()
+    if args.action == "dump":
+        prefixes = args.prefix or BOT_KEY_PREFIXES
+        if args.tenant:
+            prefixes = [f"{args.tenant}:{prefix}" for prefix in prefixes]
+        elif not args.prefix and BOT_TOKENS:
+            # Proses multibot: key tiap bot ada di bawah "<nama>:" (tenancy.py)
+            prefixes = [*prefixes, *(f"{tenant}:{prefix}" for tenant in BOT_TOKENS for prefix in prefixes)]
+            print(f"Dump termasuk key bot: {', '.join(BOT_TOKENS)}")
+        stats = dump(client, args.path, prefixes, args.level)
+    else:
+        stats = restore(client, args.path, args.dry_run)
+    report("Dump" if args.action == "dump" else "Restore", stats, time.perf_counter() - started)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,166 @@
+"""Circuit breaker untuk storage + state mode degraded.
+
+Semua command lewat `r` (utils.py) melewati BreakerRedis. Error koneksi atau
+timeout (lihat REDIS_SOCKET_TIMEOUT) dihitung; setelah
+BREAKER_FAILURE_THRESHOLD error berturut-turut breaker terbuka dan command
+langsung gagal dengan StorageUnavailable tanpa menyentuh Redis, jadi handler
+tidak ikut menggantung. Setelah BREAKER_RESET_TIMEOUT detik command berikutnya
+menjadi probe (half-open): sukses menutup breaker, gagal membukanya lagi.
+
+Selama breaker terbuka bot jalan dalam mode degraded:
+- relay untuk pasangan aktif memakai partner_snapshot di memori,
+- rate limit fail-open/fail-closed sesuai DEGRADED_RATE_LIMIT,
+- /search dan command lain yang butuh storage ditolak dengan pesan ramah.
+"""
+import time
+import logging
+import functools
+from collections import Counter, OrderedDict
+from typing import Optional
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+from config import BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT, PARTNER_SNAPSHOT_MAX
+from storage import ClientProxy, PipelineProxy
+from tenancy import current_tenant
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+class StorageUnavailable(RedisConnectionError):
+    """Storage tidak bisa dipakai (breaker terbuka atau command gagal)"""
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.changed_at = time.monotonic()
+        self.last_error = None
+        self.stats = Counter()
+
+    def _set_state(self, state: str):
+        self.state = state
+        self.changed_at = time.monotonic()
+
+    def is_open(self) -> bool:
+        """True selama mode degraded (termasuk saat menunggu probe)"""
+        return self.state != CLOSED
+
+    def allow(self) -> bool:
+        if self.state == OPEN:
+            if time.monotonic() - self.changed_at < self.reset_timeout:
+                self.stats["rejected"] += 1
+                return False
+            self._set_state(HALF_OPEN)
+            self.stats["probes"] += 1
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        if self.state != CLOSED:
+            logger.info(f"Storage pulih setelah {time.monotonic() - self.changed_at:.1f} s, breaker ditutup")
+            self._set_state(CLOSED)
+            self.stats["recoveries"] += 1
+
+    def record_failure(self, error: Exception):
+        self.failures += 1
+        self.stats["failures"] += 1
+        self.last_error = f"{type(error).__name__}: {error}"
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+            if self.state == CLOSED:
+                logger.error(f"Storage gagal {self.failures}x berturut-turut, breaker dibuka: {self.last_error}")
+                self.stats["trips"] += 1
+            self._set_state(OPEN)
+
+    def get_stats(self) -> dict:
+        return {
+            "state": self.state,
+            "state_seconds": round(time.monotonic() - self.changed_at, 1),
+            "consecutive_failures": self.failures,
+            "last_error": self.last_error,
+            **self.stats
+        }
+
+def _guarded(breaker: CircuitBreaker, func, args: tuple, kwargs: dict):
+    if not breaker.allow():
+        raise StorageUnavailable("circuit breaker storage terbuka")
+    try:
+        result = func(*args, **kwargs)
+    except (RedisConnectionError, RedisTimeoutError) as e:
+        breaker.record_failure(e)
+        raise StorageUnavailable(str(e)) from e
+    breaker.record_success()
+    return result
+
+class _BreakerPipeline(PipelineProxy):
+    """Pipeline yang hanya execute()-nya melewati breaker (queue tidak ke jaringan)"""
+
+    def execute(self, *args, **kwargs):
+        return _guarded(self._parent._breaker, self._pipe.execute, args, kwargs)
+
+class BreakerRedis(ClientProxy):
+    """Proxy client storage: setiap command lewat circuit breaker"""
+    pipeline_class = _BreakerPipeline
+
+    def __init__(self, client, breaker: CircuitBreaker):
+        super().__init__(client)
+        self._breaker = breaker
+
+    def _call(self, name: str, func, args: tuple, kwargs: dict):
+        return _guarded(self._breaker, func, args, kwargs)
+
+class PartnerSnapshot:
+    """Pasangan aktif terakhir yang terlihat proses ini (LRU terbatas, per tenant)"""
+
+    def __init__(self, max_size: int = PARTNER_SNAPSHOT_MAX):
+        self.max_size = max_size
+        self.pairs = OrderedDict()
+
+    def remember(self, user_id: int, partner_id: Optional[int]):
+        key = (current_tenant(), user_id)
+        if partner_id is None:
+            self.pairs.pop(key, None)
+            return
+        self.pairs[key] = partner_id
+        self.pairs.move_to_end(key)
+        if len(self.pairs) > self.max_size:
+            self.pairs.popitem(last=False)
+
+    def get(self, user_id: int) -> Optional[int]:
+        return self.pairs.get((current_tenant(), user_id))
+
+    def forget(self, *user_ids: int):
+        tenant = current_tenant()
+        for user_id in user_ids:
+            self.pairs.pop((tenant, user_id), None)
+
+    def __len__(self):
+        return len(self.pairs)
+
+storage_breaker = CircuitBreaker()
+partner_snapshot = PartnerSnapshot()
+
+DEGRADED_TEXT = "🛠 Layanan sedang gangguan. Coba lagi beberapa saat."
+
+def storage_guard(func):
+    """Decorator handler PTB: StorageUnavailable dibalas pesan ramah, sesi tidak disentuh"""
+    @functools.wraps(func)
+    async def wrapper(update, context):
+        try:
+            return await func(update, context)
+        except StorageUnavailable as e:
+            storage_breaker.stats["degraded_replies"] += 1
+            logger.debug(f"{func.__name__}: storage tidak tersedia ({e})")
+            try:
+                if update.callback_query:
+                    await update.callback_query.answer(DEGRADED_TEXT, show_alert=True)
+                elif update.effective_message:
+                    await update.effective_message.reply_text(DEGRADED_TEXT)
+            except Exception:
+                pass
+    return wrapper
+
+def get_breaker_stats() -> dict:
+    return {**storage_breaker.get_stats(), "partner_snapshot": len(partner_snapshot)}
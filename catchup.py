@@ -0,0 +1,176 @@
+"""Catch-up backlog update setelah downtime (dijalankan dari post_init).
+
+Tanpa ini run_polling memutar ulang semua update satu per satu: /search
+berkali-kali, /stop untuk obrolan yang sudah selesai, pesan ke pasangan
+yang sudah pergi. Di sini backlog diambil sekaligus (getUpdates tanpa long
+polling), dirapikan per user, lalu diproses paralel antar user (urutan per
+user tetap) lewat handler biasa:
+
+- /search, /stop, /next: hanya niat terakhir. /stop dipakai kalau user masih
+  dalam obrolan atau sedang mencari; /search hanya kalau datang setelahnya.
+- command setting per user (LAST_WINS_COMMANDS): yang terakhir saja.
+- command lain & callback: hanya duplikat persis (teks/data sama) yang
+  dibuang; /unban 111 dan /unban 222 tetap diproses dua-duanya.
+- pesan relay: dibuang kalau lebih tua dari CATCHUP_MESSAGE_MAX_AGE atau
+  user sudah tidak dalam obrolan (foto tetap diproses: bisa bukti bayar).
+
+Mengambil batch berikutnya otomatis mengonfirmasi batch sebelumnya ke
+Telegram, jadi kalau proses mati di tengah catch-up sebagian backlog hilang
+(seperti drop_pending_updates). Batch terakhir dikonfirmasi setelah selesai.
+"""
+import time
+import asyncio
+import logging
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+from telegram import Update
+from config import CATCHUP_MAX_UPDATES, CATCHUP_MESSAGE_MAX_AGE, CATCHUP_CONCURRENCY
+from utils import r
+from keyschema import session_pointer_key, search_pointer_key
+from breaker import StorageUnavailable
+
+logger = logging.getLogger(__name__)
+
+SEARCH_COMMANDS = {"search"}
+STOP_COMMANDS = {"stop", "next", "skip"}
+# Hasilnya hanya bergantung pada pemanggilan terakhir
+LAST_WINS_COMMANDS = {"start", "help", "premium", "stats", "setgender", "setinterest"}
+
+def classify(update: Update) -> Tuple[str, str]:
+    """(jenis, kunci dedup): search, stop, command, callback, message, other.
+    Kunci command = nama untuk LAST_WINS_COMMANDS, selain itu teks lengkap"""
+    if update.callback_query:
+        return "callback", update.callback_query.data or ""
+    message = update.message
+    if message is None:
+        return "other", ""
+    text = message.text or ""
+    if text.startswith("/"):
+        command = text.split()[0][1:].split("@")[0].lower()
+        if command in SEARCH_COMMANDS:
+            return "search", command
+        if command in STOP_COMMANDS:
+            return "stop", command
+        if command in LAST_WINS_COMMANDS:
+            return "command", command
+        return "command", " ".join(text.split())
+    return "message", ""
+
+def coalesce(updates: List[Update], now: float, in_session: Dict[int, bool],
+             searching: Dict[int, bool], stats: Counter) -> Dict[int, List[Update]]:
+    """Rapikan backlog: user_id -> update yang tetap diproses (urutan asli).
+    Update tanpa user dikumpulkan di key 0."""
+    per_user = defaultdict(list)
+    for update in updates:
+        user = update.effective_user
+        per_user[user.id if user else 0].append(update)
+
+    plan = {}
+    for user_id, items in per_user.items():
+        if not user_id:
+            plan[0] = items
+            continue
+        kinds = [classify(update) for update in items]
+        last_stop = max((i for i, (kind, _) in enumerate(kinds) if kind == "stop"), default=-1)
+        last_search = max((i for i, (kind, _) in enumerate(kinds) if kind == "search"), default=-1)
+        # Duplikat command/callback: yang terakhir saja
+        last_seen = {(kind, key): i for i, (kind, key) in enumerate(kinds) if kind in ("command", "callback")}
+
+        keep = []
+        for i, (update, (kind, key)) in enumerate(zip(items, kinds)):
+            if kind == "stop":
+                if i != last_stop:
+                    reason = "superseded"
+                elif not (in_session.get(user_id) or searching.get(user_id)):
+                    reason = "stop_without_chat"
+                else:
+                    reason = None
+            elif kind == "search":
+                reason = None if i == last_search and i > last_stop else "superseded"
+            elif kind in ("command", "callback"):
+                reason = None if last_seen[(kind, key)] == i else "duplicate"
+            elif kind == "message":
+                message = update.message
+                if message.photo:
+                    reason = None
+                elif now - message.date.timestamp() > CATCHUP_MESSAGE_MAX_AGE:
+                    reason = "expired"
+                elif not in_session.get(user_id):
+                    reason = "no_session"
+                else:
+                    reason = None
+            else:
+                reason = None
+
+            if reason:
+                stats[f"dropped_{reason}"] += 1
+            else:
+                keep.append(update)
+        if keep:
+            plan[user_id] = keep
+    return plan
+
+def _user_states(user_ids: List[int]) -> Tuple[Dict[int, bool], Dict[int, bool]]:
+    """Status obrolan & pencarian semua user backlog dalam satu pipeline"""
+    pipe = r.pipeline(transaction=False)
+    for user_id in user_ids:
+        pipe.exists(session_pointer_key(user_id))
+        pipe.exists(search_pointer_key(user_id))
+    results = pipe.execute()
+    in_session = {user_id: bool(results[2 * i]) for i, user_id in enumerate(user_ids)}
+    searching = {user_id: bool(results[2 * i + 1]) for i, user_id in enumerate(user_ids)}
+    return in_session, searching
+
+async def fetch_backlog(bot, limit: int = CATCHUP_MAX_UPDATES) -> Tuple[List[Update], int]:
+    """Ambil update yang tertunda tanpa long polling, return (update, offset berikutnya)"""
+    updates, offset = [], 0
+    while len(updates) < limit:
+        batch = await bot.get_updates(offset=offset, limit=100, timeout=0, allowed_updates=Update.ALL_TYPES)
+        if not batch:
+            break
+        updates.extend(batch)
+        offset = batch[-1].update_id + 1
+    return updates, offset
+
+async def process_plan(application, plan: Dict[int, List[Update]], concurrency: int = CATCHUP_CONCURRENCY):
+    """Proses update per user berurutan, antar user paralel"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_user(updates: List[Update]):
+        async with semaphore:
+            for update in updates:
+                await application.process_update(update)
+
+    await asyncio.gather(*(run_user(updates) for updates in plan.values()))
+
+async def catch_up(application) -> Counter:
+    """Tahap catch-up sebelum polling dimulai"""
+    stats = Counter()
+    started = time.perf_counter()
+    bot = application.bot
+
+    updates, offset = await fetch_backlog(bot)
+    stats["fetched"] = len(updates)
+    if not updates:
+        return stats
+
+    user_ids = list({update.effective_user.id for update in updates if update.effective_user})
+    try:
+        in_session, searching = _user_states(user_ids)
+    except StorageUnavailable:
+        # Tidak bisa dicek: anggap semua masih dalam obrolan (tidak ada yang dibuang karena status)
+        in_session = searching = dict.fromkeys(user_ids, True)
+
+    plan = coalesce(updates, time.time(), in_session, searching, stats)
+    stats["users"] = len(user_ids)
+    stats["processed"] = sum(len(items) for items in plan.values())
+    await process_plan(application, plan)
+
+    # Konfirmasi batch terakhir; update yang masuk selama catch-up tetap untuk polling
+    await bot.get_updates(offset=offset, limit=1, timeout=0)
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    logger.info(
+        f"Catch-up: {stats['fetched']} update dari {stats['users']} user, "
+        f"{stats['processed']} diproses dalam {stats['seconds']} s"
+    )
+    return stats
@@ -1,11 +1,39 @@
 import os
+import socket
 from dotenv import load_dotenv
 
 load_dotenv()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
+# Multi-bot dalam satu proses (multibot.py): "nama=token,nama2=token2".
+# Key Redis tiap bot diberi prefix "nama:", lihat tenancy.py
+BOT_TOKENS = dict(item.strip().split("=", 1) for item in os.getenv("BOT_TOKENS", "").split(",") if item.strip())
+MULTIBOT_POOL_SIZE = int(os.getenv("MULTIBOT_POOL_SIZE", "64"))  # koneksi HTTP keluar, dipakai bersama
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
+# ID instance bot (untuk marker lifecycle & consumer group)
+INSTANCE_ID = os.getenv("INSTANCE_ID", socket.gethostname())
+
+# Backend storage: "redis" (default), "cluster" (Redis Cluster) atau "memory" (in-process)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "redis")
+
+# Timeout per command Redis (detik): Redis yang macet jadi error, bukan handler menggantung
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.5"))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "1"))
+
+# Circuit breaker storage: setelah N error koneksi/timeout berturut-turut, command
+# langsung ditolak selama BREAKER_RESET_TIMEOUT detik, lalu dicoba lagi (half-open)
+BREAKER_ENABLED = os.getenv("BREAKER_ENABLED", "1") == "1"
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 5
+# Mode degraded (breaker terbuka): rate limit "open" (pesan lolos) atau "closed" (ditahan)
+DEGRADED_RATE_LIMIT = os.getenv("DEGRADED_RATE_LIMIT", "open")
+PARTNER_SNAPSHOT_MAX = 100000     # pasangan aktif yang diingat di memori untuk relay degraded
+
+# Layout key: "legacy" atau "cluster" (hash tag per user, queue di-shard), lihat keyschema.py
+KEY_SCHEMA = os.getenv("KEY_SCHEMA", "legacy")
+KEY_SHARDS = int(os.getenv("KEY_SHARDS", "8"))
+
 # Daftar admin (ganti dengan ID Telegram-mu)
 ADMIN_IDS = {int(x) for x in os.getenv("ADMIN_IDS", "5361605327").split(",")}  # ← GANTI DENGAN ID TELEGRAM KAMU!
 
@@ -44,6 +72,83 @@ AUTO_BAN_REPORTS = 3
 REPORT_WINDOW = 86400
 
 SEARCH_COOLDOWN = 3
+SESSION_TTL = 604800          # 7 hari
+
+# Stream moderasi (report, appeal) + consumer group
+MODERATION_STREAM_MAXLEN = 100000
+MODERATION_BATCH_SIZE = 100
+MODERATION_POLL_INTERVAL = 1.0
+MODERATION_DIGEST_INTERVAL = 10
+MODERATION_NOTIFY_CONCURRENCY = 5
+MODERATION_CONSUMER = os.getenv("MODERATION_CONSUMER", INSTANCE_ID)
+
+# Event analytics (stream capped) + rollup per menit/jam/hari
+ANALYTICS_ENABLED = os.getenv("ANALYTICS_ENABLED", "1") == "1"
+ANALYTICS_STREAM_MAXLEN = int(os.getenv("ANALYTICS_STREAM_MAXLEN", "200000"))
+ANALYTICS_BATCH_SIZE = 500
+ANALYTICS_POLL_INTERVAL = 1.0
+ANALYTICS_CONSUMER = os.getenv("ANALYTICS_CONSUMER", INSTANCE_ID)
+
+# Matcher: pairing per tick dengan prioritas premium + aging
+MATCH_TICK_INTERVAL = float(os.getenv("MATCH_TICK_INTERVAL", "0.5"))
+MATCH_PREMIUM_BONUS = 30          # premium dianggap sudah menunggu N detik lebih lama
+MATCH_MAX_WAIT = 300              # detik, lewat dari ini search dibatalkan
+MATCH_NOTIFY_CONCURRENCY = 20
+MATCH_LOCK_TTL = 5
+MATCH_BATCH_SIZE = int(os.getenv("MATCH_BATCH_SIZE", "2000"))  # waiter terlama yang dibaca per tick
+
+# Deteksi spam near-duplicate (SimHash 64-bit) di pesan relay
+SPAM_ENABLED = os.getenv("SPAM_ENABLED", "1") == "1"
+SPAM_MIN_TOKENS = 5           # teks lebih pendek tidak dicek (salam, "wkwk", dll)
+SPAM_MAX_TOKENS = 64
+SPAM_HAMMING_THRESHOLD = 3    # bit berbeda maksimal agar dianggap teks serupa
+SPAM_WINDOW = 600             # detik
+SPAM_USER_HISTORY = 8         # fingerprint terakhir per user
+SPAM_MIN_PARTNERS = 3         # teks serupa ke >= N pasangan berbeda -> ditahan
+SPAM_GLOBAL_USERS = 5         # teks serupa dari >= N user berbeda -> dilaporkan ke admin
+SPAM_MAX_TRACKED = 50000      # batas user/bucket yang disimpan di memori
+
+# Blocklist media: Bloom filter di memori, konfirmasi ke set Redis kalau positif
+MEDIA_BLOOM_CAPACITY = int(os.getenv("MEDIA_BLOOM_CAPACITY", "100000"))
+MEDIA_BLOOM_ERROR_RATE = 0.001
+MEDIA_BLOCKLIST_REFRESH = 5       # detik antar refresh inkremental
+MEDIA_BLOCKLIST_LOG_MAXLEN = 100000
+MEDIA_RECENT_PER_USER = 20        # media terakhir per user yang bisa di-/blockmedia
+MEDIA_RECENT_TTL = 86400
+
+# /list_banned: jumlah user per halaman
+BANNED_PAGE_SIZE = 20
+
+# Album (media_group_id) di-buffer sebentar lalu dikirim sekaligus
+ALBUM_FLUSH_DELAY = 1.0
+ALBUM_MAX_ITEMS = 10
+
+# Outbox relay: retry error transient dengan backoff + jitter
+RELAY_MAX_RETRIES = 5
+RELAY_RETRY_BASE_DELAY = 0.5
+RELAY_RETRY_MAX_DELAY = 10
+RELAY_MAX_QUEUE = 50
+
+# Catch-up saat boot: backlog update setelah downtime diambil sekaligus dan dirapikan per user
+CATCHUP_ENABLED = os.getenv("CATCHUP_ENABLED", "1") == "1"
+CATCHUP_MAX_UPDATES = 10000       # sisanya diproses polling biasa
+CATCHUP_MESSAGE_MAX_AGE = 300     # detik, pesan relay yang lebih tua dibuang
+CATCHUP_CONCURRENCY = 50          # user diproses paralel (urutan per user tetap)
+
+# Graceful shutdown & revalidasi queue saat boot
+SHUTDOWN_DRAIN_TIMEOUT = 10
+REVALIDATE_BATCH_SIZE = 500
+
+# Typing indicator: maksimal sekali per chat per TYPING_INTERVAL detik,
+# dan hanya kalau pesan belum terkirim setelah TYPING_DELAY detik
+TYPING_INTERVAL = 5
+TYPING_DELAY = 0.5
+TYPING_MAX_PENDING = 200
 
 AVAILABLE_INTERESTS = {
-    "gaming","movies","music","sports"}
\ No newline at end of file
+    "gaming","movies","music","sports"}
+
+# Tracing command Redis (opt-in, untuk profiling per handler)
+REDIS_TRACE = os.getenv("REDIS_TRACE", "0") == "1"
+REDIS_TRACE_SLOW_MS = float(os.getenv("REDIS_TRACE_SLOW_MS", "10"))
+REDIS_TRACE_SLOW_LOG_SIZE = 100
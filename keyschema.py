@@ -0,0 +1,190 @@
+"""Nama key Redis untuk semua state bot.
+
+Dua layout, dipilih lewat KEY_SCHEMA di config.py:
+
+- "legacy": nama lama (user:123:premium, rate:123, session:1:2, queue:free)
+- "cluster": semua key per-user memakai hash tag user:{123}:..., session
+  ikut slot user_a, dan queue + active_users di-shard ke KEY_SHARDS key,
+  sehingga bisa jalan di Redis Cluster.
+
+Pindah dari legacy ke cluster dengan migrate_keys.py.
+"""
+import re
+from typing import List, Optional
+from config import KEY_SCHEMA, KEY_SHARDS
+
+CLUSTER = KEY_SCHEMA == "cluster"
+SHARDS = KEY_SHARDS if CLUSTER else 1
+
+# Queue pencarian: satu sorted set (di-shard), score = waktu mulai search (ms),
+# dipasangkan oleh matcher.py
+QUEUE_WAITING = "waiting"
+QUEUES = (QUEUE_WAITING,)
+# List FIFO versi lama, dikonversi ke QUEUE_WAITING saat boot
+LEGACY_QUEUES = ("free", "premium:male", "premium:female")
+
+MATCHER_LOCK = "matcher:lock"
+
+MODERATION_STREAM = "stream:moderation"
+ANALYTICS_STREAM = "stream:analytics"
+
+# Blocklist media (file_unique_id) + log penambahan untuk refresh inkremental
+MEDIA_BLOCKLIST = "media:blocked"
+MEDIA_BLOCKLIST_LOG = "stream:media_blocked"
+
+# Index user banned: sorted set (score = waktu ban, ms) + hash siapa yang ban.
+# Di cluster keduanya memakai hash tag yang sama (satu slot).
+if CLUSTER:
+    BANNED_INDEX = "banned:{index}"
+    BANNED_BY = "banned:{index}:by"
+else:
+    BANNED_INDEX = "banned:index"
+    BANNED_BY = "banned:by"
+
+# Angka /adminstats dirawat saat tulis (bukan KEYS): sorted set session aktif
+# (score = waktu mulai), sorted set premium (score = waktu habis) dan
+# HyperLogLog user yang pernah chat / dapat premium. STATS_INDEXED menandai
+# index sudah diisi dari data lama.
+STATS_SESSIONS = "stats:sessions"
+STATS_PREMIUM = "stats:premium"
+STATS_USERS = "stats:users"
+STATS_INDEXED = "stats:indexed"
+
+def ready_marker_key(instance_id: str) -> str:
+    """Marker status instance bot (ready/stopped)"""
+    return f"bot:ready:{instance_id}"
+
+def _user(user_id, suffix: str, legacy: str) -> str:
+    if CLUSTER:
+        return f"user:{{{user_id}}}:{suffix}"
+    return legacy
+
+# --- per-user ---
+def session_pointer_key(user_id) -> str:
+    """Key yang menyimpan nama session aktif user"""
+    return _user(user_id, "session", f"user:{user_id}")
+
+def premium_key(user_id) -> str:
+    return _user(user_id, "premium", f"user:{user_id}:premium")
+
+def banned_key(user_id) -> str:
+    return _user(user_id, "banned", f"user:{user_id}:banned")
+
+def gender_key(user_id) -> str:
+    return _user(user_id, "gender", f"user:{user_id}:gender")
+
+def interests_key(user_id) -> str:
+    return _user(user_id, "interests", f"user:{user_id}:interests")
+
+def payment_pointer_key(user_id) -> str:
+    """Key yang menyimpan kode pembayaran aktif user"""
+    return _user(user_id, "payment", f"user:{user_id}:payment")
+
+def rate_key(user_id) -> str:
+    return _user(user_id, "rate", f"rate:{user_id}")
+
+def search_cooldown_key(user_id) -> str:
+    return _user(user_id, "cooldown:search", f"cooldown:search:{user_id}")
+
+def reports_key(user_id) -> str:
+    return _user(user_id, "reports", f"reports:{user_id}")
+
+def chat_count_key(user_id) -> str:
+    return _user(user_id, "stats:total_chats", f"stats:{user_id}:total_chats")
+
+def recent_media_key(user_id) -> str:
+    """file_unique_id media terakhir yang dikirim user (untuk /blockmedia)"""
+    return _user(user_id, "recent_media", f"user:{user_id}:recent_media")
+
+def search_pointer_key(user_id) -> str:
+    """Member queue milik user yang sedang mencari (untuk batal / ganti preferensi)"""
+    return _user(user_id, "search", f"user:{user_id}:search")
+
+# --- session & payment ---
+def session_key(user_a, user_b) -> str:
+    """Session disimpan di slot yang sama dengan user_a"""
+    if CLUSTER:
+        return f"session:{{{user_a}}}:{user_b}"
+    return f"session:{user_a}:{user_b}"
+
+def payment_key(code: str) -> str:
+    return f"payment:{code}"
+
+# --- analytics rollup ---
+def rollup_key(period: str, bucket: str) -> str:
+    """Hash counter satu bucket (period: minute/hour/day)"""
+    return f"analytics:{period}:{bucket}"
+
+def rollup_users_key(period: str, bucket: str) -> str:
+    """HyperLogLog user unik satu bucket"""
+    return f"analytics:{period}:{bucket}:users"
+
+# --- shard (queue, active_users) ---
+def _shard(user_id) -> int:
+    return int(user_id) % SHARDS
+
+def queue_keys(queue: str) -> List[str]:
+    """Semua shard untuk satu queue pencarian"""
+    if not CLUSTER:
+        return [f"queue:{queue}"]
+    return [f"queue:{{{queue}:{shard}}}" for shard in range(SHARDS)]
+
+def queue_key_for(queue: str, user_id) -> str:
+    """Shard queue tempat user_id di-push"""
+    return queue_keys(queue)[_shard(user_id)]
+
+def active_users_keys() -> List[str]:
+    if not CLUSTER:
+        return ["active_users"]
+    return [f"active_users:{{{shard}}}" for shard in range(SHARDS)]
+
+def active_users_key_for(user_id) -> str:
+    return active_users_keys()[_shard(user_id)]
+
+# --- pola untuk SCAN/KEYS ---
+if CLUSTER:
+    PREMIUM_PATTERN = "user:{*}:premium"
+    BANNED_PATTERN = "user:{*}:banned"
+    CHAT_COUNT_PATTERN = "user:{*}:stats:total_chats"
+    SESSION_PATTERN = "session:{*}:*"
+else:
+    PREMIUM_PATTERN = "user:*:premium"
+    BANNED_PATTERN = "user:*:banned"
+    CHAT_COUNT_PATTERN = "stats:*:total_chats"
+    SESSION_PATTERN = "session:*"
+
+# Prefix semua key milik bot (untuk backup.py). Lock matcher dan marker
+# ready per instance sengaja tidak ikut: hanya berlaku untuk proses yang hidup.
+BOT_KEY_PREFIXES = (
+    "user:", "session:", "queue:", "active_users", "rate:", "cooldown:", "reports:",
+    "stats:", "payment:", "banned:", "media:", "stream:", "analytics:",
+)
+
+_USER_ID = re.compile(r"^[a-z]+:\{?(\d+)\}?")
+
+def user_id_from_key(key: str) -> Optional[str]:
+    """Ambil user ID dari key per-user (user:123:..., stats:123:..., user:{123}:...)"""
+    match = _USER_ID.match(key)
+    return match.group(1) if match else None
+
+# --- migrasi legacy -> cluster ---
+# (regex nama legacy, format nama cluster); value key tidak berubah
+LEGACY_RENAMES = [
+    (re.compile(r"^user:(\d+)$"), "user:{{{0}}}:session"),
+    (re.compile(r"^user:(\d+):(premium|banned|gender|interests|payment|search|recent_media)$"), "user:{{{0}}}:{1}"),
+    (re.compile(r"^rate:(\d+)$"), "user:{{{0}}}:rate"),
+    (re.compile(r"^cooldown:search:(\d+)$"), "user:{{{0}}}:cooldown:search"),
+    (re.compile(r"^reports:(\d+)$"), "user:{{{0}}}:reports"),
+    (re.compile(r"^stats:(\d+):total_chats$"), "user:{{{0}}}:stats:total_chats"),
+    (re.compile(r"^session:(\d+):(\d+)$"), "session:{{{0}}}:{1}"),
+    (re.compile(r"^banned:index$"), "banned:{{index}}"),
+    (re.compile(r"^banned:by$"), "banned:{{index}}:by"),
+]
+
+def legacy_to_cluster(key: str) -> Optional[str]:
+    """Nama cluster untuk key legacy, atau None kalau key tidak perlu di-rename"""
+    for pattern, template in LEGACY_RENAMES:
+        match = pattern.match(key)
+        if match:
+            return template.format(*match.groups())
+    return None
@@ -0,0 +1,178 @@
+import os
+import time
+import asyncio
+import logging
+import functools
+from collections import Counter
+from config import INSTANCE_ID, SHUTDOWN_DRAIN_TIMEOUT, REVALIDATE_BATCH_SIZE
+from utils import r, rebuild_banned_index, rebuild_stats_indexes
+from keyschema import (
+    QUEUE_WAITING, LEGACY_QUEUES, queue_keys, session_pointer_key, search_pointer_key,
+    banned_key, gender_key, premium_key, ready_marker_key, BANNED_INDEX, STATS_INDEXED
+)
+from moderation import run_moderation_consumer
+from analytics import run_analytics_aggregator
+from mediablock import media_blocklist, run_blocklist_refresher
+from matcher import enqueue_search, member_user_id, run_matcher
+from relay import flush_all_albums, typing_indicator, relay_outbox
+from tenancy import record_handler
+
+logger = logging.getLogger(__name__)
+
+# Jumlah handler yang sedang berjalan
+_in_flight = 0
+
+def tracked_handler(func):
+    """Decorator handler PTB: hitung handler in-flight untuk graceful shutdown"""
+    @functools.wraps(func)
+    async def wrapper(update, context):
+        global _in_flight
+        _in_flight += 1
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = await func(update, context)
+            failed = False
+            return result
+        finally:
+            _in_flight -= 1
+            record_handler(time.perf_counter() - started, failed)
+    return wrapper
+
+async def drain_in_flight(timeout: float = SHUTDOWN_DRAIN_TIMEOUT) -> bool:
+    """Tunggu semua handler selesai, return False kalau lewat deadline"""
+    deadline = time.monotonic() + timeout
+    while _in_flight > 0:
+        if time.monotonic() >= deadline:
+            logger.warning(f"Drain timeout: {_in_flight} handler masih berjalan")
+            return False
+        await asyncio.sleep(0.05)
+    return True
+
+def convert_legacy_queues(stats: Counter):
+    """Pindahkan isi queue list versi lama (FIFO) ke queue matcher"""
+    for queue in LEGACY_QUEUES:
+        for key in queue_keys(queue):
+            members = r.lrange(key, 0, -1) if r.type(key) == "list" else []
+            members = list(dict.fromkeys(members))
+            if not members:
+                continue
+            pipe = r.pipeline(transaction=False)
+            for user_id in members:
+                pipe.get(gender_key(user_id))
+                pipe.exists(premium_key(user_id))
+            results = pipe.execute()
+            # Preferensi gender lama tidak tersimpan: dianggap "siapa saja"
+            for i, user_id in enumerate(members):
+                enqueue_search(int(user_id), results[2 * i] or "", None, results[2 * i + 1])
+                stats["converted"] += 1
+            r.delete(key)
+
+def revalidate_queues(batch_size: int = REVALIDATE_BATCH_SIZE) -> Counter:
+    """Bersihkan queue pencarian saat boot.
+
+    Buang entry duplikat, user yang sudah dalam obrolan, user yang dibanned,
+    dan entry yang tidak lagi ditunjuk pointer search user-nya. Dicek per
+    batch dengan pipeline.
+    """
+    stats = Counter()
+    convert_legacy_queues(stats)
+    seen = set()
+    for key in queue_keys(QUEUE_WAITING):
+        members = r.zrange(key, 0, -1)
+        if not members:
+            continue
+
+        stale, candidates = [], []
+        for member in members:
+            user_id = member_user_id(member)
+            if user_id in seen:
+                stats["duplicates"] += 1
+                stale.append(member)
+            else:
+                seen.add(user_id)
+                candidates.append((user_id, member))
+
+        for start in range(0, len(candidates), batch_size):
+            batch = candidates[start:start + batch_size]
+            pipe = r.pipeline(transaction=False)
+            for user_id, _ in batch:
+                pipe.exists(session_pointer_key(user_id))
+                pipe.exists(banned_key(user_id))
+                pipe.get(search_pointer_key(user_id))
+            results = pipe.execute()
+            for i, (user_id, member) in enumerate(batch):
+                in_session, banned, pointer = results[3 * i:3 * i + 3]
+                if in_session or banned or pointer != member:
+                    stats["dropped"] += 1
+                    stale.append(member)
+                else:
+                    stats["kept"] += 1
+
+        if stale:
+            r.zrem(key, *stale)
+    return stats
+
+def write_ready_marker(state: str, **fields):
+    """Tulis marker status instance (ready/stopped) ke satu hash kecil"""
+    key = ready_marker_key(INSTANCE_ID)
+    r.hset(key, mapping={"state": state, "pid": os.getpid(), "ts": int(time.time()), **fields})
+    r.expire(key, 7 * 86400)
+
+async def startup(application, shared: bool = True):
+    """Boot: revalidasi queue, jalankan background worker, tulis marker ready.
+
+    shared=False untuk bot kedua dst. di multibot.py: blocklist media (dipakai
+    bersama semua bot) tidak dimuat & di-refresh ulang.
+    """
+    started = time.perf_counter()
+    stats = revalidate_queues()
+    if not r.exists(BANNED_INDEX):
+        # Data dari versi lama: ban belum tercatat di index
+        stats["banned_indexed"] = rebuild_banned_index()
+    if not r.exists(STATS_INDEXED):
+        # Data dari versi lama: session/premium/user belum tercatat di index /adminstats
+        stats["stats_indexed"] = rebuild_stats_indexes()
+    workers = [
+        asyncio.create_task(run_moderation_consumer(application.bot)),
+        asyncio.create_task(run_analytics_aggregator()),
+        asyncio.create_task(run_matcher(application.bot))
+    ]
+    if shared:
+        media_blocklist.load()
+        workers.append(asyncio.create_task(run_blocklist_refresher()))
+    application.bot_data["workers"] = workers
+    boot_ms = int((time.perf_counter() - started) * 1000)
+    write_ready_marker(
+        "ready",
+        boot_ms=boot_ms,
+        queue_kept=stats["kept"],
+        queue_dropped=stats["dropped"] + stats["duplicates"]
+    )
+    logger.info(f"Instance {INSTANCE_ID} ready dalam {boot_ms} ms, queue: {dict(stats)}")
+
+async def drain() -> bool:
+    """Tunggu handler & kirim semua yang di-buffer (state proses, semua bot).
+    Return False kalau ada deadline yang terlewat"""
+    drained = await drain_in_flight()
+
+    # Flush pesan yang masih di-buffer sebelum koneksi bot ditutup
+    await flush_all_albums()
+    typing_indicator.cancel_all()
+    return await relay_outbox.drain(SHUTDOWN_DRAIN_TIMEOUT) and drained
+
+async def stop_workers(application, drained: bool, started: float):
+    """Hentikan background worker satu bot & tulis marker stopped"""
+    workers = application.bot_data.get("workers", [])
+    for task in workers:
+        task.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+
+    shutdown_ms = int((time.perf_counter() - started) * 1000)
+    write_ready_marker("stopped", clean=int(drained), shutdown_ms=shutdown_ms)
+    logger.info(f"Instance {INSTANCE_ID} berhenti dalam {shutdown_ms} ms (clean={drained})")
+
+async def shutdown(application):
+    """Graceful shutdown: drain handler, flush buffer, hentikan worker, tulis marker"""
+    started = time.perf_counter()
+    await stop_workers(application, await drain(), started)
@@ -0,0 +1,360 @@
+"""Load test offline untuk handler ShadowChat.
+
+Menjalankan handler asli dari main.py (search, forward_to_partner, stop, report)
+dengan Update sintetis dan context.bot palsu yang hanya mencatat panggilan API.
+Tidak ada request ke Telegram.
+
+Contoh:
+    python loadtest.py --users 2000 --duration 30 --redis-url redis://localhost:6379/15
+    python loadtest.py --memory --users 5000 --json
+    python loadtest.py --memory --outage 10:5   # storage mati detik 10-15
+
+Gunakan database Redis terpisah: user sintetis memakai ID mulai dari 10^12
+dan key-nya tidak dibersihkan otomatis.
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import itertools
+from collections import Counter, defaultdict
+from types import SimpleNamespace
+
+# Tracing wajib aktif untuk menghitung operasi Redis per pesan
+os.environ["REDIS_TRACE"] = "1"
+
+from telegram.error import Forbidden, NetworkError
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+USER_ID_BASE = 10 ** 12
+# Prefix teks pesan sintetis antar user
+RELAY_PREFIX = "pesan "
+
+class FakeBot:
+    """Pengganti context.bot: semua method async hanya dicatat"""
+
+    def __init__(self, sim, api_latency: float = 0.0, fault_rate: float = 0.0, block_rate: float = 0.0):
+        self.sim = sim
+        self.api_latency = api_latency
+        self.fault_rate = fault_rate
+        self.block_rate = block_rate
+        self.calls = Counter()
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        async def api_call(*args, **kwargs):
+            self.calls[name] += 1
+            if self.api_latency:
+                await asyncio.sleep(self.api_latency)
+            chat_id = kwargs.get("chat_id", args[0] if args else None)
+            text = kwargs.get("text", args[1] if len(args) > 1 else None)
+            if isinstance(text, str) and text.startswith(RELAY_PREFIX):
+                # Fault injection hanya untuk pesan relay antar user
+                roll = random.random()
+                if roll < self.block_rate:
+                    self.calls["fault_blocked"] += 1
+                    raise Forbidden("Forbidden: bot was blocked by the user")
+                if roll < self.block_rate + self.fault_rate:
+                    self.calls["fault_network"] += 1
+                    raise NetworkError("simulated network error")
+            if chat_id is not None and isinstance(text, str):
+                self.sim.on_bot_message(int(chat_id), text)
+            return SimpleNamespace(message_id=next(self.sim.ids))
+        return api_call
+
+class FakeMessage:
+    """Message sintetis dengan reply_text yang dicatat"""
+
+    def __init__(self, sim, user_id: int, text: str = None):
+        self.sim = sim
+        self.chat_id = user_id
+        self.text = text
+        self.caption = None
+        self.photo = []
+        self.voice = None
+        self.sticker = None
+        self.document = None
+        self.media_group_id = None
+
+    async def reply_text(self, text, **kwargs):
+        self.sim.bot.calls["reply_text"] += 1
+        self.sim.on_bot_message(self.chat_id, text)
+        return SimpleNamespace(message_id=next(self.sim.ids))
+
+class OutageStorage:
+    """Proxy storage yang gagal (ConnectionError) selama jendela outage simulasi"""
+
+    def __init__(self, client, start: float, end: float):
+        self._client = client
+        self.start = start
+        self.end = end
+
+    def down(self) -> bool:
+        return self.start <= time.monotonic() < self.end
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            if name != "pipeline" and self.down():
+                raise RedisConnectionError("outage simulasi")
+            result = attr(*args, **kwargs)
+            if name == "pipeline":
+                execute = result.execute
+
+                def guarded_execute(*args, **kwargs):
+                    if self.down():
+                        raise RedisConnectionError("outage simulasi")
+                    return execute(*args, **kwargs)
+                result.execute = guarded_execute
+            return result
+        return call
+
+def install_outage(spec: str) -> OutageStorage:
+    """Pasang OutageStorage di bawah circuit breaker ("mulai:durasi" dalam detik)"""
+    import utils
+    from breaker import BreakerRedis, storage_breaker
+    if not isinstance(utils.r, BreakerRedis):
+        raise SystemExit("--outage butuh BREAKER_ENABLED=1")
+    start, duration = (float(part) for part in spec.split(":"))
+    begin = time.monotonic() + start
+    outage = OutageStorage(utils.r._client, begin, begin + duration)
+    # Objek yang sama dipakai semua modul (from utils import r): init ulang di tempat
+    utils.r.__dict__.clear()
+    utils.r.__init__(outage, storage_breaker)
+    return outage
+
+class Simulation:
+    def __init__(self, args, bot_module):
+        self.args = args
+        self.bot_module = bot_module
+        self.ids = itertools.count(1)
+        self.user_ids = itertools.count(USER_ID_BASE)
+        self.bot = FakeBot(self, args.api_latency, args.fault_rate, args.block_rate)
+        self.latencies = defaultdict(list)
+        self.events = Counter()
+        self.paired = {}
+        self.match_waits = []
+        self.deadline = 0.0
+
+    def on_bot_message(self, chat_id: int, text: str):
+        """Lacak status pairing dari pesan yang dikirim bot"""
+        event = self.paired.get(chat_id)
+        if event is None:
+            return
+        if "Terhubung" in text:
+            event.set()
+        elif "berakhir" in text or "tidak aktif" in text:
+            event.clear()
+
+    def make_update(self, user_id: int, text: str = None):
+        message = FakeMessage(self, user_id, text)
+        update = SimpleNamespace(
+            update_id=next(self.ids),
+            effective_user=SimpleNamespace(id=user_id, username=None),
+            message=message,
+            effective_message=message,
+            callback_query=None
+        )
+        context = SimpleNamespace(bot=self.bot, args=[], application=None)
+        return update, context
+
+    async def call(self, name: str, text: str, user_id: int):
+        """Jalankan satu handler dan ukur latensinya"""
+        from tracing import trace_context
+        from breaker import storage_guard
+        # Sama seperti main.handler: StorageUnavailable dibalas pesan ramah
+        handler = storage_guard(getattr(self.bot_module, name))
+        update, context = self.make_update(user_id, text)
+        start = time.perf_counter()
+        with trace_context(name, update.update_id):
+            await handler(update, context)
+        self.latencies[name].append(time.perf_counter() - start)
+        self.events[name] += 1
+
+    async def run_user(self):
+        """Siklus hidup satu user: search -> chat -> stop/next -> (churn)"""
+        args = self.args
+        user_id = next(self.user_ids)
+        self.paired[user_id] = asyncio.Event()
+
+        while time.monotonic() < self.deadline:
+            paired = self.paired[user_id]
+            if not paired.is_set():
+                searched_at = time.perf_counter()
+                await self.call("search", "/search", user_id)
+                remaining = max(0.0, self.deadline - time.monotonic())
+                try:
+                    await asyncio.wait_for(paired.wait(), timeout=min(args.search_wait, remaining))
+                    self.match_waits.append(time.perf_counter() - searched_at)
+                except asyncio.TimeoutError:
+                    self.events["search_timeout"] += 1
+
+            # Chatting
+            while paired.is_set() and time.monotonic() < self.deadline:
+                remaining = self.deadline - time.monotonic()
+                await asyncio.sleep(min(random.expovariate(args.msg_rate), max(0.0, remaining)))
+                if not paired.is_set() or time.monotonic() >= self.deadline:
+                    break
+                await self.call("forward_to_partner", f"{RELAY_PREFIX}{random.random()}", user_id)
+                self.events["messages"] += 1
+
+                roll = random.random()
+                if roll < args.report_prob:
+                    await self.call("report", "/report", user_id)
+                elif roll < args.report_prob + args.stop_prob:
+                    await self.call("stop", "/stop", user_id)
+                    paired.clear()
+
+            if paired.is_set():
+                continue
+
+            # Churn: user pergi, diganti user baru
+            if random.random() < args.churn:
+                self.events["churned"] += 1
+                self.paired.pop(user_id, None)
+                user_id = next(self.user_ids)
+                self.paired[user_id] = asyncio.Event()
+
+            # Hormati cooldown /search
+            if time.monotonic() < self.deadline:
+                await asyncio.sleep(args.search_cooldown + random.random())
+
+    async def run(self):
+        from matcher import run_matcher
+        self.deadline = time.monotonic() + self.args.duration
+        started = time.perf_counter()
+        if self.args.outage:
+            install_outage(self.args.outage)
+        # Pairing dilakukan matcher di background, sama seperti bot asli
+        matcher = asyncio.create_task(run_matcher(self.bot))
+        tasks = []
+        for _ in range(self.args.users):
+            tasks.append(asyncio.create_task(self.run_user()))
+            if self.args.ramp:
+                await asyncio.sleep(self.args.ramp / self.args.users)
+        await asyncio.gather(*tasks)
+        matcher.cancel()
+        await asyncio.gather(matcher, return_exceptions=True)
+        # Tunggu outbox relay kosong (termasuk retry yang masih antre)
+        from relay import relay_outbox
+        await relay_outbox.drain(timeout=30)
+        return time.perf_counter() - started
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def build_report(sim: Simulation, elapsed: float) -> dict:
+    from tracing import get_trace_report
+    from relay import get_relay_stats
+    from breaker import get_breaker_stats
+    trace = get_trace_report()
+    relay = get_relay_stats()
+    total_calls = sum(len(v) for v in sim.latencies.values())
+    messages = sim.events["messages"] or 1
+
+    handlers = {}
+    for name, values in sorted(sim.latencies.items()):
+        handlers[name] = {
+            "calls": len(values),
+            "p50_ms": round(percentile(values, 50) * 1000, 3),
+            "p99_ms": round(percentile(values, 99) * 1000, 3),
+            "redis_per_call": trace.get(name, {}).get("avg_per_update", 0)
+        }
+
+    total_roundtrips = sum(stats["roundtrips"] for stats in trace.values())
+    return {
+        "users": sim.args.users,
+        "duration_s": round(elapsed, 2),
+        "handler_calls": total_calls,
+        "throughput_per_s": round(total_calls / elapsed, 1),
+        "messages_relayed": sim.events["messages"],
+        "time_to_match_p50_s": round(percentile(sim.match_waits, 50), 3),
+        "time_to_match_p99_s": round(percentile(sim.match_waits, 99), 3),
+        "messages_per_s": round(sim.events["messages"] / elapsed, 1),
+        "redis_ops_per_message": round(
+            trace.get("forward_to_partner", {}).get("avg_per_update", 0), 2
+        ),
+        "redis_roundtrips_total": total_roundtrips,
+        "api_calls_per_message": round(sum(sim.bot.calls.values()) / messages, 2),
+        "api_calls": dict(sim.bot.calls),
+        "relay_retries": relay["retries"],
+        "relay_dropped": relay["dropped"],
+        "session_teardowns": relay["session_teardowns"],
+        "breaker": get_breaker_stats(),
+        "events": dict(sim.events),
+        "handlers": handlers
+    }
+
+def print_report(report: dict):
+    print(f"Users: {report['users']}  Durasi: {report['duration_s']} s")
+    print(f"Throughput: {report['throughput_per_s']} handler/s "
+          f"({report['messages_per_s']} pesan/s, {report['messages_relayed']} pesan)")
+    print(f"Time-to-match: p50 {report['time_to_match_p50_s']} s, p99 {report['time_to_match_p99_s']} s")
+    print(f"Redis ops per pesan: {report['redis_ops_per_message']}  "
+          f"API calls per pesan: {report['api_calls_per_message']}")
+    print(f"Relay: {report['relay_retries']} retry, {report['relay_dropped']} dibuang, "
+          f"{report['session_teardowns']} sesi berakhir karena error")
+    print(f"{'handler':<20}{'calls':>8}{'p50 ms':>10}{'p99 ms':>10}{'redis/call':>12}")
+    for name, stats in report["handlers"].items():
+        print(f"{name:<20}{stats['calls']:>8}{stats['p50_ms']:>10}"
+              f"{stats['p99_ms']:>10}{stats['redis_per_call']:>12}")
+    print(f"Breaker: {report['breaker']}")
+    print(f"Events: {report['events']}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test offline ShadowChat")
+    parser.add_argument("--users", type=int, default=1000, help="jumlah user simultan")
+    parser.add_argument("--duration", type=float, default=30, help="durasi simulasi (detik)")
+    parser.add_argument("--ramp", type=float, default=5, help="waktu ramp-up user (detik)")
+    parser.add_argument("--msg-rate", type=float, default=0.5, help="pesan/detik per user saat chat")
+    parser.add_argument("--stop-prob", type=float, default=0.05, help="peluang /stop setelah tiap pesan")
+    parser.add_argument("--report-prob", type=float, default=0.002, help="peluang /report setelah tiap pesan")
+    parser.add_argument("--churn", type=float, default=0.3, help="peluang user pergi setelah obrolan")
+    parser.add_argument("--search-wait", type=float, default=10, help="batas tunggu pasangan (detik)")
+    parser.add_argument("--search-cooldown", type=float, default=None, help="default: SEARCH_COOLDOWN")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="latensi palsu API Telegram (detik)")
+    parser.add_argument("--fault-rate", type=float, default=0.0, help="peluang send_* gagal NetworkError")
+    parser.add_argument("--block-rate", type=float, default=0.0, help="peluang send_* gagal Forbidden")
+    parser.add_argument("--redis-url", default=None, help="default: REDIS_URL dari .env")
+    parser.add_argument("--memory", action="store_true", help="pakai backend storage in-memory")
+    parser.add_argument("--outage", default=None, help="simulasi storage mati, format mulai:durasi (detik)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="output JSON")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.redis_url:
+        os.environ["REDIS_URL"] = args.redis_url
+    if args.memory:
+        os.environ["STORAGE_BACKEND"] = "memory"
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    import main as bot_module
+    from config import SEARCH_COOLDOWN
+    if args.search_cooldown is None:
+        args.search_cooldown = SEARCH_COOLDOWN
+
+    sim = Simulation(args, bot_module)
+    elapsed = asyncio.run(sim.run())
+    report = build_report(sim, elapsed)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
+import time
 import asyncio
 import logging
+import functools
 import redis
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
@@ -10,20 +12,35 @@ from telegram.ext import (
     ContextTypes,
     filters
 )
-from telegram.constants import ChatAction
 from config import (
     BOT_TOKEN, REDIS_URL, ADMIN_IDS, 
     PREMIUM_PRICES, E_WALLET_NUMBER, E_WALLET_NAME,
-    TRAKTEER_URL, AVAILABLE_INTERESTS, SEARCH_COOLDOWN
+    TRAKTEER_URL, AVAILABLE_INTERESTS, SEARCH_COOLDOWN, SPAM_ENABLED, DEGRADED_RATE_LIMIT,
+    CATCHUP_ENABLED, BOT_TOKENS
 )
 from utils import (
     censor_text, is_dangerous_file, is_rate_limited,
-    is_banned, ban_user, unban_user, add_report,
+    is_banned, unban_user,
     create_payment_code, verify_payment_code, delete_payment_code,
     get_active_users, get_free_users, update_user_activity,
-    get_user_stats, increment_chat_count, get_global_stats,
-    is_search_cooldown, r
+    get_user_stats, get_global_stats,
+    is_search_cooldown, get_user_payment_code, get_banned_page, set_premium, end_session, r
 )
+from keyschema import (
+    session_pointer_key, premium_key, gender_key,
+    interests_key
+)
+from tracing import traced_handler, format_trace_report
+from moderation import publish_moderation_event
+from lifecycle import tracked_handler, startup, shutdown
+from relay import buffer_album_item, flush_user_albums, get_relay_stats, typing_indicator, relay_outbox
+from spam import spam_detector
+from mediablock import media_blocklist, media_ids, remember_media, get_recent_media
+from analytics import emit, seconds_since, get_summary
+from matcher import enqueue_search, cancel_search
+from breaker import StorageUnavailable, storage_breaker, partner_snapshot, get_breaker_stats, storage_guard
+from catchup import catch_up
+from tenancy import get_tenant_stats
 
 # Setup logging
 logging.basicConfig(
@@ -32,9 +49,17 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Helper: dapatkan pasangan
+# Helper: dapatkan pasangan (saat storage down: dari snapshot di memori)
 def get_partner(user_id: int) -> int | None:
-    session_key = r.get(f"user:{user_id}")
+    try:
+        partner_id = _read_partner(user_id)
+    except StorageUnavailable:
+        return partner_snapshot.get(user_id)
+    partner_snapshot.remember(user_id, partner_id)
+    return partner_id
+
+def _read_partner(user_id: int) -> int | None:
+    session_key = r.get(session_pointer_key(user_id))
     if not session_key:
         return None
     user_a = r.hget(session_key, "user_a")
@@ -44,29 +69,52 @@ def get_partner(user_id: int) -> int | None:
     else:
         return int(user_a) if user_a else None
 
-# Helper: kirim typing indicator
-async def send_typing(context: ContextTypes.DEFAULT_TYPE, chat_id: int):
-    """Kirim typing indicator ke partner"""
+# Helper: akhiri sesi kalau partner tidak bisa dikirimi pesan
+async def end_inactive_session(message, user_id: int, partner_id: int, error: Exception):
+    logger.warning(f"Gagal mengirim ke {partner_id}: {error}")
+    try:
+        await message.reply_text("⚠️ Pasanganmu tidak aktif. Ketik /search untuk cari yang baru.")
+    except Exception as e:
+        logger.warning(f"Gagal memberi tahu {user_id} soal sesi berakhir: {e}")
+    partner_snapshot.forget(user_id, partner_id)
+    try:
+        session_key = r.get(session_pointer_key(user_id))
+        if session_key:
+            started = r.hget(session_key, "started")
+            end_session(session_key, user_id)
+            emit("stopped", user_id, r="inactive", d=seconds_since(started))
+    except StorageUnavailable as e:
+        logger.warning(f"Sesi {user_id} belum dibersihkan (storage tidak tersedia): {e}")
+
+# Helper: beri tahu pengirim kalau satu pesan gagal terkirim (sesi tetap jalan)
+async def notify_send_failed(message, error: Exception):
     try:
-        await context.bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
-    except:
+        await message.reply_text("⚠️ Pesanmu gagal terkirim. Coba kirim ulang.")
+    except Exception:
         pass
 
-# Helper: kirim pesan ke pasangan dengan typing indicator
+# Helper: kirim pesan ke pasangan lewat outbox (typing indicator hanya untuk teks)
 async def forward_to_partner(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
+    # Mode degraded: storage down, hanya relay ke pasangan yang ada di snapshot
+    degraded = storage_breaker.is_open()
     
-    # Update user activity
-    update_user_activity(user_id)
-    
-    if is_banned(user_id):
-        await update.message.reply_text("❌ Akunmu diblokir. Gunakan /appeal untuk ajukan banding.")
-        return
-    
-    # Rate limiting
-    if is_rate_limited(user_id):
-        await update.message.reply_text("⚠️ Kamu mengirim pesan terlalu cepat. Tunggu beberapa detik.")
-        return
+    if degraded:
+        if DEGRADED_RATE_LIMIT == "closed":
+            await update.message.reply_text("⚠️ Layanan sedang gangguan, pesan belum bisa dikirim. Coba lagi sebentar.")
+            return
+    else:
+        # Update user activity
+        update_user_activity(user_id)
+        
+        if is_banned(user_id):
+            await update.message.reply_text("❌ Akunmu diblokir. Gunakan /appeal untuk ajukan banding.")
+            return
+        
+        # Rate limiting
+        if is_rate_limited(user_id):
+            await update.message.reply_text("⚠️ Kamu mengirim pesan terlalu cepat. Tunggu beberapa detik.")
+            return
     
     partner_id = get_partner(user_id)
     if not partner_id:
@@ -74,42 +122,74 @@ async def forward_to_partner(update: Update, context: ContextTypes.DEFAULT_TYPE)
     
     message = update.message
     
-    try:
-        # Send typing indicator
-        await send_typing(context, partner_id)
-        
-        if message.text:
-            text = censor_text(message.text)
-            await context.bot.send_message(chat_id=partner_id, text=text)
-        elif message.photo:
-            photo = message.photo[-1]
-            caption = censor_text(message.caption) if message.caption else None
-            await context.bot.send_photo(
-                chat_id=partner_id,
-                photo=photo.file_id,
-                caption=caption
-            )
-        elif message.voice:
-            await context.bot.send_voice(chat_id=partner_id, voice=message.voice.file_id)
-        elif message.sticker:
-            await context.bot.send_sticker(chat_id=partner_id, sticker=message.sticker.file_id)
-        elif message.document:
-            if is_dangerous_file(message.document.file_name):
-                await message.reply_text("❌ File berbahaya tidak diizinkan.")
+    if message.document and is_dangerous_file(message.document.file_name):
+        await message.reply_text("❌ File berbahaya tidak diizinkan.")
+        return
+    
+    # Media yang sudah diblokir moderator (cek Bloom di memori, tanpa Redis)
+    file_ids = media_ids(message)
+    if file_ids:
+        if media_blocklist.is_blocked(file_ids):
+            await message.reply_text("❌ Media ini diblokir karena melanggar aturan.")
+            return
+        if not degraded:
+            remember_media(user_id, file_ids[-1:])
+    
+    # Spam: teks promo yang sama ke banyak pasangan ditahan
+    text = message.text or message.caption
+    if SPAM_ENABLED and text:
+        verdict = spam_detector.check(user_id, partner_id, text)
+        if verdict:
+            if verdict["report"] and not degraded:
+                publish_moderation_event("spam", user_id=user_id, kind=verdict["kind"], count=verdict["count"])
+            if verdict["action"] == "throttle":
+                await message.reply_text("🚫 Pesan serupa sudah kamu kirim ke banyak orang. Pesan ini tidak diteruskan.")
                 return
-            caption = censor_text(message.caption) if message.caption else None
-            await context.bot.send_document(
-                chat_id=partner_id,
-                document=message.document.file_id,
-                caption=caption
-            )
-    except Exception as e:
-        logger.warning(f"Gagal mengirim ke {partner_id}: {e}")
-        await message.reply_text("⚠️ Pasanganmu tidak aktif. Ketik /search untuk cari yang baru.")
-        session_key = r.get(f"user:{user_id}")
-        if session_key:
-            r.delete(session_key)
-            r.delete(f"user:{user_id}")
+    
+    # Album: buffer sebentar, lalu dikirim sekaligus via send_media_group
+    on_error = functools.partial(end_inactive_session, message, user_id, partner_id)
+    if message.media_group_id and buffer_album_item(context.bot, user_id, partner_id, message, on_error):
+        emit("message_relayed", user_id)
+        return
+    # Album yang masih di-buffer dikirim dulu, urutan ke pasangan tetap
+    flush_user_albums(user_id)
+    
+    bot = context.bot
+    send = None
+    if message.text:
+        # Typing indicator (debounced, batal begitu pesan terkirim)
+        typing_indicator.notify(bot, partner_id)
+        text = censor_text(message.text)
+        send = functools.partial(bot.send_message, chat_id=partner_id, text=text)
+    elif message.photo:
+        photo = message.photo[-1]
+        caption = censor_text(message.caption) if message.caption else None
+        send = functools.partial(bot.send_photo, chat_id=partner_id, photo=photo.file_id, caption=caption)
+    elif message.voice:
+        send = functools.partial(bot.send_voice, chat_id=partner_id, voice=message.voice.file_id)
+    elif message.sticker:
+        send = functools.partial(bot.send_sticker, chat_id=partner_id, sticker=message.sticker.file_id)
+    elif message.document:
+        caption = censor_text(message.caption) if message.caption else None
+        send = functools.partial(
+            bot.send_document,
+            chat_id=partner_id,
+            document=message.document.file_id,
+            caption=caption
+        )
+    
+    if not send:
+        return
+    
+    # Dikirim lewat outbox: urutan terjaga, error transient di-retry
+    on_dropped = functools.partial(notify_send_failed, message)
+    if not relay_outbox.enqueue(partner_id, send, on_error, on_dropped=on_dropped):
+        await message.reply_text("⚠️ Pesanmu belum terkirim, tunggu sebentar lalu coba lagi.")
+        return
+    if degraded:
+        storage_breaker.stats["degraded_relayed"] += 1
+    else:
+        emit("message_relayed", user_id)
 
 # --- COMMANDS ---
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -262,17 +342,10 @@ async def verify_screenshot(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     
     # Check apakah user sedang tunggu verifikasi
-    payment_keys = r.keys("payment:PAY-*")
-    user_payment = None
-    
-    for key in payment_keys:
-        data = r.hgetall(key)
-        if data and int(data.get("user_id", 0)) == user_id:
-            code = key.split(":")[1]
-            user_payment = verify_payment_code(code)
-            if user_payment:
-                user_payment["code"] = code
-                break
+    code = get_user_payment_code(user_id)
+    user_payment = verify_payment_code(code) if code else None
+    if user_payment:
+        user_payment["code"] = code
     
     if not user_payment:
         return
@@ -289,8 +362,9 @@ async def verify_screenshot(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Grant premium
     days = user_payment["days"]
-    r.setex(f"user:{user_id}:premium", days * 86400, "1")
+    set_premium(user_id, days)
     delete_payment_code(user_payment["code"])
+    emit("premium_granted", user_id, days=days, src="payment")
     
     days_text = f"{days} hari" if days < 365 else "1 tahun"
     
@@ -320,7 +394,7 @@ async def set_gender(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Pilih: male, female, atau skip")
         return
     
-    r.set(f"user:{user_id}:gender", gender if gender != "skip" else "")
+    r.set(gender_key(user_id), gender if gender != "skip" else "")
     await update.message.reply_text(f"✅ Jenis kelamin disetel ke: {gender}")
 
 async def set_interest(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -353,7 +427,7 @@ async def set_interest(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # Save interests
-    key = f"user:{user_id}:interests"
+    key = interests_key(user_id)
     r.delete(key)
     for interest in selected:
         r.sadd(key, interest)
@@ -362,13 +436,16 @@ async def set_interest(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def search(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
+    if storage_breaker.is_open():
+        await update.message.reply_text("🛠 Pencarian pasangan sedang gangguan. Coba lagi beberapa saat.")
+        return
     update_user_activity(user_id)
     
     if is_banned(user_id):
         await update.message.reply_text("❌ Akunmu diblokir.")
         return
     
-    if r.get(f"user:{user_id}"):
+    if r.get(session_pointer_key(user_id)):
         await update.message.reply_text("ℹ️ Kamu sudah dalam obrolan. Ketik /stop untuk keluar.")
         return
     
@@ -377,11 +454,11 @@ async def search(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(f"⏳ Tunggu {SEARCH_COOLDOWN} detik sebelum search lagi.")
         return
     
-    is_premium = r.exists(f"user:{user_id}:premium")
-    user_gender = r.get(f"user:{user_id}:gender") or ""
-    user_interests = r.smembers(f"user:{user_id}:interests")
+    is_premium = r.exists(premium_key(user_id))
+    user_gender = r.get(gender_key(user_id)) or ""
     
-    target_queue = "queue:free"
+    # Preferensi gender pasangan (None = siapa saja)
+    want = None
     
     if is_premium and context.args:
         req = context.args[0].lower()
@@ -389,59 +466,21 @@ async def search(update: Update, context: ContextTypes.DEFAULT_TYPE):
             if not user_gender:
                 await update.message.reply_text("⚠️ Atur jenis kelaminmu dulu dengan /setgender.")
                 return
-            target_queue = f"queue:premium:{req}"
-        elif req == "any":
-            target_queue = "queue:free"
-        else:
+            want = req
+        elif req != "any":
             await update.message.reply_text("Usage: /search [male|female|any]")
             return
     elif is_premium and user_gender:
-        opposite = "female" if user_gender == "male" else "male"
-        target_queue = f"queue:premium:{opposite}"
-    elif not is_premium:
-        if context.args:
-            await update.message.reply_text("🔒 Fitur ini hanya untuk premium. Ketik /premium.")
-            return
-        target_queue = "queue:free"
+        want = "female" if user_gender == "male" else "male"
+    elif not is_premium and context.args:
+        await update.message.reply_text("🔒 Fitur ini hanya untuk premium. Ketik /premium.")
+        return
     
-    # Try to find match
-    partner_id = r.lpop(target_queue)
+    # Pairing dilakukan matcher per tick (premium diprioritaskan)
+    enqueue_search(user_id, user_gender, want, is_premium)
+    emit("search_started", user_id)
     
-    if partner_id:
-        partner_id = int(partner_id)
-        session_key = f"session:{user_id}:{partner_id}"
-        r.hset(session_key, mapping={"user_a": user_id, "user_b": partner_id})
-        r.set(f"user:{user_id}", session_key)
-        r.set(f"user:{partner_id}", session_key)
-        r.expire(session_key, 604800)
-        
-        # Increment chat count
-        increment_chat_count(user_id)
-        increment_chat_count(partner_id)
-        
-        # Check common interests
-        partner_interests = r.smembers(f"user:{partner_id}:interests")
-        common = user_interests.intersection(partner_interests)
-        
-        msg_user = "✅ Terhubung!"
-        msg_partner = "✅ Terhubung!"
-        
-        if common:
-            common_str = ", ".join(common)
-            msg_user += f"n🎯 Minat sama: {common_str}"
-            msg_partner += f"n🎯 Minat sama: {common_str}"
-        
-        await update.message.reply_text(msg_user, parse_mode="Markdown")
-        await context.bot.send_message(partner_id, msg_partner, parse_mode="Markdown")
-    else:
-        if is_premium and user_gender:
-            r.rpush(f"queue:premium:{user_gender}", user_id)
-            r.expire(f"queue:premium:{user_gender}", 300)
-        else:
-            r.rpush("queue:free", user_id)
-            r.expire("queue:free", 300)
-        
-        await update.message.reply_text("🔍 Mencari pasangan...nKetik /stop untuk batal.")
+    await update.message.reply_text("🔍 Mencari pasangan...\nKetik /stop untuk batal.")
 
 async def stop(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
@@ -451,17 +490,21 @@ async def stop(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Akunmu diblokir.")
         return
     
-    session_key = r.get(f"user:{user_id}")
+    session_key = r.get(session_pointer_key(user_id))
     if not session_key:
-        await update.message.reply_text("ℹ️ Kamu tidak sedang dalam obrolan.")
+        if cancel_search(user_id):
+            await update.message.reply_text("🔍 Pencarian dibatalkan.")
+        else:
+            await update.message.reply_text("ℹ️ Kamu tidak sedang dalam obrolan.")
         return
     
     partner_id = get_partner(user_id)
-    r.delete(session_key)
-    r.delete(f"user:{user_id}")
+    started = r.hget(session_key, "started")
+    end_session(session_key, user_id, *([partner_id] if partner_id else []))
+    partner_snapshot.forget(user_id, partner_id)
+    emit("stopped", user_id, r="user", d=seconds_since(started))
     
     if partner_id:
-        r.delete(f"user:{partner_id}")
         try:
             await context.bot.send_message(
                 partner_id, 
@@ -515,34 +558,12 @@ async def report(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("ℹ️ Kamu tidak sedang dalam obrolan.")
         return
     
-    # Add report
-    report_count = add_report(partner_id, user_id)
+    # Auto-ban & notifikasi admin diproses async oleh consumer moderasi
+    publish_moderation_event("report", user_id=partner_id, reporter_id=user_id)
     
-    logger.info(f"LAPORAN: User {user_id} melaporkan {partner_id} (total: {report_count})")
+    logger.info(f"LAPORAN: User {user_id} melaporkan {partner_id}")
     
-    # Auto-ban jika >= 3 reports
-    if report_count >= 3:
-        ban_user(partner_id, "Auto-ban: Multiple reports")
-        
-        # Notify admins
-        for admin_id in ADMIN_IDS:
-            try:
-                await context.bot.send_message(
-                    admin_id,
-                    f"🚨 **Auto-Ban Alert**n"
-                    f"User `{partner_id}` telah di-ban otomatis.n"
-                    f"Alasan: {report_count} reports dalam 24 jam.",
-                    parse_mode="Markdown"
-                )
-            except:
-                pass
-        
-        await update.message.reply_text(
-            "✅ Terima kasih atas laporanmu.n"
-            "User telah diblokir otomatis karena banyak laporan."
-        )
-    else:
-        await update.message.reply_text("✅ Terima kasih atas laporanmu. Admin akan meninjau.")
+    await update.message.reply_text("✅ Terima kasih atas laporanmu. Admin akan meninjau.")
 
 async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show user statistics"""
@@ -587,7 +608,8 @@ async def grant_premium(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         user_id = int(context.args[0])
         days = int(context.args[1])
-        r.setex(f"user:{user_id}:premium", days * 86400, "1")
+        set_premium(user_id, days)
+        emit("premium_granted", user_id, days=days, src="admin")
         
         await update.message.reply_text(f"✅ Premium diberikan ke {user_id} untuk {days} hari.")
         
@@ -630,7 +652,8 @@ async def gift_premium(update: Update, context: ContextTypes.DEFAULT_TYPE):
         success = 0
         for user_id in selected:
             try:
-                r.setex(f"user:{user_id}:premium", days * 86400, "1")
+                set_premium(user_id, days)
+                emit("premium_granted", user_id, days=days, src="gift")
                 await context.bot.send_message(
                     user_id,
                     f"🎁 **SELAMAT!**nn"
@@ -684,40 +707,160 @@ async def admin_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     stats = get_global_stats()
+    daily = get_summary()
+    relay = get_relay_stats()
+    typing = typing_indicator.get_stats()
+    spam = spam_detector.get_stats()
+    media = media_blocklist.get_stats()
     
     text = f"""
 📊 **Global Statistics**
 
-👥 **Total Users:** {stats['total_users']}
+👥 **Total Users:** ±{stats['total_users']}
 💬 **Active Sessions:** {stats['active_sessions']}
 ⏳ **Queue Waiting:** {stats['queue_waiting']}
 💎 **Premium Users:** {stats['total_premium']}
 🚫 **Banned Users:** {stats['total_banned']}
+
+📈 **Hari ini (UTC):** {daily['dau']} user aktif, {daily['matches_today']} match, {daily['messages_today']} pesan, {daily['premium_today']} premium baru
+⏱ **Rata-rata:** obrolan {daily['avg_chat_seconds']} detik, tunggu match {daily['avg_match_seconds']} detik
+🕐 **1 jam terakhir:** {daily['searches_last_hour']} search, {daily['messages_last_hour']} pesan
+
+📨 **Relay:** {relay['messages']} pesan, {relay['albums']} album, hemat {relay['saved_per_message']} API call/pesan
+🔁 **Outbox:** {relay['retries']} retry, {relay['dropped']} dibuang, {relay['session_teardowns']} sesi berakhir
+⌨️ **Typing:** {typing.get('sent', 0)}/{typing.get('requested', 0)} terkirim
+🖼 **Media diblokir:** {media.get('blocked', 0)} ditahan, {media['size']} di blocklist
+🧹 **Spam:** {spam.get('throttle', 0)} ditahan, {spam.get('flag', 0)} ditandai dari {spam.get('checked', 0)} pesan
 """
     
     await update.message.reply_text(text, parse_mode="Markdown")
 
+def format_banned_page(entries: list, next_cursor: str | None):
+    """Teks + tombol navigasi untuk satu halaman /list_banned"""
+    lines = ["📋 Daftar user banned (terbaru dulu):", ""]
+    for entry in entries:
+        banned_at = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["banned_at"]))
+        lines.append(f"{entry['user_id']} — {entry['reason']} (oleh {entry['banned_by']}, {banned_at})")
+    
+    buttons = [InlineKeyboardButton("⏮ Awal", callback_data="banned_page:")]
+    if next_cursor:
+        buttons.append(InlineKeyboardButton("Berikutnya ➡️", callback_data=f"banned_page:{next_cursor}"))
+    return "\n".join(lines), InlineKeyboardMarkup([buttons])
+
 async def list_banned(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id not in ADMIN_IDS:
         return
     
-    cursor = 0
-    banned_ids = []
-    while True:
-        cursor, keys = r.scan(cursor=cursor, match="user:*:banned", count=100)
-        for key in keys:
-            user_id = key.split(':')[1]
-            banned_ids.append(user_id)
-        if cursor == 0:
-            break
-    
-    if not banned_ids:
+    entries, next_cursor = get_banned_page()
+    if not entries:
         await update.message.reply_text("Tidak ada user yang dibanned.")
+        return
+    
+    text, reply_markup = format_banned_page(entries, next_cursor)
+    await update.message.reply_text(text, reply_markup=reply_markup)
+
+async def list_banned_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Navigasi halaman /list_banned (cursor di callback_data)"""
+    query = update.callback_query
+    await query.answer()
+    
+    if query.from_user.id not in ADMIN_IDS:
+        return
+    
+    cursor = query.data.split(":", 1)[1] or None
+    entries, next_cursor = get_banned_page(cursor)
+    if not entries:
+        await query.edit_message_text("Tidak ada user banned lagi.")
+        return
+    
+    text, reply_markup = format_banned_page(entries, next_cursor)
+    await query.edit_message_text(text, reply_markup=reply_markup)
+
+async def block_media(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Blokir media: reply ke media dengan /blockmedia, atau /blockmedia <user_id>
+    untuk semua media terakhir user tersebut (mis. setelah laporan)"""
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+    
+    replied = update.message.reply_to_message
+    if replied and media_ids(replied):
+        file_ids = media_ids(replied)[-1:]
+        source = "media ini"
+    elif len(context.args) == 1:
+        try:
+            user_id = int(context.args[0])
+        except ValueError:
+            await update.message.reply_text("ID harus berupa angka.")
+            return
+        file_ids = get_recent_media(user_id)
+        source = f"media terakhir user {user_id}"
+        if not file_ids:
+            await update.message.reply_text(f"Tidak ada media tercatat dari user {user_id}.")
+            return
+    else:
+        await update.message.reply_text("Usage: /blockmedia <user_id> atau reply ke media dengan /blockmedia")
+        return
+    
+    added = media_blocklist.block(file_ids, update.effective_user.id)
+    await update.message.reply_text(f"✅ {added} media baru diblokir ({source}).")
+    logger.info(f"Admin {update.effective_user.id} memblokir {added} media ({source})")
+
+async def unblock_media(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+    
+    if len(context.args) != 1:
+        await update.message.reply_text("Usage: /unblockmedia <file_unique_id>")
+        return
+    
+    if media_blocklist.unblock(context.args[0]):
+        await update.message.reply_text("✅ Media dihapus dari blocklist.")
     else:
-        text = "📋 Daftar user banned:n" + "n".join(banned_ids[:50])
-        if len(banned_ids) > 50:
-            text += f"nn... dan {len(banned_ids) - 50} lainnya"
-        await update.message.reply_text(text)
+        await update.message.reply_text("Media tidak ada di blocklist.")
+
+async def health(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Status storage & circuit breaker (admin only, tetap jalan saat degraded)"""
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+    
+    breaker = get_breaker_stats()
+    ping = "dilewati (breaker terbuka)"
+    if not storage_breaker.is_open():
+        started = time.perf_counter()
+        try:
+            r.ping()
+            ping = f"{(time.perf_counter() - started) * 1000:.1f} ms"
+        except StorageUnavailable as e:
+            ping = f"gagal ({e})"
+    
+    text = (
+        f"🩺 Health\n\n"
+        f"💾 Storage: {breaker['state']} sejak {breaker['state_seconds']} s, ping {ping}\n"
+        f"⚡ Breaker: {breaker.get('trips', 0)} trip, {breaker.get('recoveries', 0)} pulih, "
+        f"{breaker.get('failures', 0)} error, {breaker.get('rejected', 0)} command ditolak\n"
+        f"🛟 Degraded: {breaker.get('degraded_relayed', 0)} pesan direlay dari snapshot "
+        f"({breaker['partner_snapshot']} user), {breaker.get('degraded_replies', 0)} request ditolak\n"
+        f"📨 Outbox: {relay_outbox.pending()} pesan antre"
+    )
+    catchup = context.application.bot_data.get("catchup") if context.application else None
+    if catchup:
+        dropped = sum(count for name, count in catchup.items() if name.startswith("dropped_"))
+        text += (f"\n⏩ Catch-up boot: {catchup['fetched']} update, {catchup.get('processed', 0)} diproses, "
+                 f"{dropped} dibuang, {catchup.get('seconds', 0)} s")
+    if BOT_TOKENS:
+        for tenant, stats in get_tenant_stats().items():
+            text += (f"\n🤖 {tenant}: {stats.get('updates', 0)} update, {stats.get('errors', 0)} error, "
+                     f"{stats.get('relayed', 0)} relay, {stats.get('redis_commands', 0)} command Redis")
+    if breaker["last_error"]:
+        text += f"\n❗ Error terakhir: {breaker['last_error']}"
+    await update.message.reply_text(text)
+
+async def trace_report(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Laporan command Redis per handler (butuh REDIS_TRACE=1)"""
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+    
+    await update.message.reply_text(format_trace_report())
 
 async def unban(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id not in ADMIN_IDS:
@@ -750,13 +893,7 @@ async def appeal(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("ℹ️ Kamu tidak sedang diblokir.")
         return
     
-    msg = f"📨 **Permohonan Banding**nUser `{user_id}` meminta pencabutan blokir."
-    
-    for admin_id in ADMIN_IDS:
-        try:
-            await context.bot.send_message(admin_id, msg, parse_mode="Markdown")
-        except:
-            pass
+    publish_moderation_event("appeal", user_id=user_id)
     
     await update.message.reply_text("✅ Permohonan terkirim ke admin. Mohon tunggu.")
 
@@ -777,45 +914,79 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await forward_to_partner(update, context)
 
 # --- MAIN ---
-def main():
-    if not BOT_TOKEN:
-        raise ValueError("BOT_TOKEN tidak ditemukan! Buat file .env dan isi BOT_TOKEN")
-    
-    application = Application.builder().token(BOT_TOKEN).build()
+def handler(func):
+    """Bungkus handler: tracing Redis, tracking in-flight untuk graceful shutdown,
+    dan balasan ramah kalau storage tidak tersedia"""
+    return tracked_handler(traced_handler(storage_guard(func)))
+
+async def post_init(application: Application):
+    """Revalidasi queue, jalankan background worker, lalu catch-up backlog sebelum polling"""
+    await startup(application, shared=application.bot_data.get("shared_workers", True))
+    if CATCHUP_ENABLED:
+        try:
+            application.bot_data["catchup"] = await catch_up(application)
+        except Exception as e:
+            # Sisa backlog tetap diproses polling biasa
+            logger.warning(f"Catch-up backlog gagal: {e}")
+
+async def post_stop(application: Application):
+    """Drain handler & flush buffer (bot masih bisa kirim pesan terakhir)"""
+    await shutdown(application)
+
+def build_application(token: str, request=None, updates_request=None) -> Application:
+    """Application lengkap dengan semua handler.
+    request/updates_request: HTTPXRequest yang dipakai bersama beberapa bot (multibot.py)"""
+    builder = Application.builder().token(token).post_init(post_init).post_stop(post_stop)
+    if request is not None:
+        builder = builder.request(request)
+    if updates_request is not None:
+        builder = builder.get_updates_request(updates_request)
+    application = builder.build()
     
     # User commands
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(CommandHandler("premium", premium_info))
-    application.add_handler(CommandHandler("setgender", set_gender))
-    application.add_handler(CommandHandler("setinterest", set_interest))
-    application.add_handler(CommandHandler("search", search))
-    application.add_handler(CommandHandler("stop", stop))
-    application.add_handler(CommandHandler("skip", skip))
-    application.add_handler(CommandHandler("next", skip))
-    application.add_handler(CommandHandler("showid", showid))
-    application.add_handler(CommandHandler("report", report))
-    application.add_handler(CommandHandler("appeal", appeal))
-    application.add_handler(CommandHandler("stats", stats))
+    application.add_handler(CommandHandler("start", handler(start)))
+    application.add_handler(CommandHandler("help", handler(help_command)))
+    application.add_handler(CommandHandler("premium", handler(premium_info)))
+    application.add_handler(CommandHandler("setgender", handler(set_gender)))
+    application.add_handler(CommandHandler("setinterest", handler(set_interest)))
+    application.add_handler(CommandHandler("search", handler(search)))
+    application.add_handler(CommandHandler("stop", handler(stop)))
+    application.add_handler(CommandHandler("skip", handler(skip)))
+    application.add_handler(CommandHandler("next", handler(skip)))
+    application.add_handler(CommandHandler("showid", handler(showid)))
+    application.add_handler(CommandHandler("report", handler(report)))
+    application.add_handler(CommandHandler("appeal", handler(appeal)))
+    application.add_handler(CommandHandler("stats", handler(stats)))
     
     # Admin commands
-    application.add_handler(CommandHandler("grant_premium", grant_premium))
-    application.add_handler(CommandHandler("giftpremium", gift_premium))
-    application.add_handler(CommandHandler("broadcast", broadcast))
-    application.add_handler(CommandHandler("adminstats", admin_stats))
-    application.add_handler(CommandHandler("list_banned", list_banned))
-    application.add_handler(CommandHandler("unban", unban))
+    application.add_handler(CommandHandler("grant_premium", handler(grant_premium)))
+    application.add_handler(CommandHandler("giftpremium", handler(gift_premium)))
+    application.add_handler(CommandHandler("broadcast", handler(broadcast)))
+    application.add_handler(CommandHandler("adminstats", handler(admin_stats)))
+    application.add_handler(CommandHandler("list_banned", handler(list_banned)))
+    application.add_handler(CommandHandler("unban", handler(unban)))
+    application.add_handler(CommandHandler("tracereport", handler(trace_report)))
+    application.add_handler(CommandHandler("health", handler(health)))
+    application.add_handler(CommandHandler("blockmedia", handler(block_media)))
+    application.add_handler(CommandHandler("unblockmedia", handler(unblock_media)))
     
     # Callback handlers
-    application.add_handler(CallbackQueryHandler(payment_manual_callback, pattern="^payment_manual$"))
-    application.add_handler(CallbackQueryHandler(payment_duration_callback, pattern="^pay_"))
+    application.add_handler(CallbackQueryHandler(handler(payment_manual_callback), pattern="^payment_manual$"))
+    application.add_handler(CallbackQueryHandler(handler(payment_duration_callback), pattern="^pay_"))
+    application.add_handler(CallbackQueryHandler(handler(list_banned_callback), pattern="^banned_page:"))
     
     # Message handler
     application.add_handler(MessageHandler(
         filters.TEXT | filters.PHOTO | filters.VOICE | filters.Sticker.ALL | filters.Document.ALL,
-        handle_message
+        handler(handle_message)
     ))
+    return application
+
+def main():
+    if not BOT_TOKEN:
+        raise ValueError("BOT_TOKEN tidak ditemukan! Buat file .env dan isi BOT_TOKEN")
     
+    application = build_application(BOT_TOKEN)
     logger.info("✅ ShadowChat Bot siap dengan semua fitur premium!")
     application.run_polling(allowed_updates=Update.ALL_TYPES)
 
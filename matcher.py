@@ -0,0 +1,296 @@
+"""Matcher: pairing user yang sedang mencari, per tick.
+
+/search hanya memasukkan user ke queue (sorted set). Prioritas:
+
+    prioritas = lama menunggu (detik) + MATCH_PREMIUM_BONUS kalau premium
+
+Score = waktu mulai (ms) dikurangi bonus premium, jadi ZRANGE dari awal
+sudah urut prioritas. Tiap MATCH_TICK_INTERVAL detik satu tick membaca
+maksimal MATCH_BATCH_SIZE waiter teratas lalu memasangkan sekaligus.
+
+Jadi premium didahulukan, tapi user free yang sudah lama menunggu (aging)
+tetap naik dan tidak kelaparan. Tiap user dipasangkan dengan kandidat cocok
+berprioritas tertinggi. Cocok = preferensi gender kedua pihak terpenuhi.
+
+Member queue: "user_id|gender|want|premium" (gender/want "-" kalau kosong),
+sehingga satu tick tidak perlu lookup per user. Hanya satu instance yang
+menjalankan tick pada satu waktu (lock MATCHER_LOCK).
+
+Di run_matcher pairing (CPU murni) jalan di thread lewat asyncio.to_thread,
+jadi event loop hanya tertahan selama round-trip pipeline tick.
+"""
+import time
+import asyncio
+import logging
+from collections import deque, namedtuple
+from typing import List, Optional, Tuple
+from telegram.error import Forbidden
+from config import (
+    INSTANCE_ID, MATCH_TICK_INTERVAL, MATCH_PREMIUM_BONUS, MATCH_MAX_WAIT,
+    MATCH_NOTIFY_CONCURRENCY, MATCH_LOCK_TTL, MATCH_BATCH_SIZE, SESSION_TTL
+)
+from utils import r, end_session
+from keyschema import (
+    QUEUE_WAITING, MATCHER_LOCK, queue_keys, queue_key_for, search_pointer_key,
+    session_pointer_key, session_key as make_session_key, chat_count_key, interests_key,
+    STATS_SESSIONS, STATS_USERS
+)
+from analytics import emit_to
+from breaker import StorageUnavailable
+
+logger = logging.getLogger(__name__)
+
+Waiter = namedtuple("Waiter", "priority user_id gender want premium since member key")
+
+def encode_member(user_id: int, gender: str, want: Optional[str], premium: bool) -> str:
+    return f"{user_id}|{gender or '-'}|{want or '-'}|{int(bool(premium))}"
+
+def decode_member(member: str) -> Optional[Tuple[int, Optional[str], Optional[str], bool]]:
+    try:
+        user_id, gender, want, premium = member.split("|")
+        return int(user_id), None if gender == "-" else gender, None if want == "-" else want, premium == "1"
+    except ValueError:
+        return None
+
+def member_user_id(member: str) -> str:
+    return member.split("|", 1)[0]
+
+def queue_score(since: float, premium: bool) -> float:
+    """Score queue dari waktu mulai (ms): premium maju MATCH_PREMIUM_BONUS detik"""
+    return since - (MATCH_PREMIUM_BONUS * 1000 if premium else 0)
+
+# --- dipanggil dari /search & /stop ---
+def enqueue_search(user_id: int, gender: str, want: Optional[str], premium: bool, now: Optional[float] = None):
+    """Masukkan (atau perbarui) user di queue. Waktu tunggu lama dipertahankan"""
+    key = queue_key_for(QUEUE_WAITING, user_id)
+    member = encode_member(user_id, gender, want, premium)
+    since = (time.time() if now is None else now) * 1000
+
+    old = r.get(search_pointer_key(user_id))
+    if old:
+        score = r.zscore(key, old)
+        decoded = decode_member(old)
+        if score is not None and decoded:
+            since = score - queue_score(0, decoded[3])
+        if old != member:
+            r.zrem(key, old)
+
+    pipe = r.pipeline(transaction=False)
+    pipe.zadd(key, {member: queue_score(since, premium)})
+    pipe.set(search_pointer_key(user_id), member, ex=MATCH_MAX_WAIT)
+    pipe.execute()
+
+def cancel_search(user_id: int) -> bool:
+    """Keluarkan user dari queue, return True kalau tadi sedang mencari"""
+    member = r.get(search_pointer_key(user_id))
+    if not member:
+        return False
+    pipe = r.pipeline(transaction=False)
+    pipe.zrem(queue_key_for(QUEUE_WAITING, user_id), member)
+    pipe.delete(search_pointer_key(user_id))
+    return bool(pipe.execute()[0])
+
+def is_searching(user_id: int) -> bool:
+    return bool(r.exists(search_pointer_key(user_id)))
+
+def count_waiting() -> int:
+    return sum(r.zcard(key) for key in queue_keys(QUEUE_WAITING))
+
+# --- tick ---
+def _compatible(a: Waiter, b: Waiter) -> bool:
+    return (a.want is None or a.want == b.gender) and (b.want is None or b.want == a.gender)
+
+def pair_waiters(waiters: List[Waiter]) -> Tuple[List[Tuple[Waiter, Waiter]], List[Waiter]]:
+    """Pairing greedy berdasarkan prioritas.
+
+    Waiter dikelompokkan per (gender, want), masing-masing deque terurut
+    prioritas. Untuk tiap waiter (prioritas tertinggi dulu) cukup melihat
+    kepala tiap kelompok yang cocok: O(n x jumlah kelompok).
+    """
+    waiters = sorted(waiters, key=lambda w: w.priority, reverse=True)
+    groups = {}
+    for waiter in waiters:
+        groups.setdefault((waiter.gender, waiter.want), deque()).append(waiter)
+
+    taken = set()
+    pairs, unmatched = [], []
+    for waiter in waiters:
+        if waiter.user_id in taken:
+            continue
+        taken.add(waiter.user_id)
+
+        best = None
+        for group in groups.values():
+            while group and group[0].user_id in taken:
+                group.popleft()
+            if not group or not _compatible(waiter, group[0]):
+                continue
+            if best is None or group[0].priority > best[0].priority:
+                best = group
+        if best is None:
+            # Tidak ada pasangan cocok sama sekali (kecocokan simetris)
+            unmatched.append(waiter)
+            continue
+        partner = best.popleft()
+        taken.add(partner.user_id)
+        pairs.append((waiter, partner))
+    return pairs, unmatched
+
+def _read_waiters(now: float, limit: int = MATCH_BATCH_SIZE) -> Tuple[List[Waiter], List[Waiter]]:
+    """Baca waiter terlama dari tiap queue (total ~limit), pisahkan yang masih
+    menunggu dan yang sudah kedaluwarsa"""
+    keys = queue_keys(QUEUE_WAITING)
+    per_key = max(1, -(-limit // len(keys)))
+    pipe = r.pipeline(transaction=False)
+    for key in keys:
+        pipe.zrange(key, 0, per_key - 1, withscores=True)
+    results = pipe.execute()
+
+    waiting, expired, seen = [], [], set()
+    for key, entries in zip(keys, results):
+        for member, score in entries:
+            decoded = decode_member(member)
+            if decoded is None or decoded[0] in seen:
+                continue
+            user_id, gender, want, premium = decoded
+            seen.add(user_id)
+            since = score - queue_score(0, premium)
+            waited = now - since / 1000
+            priority = waited + (MATCH_PREMIUM_BONUS if premium else 0)
+            waiter = Waiter(priority, user_id, gender, want, premium, since, member, key)
+            (expired if waited > MATCH_MAX_WAIT else waiting).append(waiter)
+    return waiting, expired
+
+def match_once(now: Optional[float] = None) -> Tuple[List[dict], List[int]]:
+    """Satu tick matching. Return (pasangan baru, user yang search-nya kedaluwarsa).
+
+    Pasangan: {"a", "b", "wait_a", "wait_b", "common"}; waktu dalam detik.
+    """
+    now = time.time() if now is None else now
+    waiting, expired = _read_waiters(now)
+    pairs, _ = pair_waiters(waiting)
+    return _commit_pairs(pairs, expired, now)
+
+async def match_tick(now: Optional[float] = None) -> Tuple[List[dict], List[int]]:
+    """Seperti match_once, tapi pairing jalan di thread supaya handler tetap dilayani"""
+    now = time.time() if now is None else now
+    waiting, expired = _read_waiters(now)
+    pairs, _ = await asyncio.to_thread(pair_waiters, waiting)
+    return _commit_pairs(pairs, expired, now)
+
+def _commit_pairs(pairs: List[Tuple[Waiter, Waiter]], expired: List[Waiter],
+                  now: float) -> Tuple[List[dict], List[int]]:
+    """Tulis hasil pairing: keluarkan dari queue, buat session, event matched"""
+    # Fase 1: keluarkan dari queue. ZREM = 0 berarti user batal di tengah tick
+    pipe = r.pipeline(transaction=False)
+    for a, b in pairs:
+        pipe.zrem(a.key, a.member)
+        pipe.zrem(b.key, b.member)
+    for waiter in expired:
+        pipe.zrem(waiter.key, waiter.member)
+        pipe.delete(search_pointer_key(waiter.user_id))
+    removed = pipe.execute()
+
+    confirmed = []
+    pipe = r.pipeline(transaction=False)
+    for i, (a, b) in enumerate(pairs):
+        got_a, got_b = removed[2 * i], removed[2 * i + 1]
+        if got_a and got_b:
+            confirmed.append((a, b))
+        elif got_a or got_b:
+            # Kembalikan yang masih menunggu dengan waktu mulai semula
+            still = a if got_a else b
+            pipe.zadd(still.key, {still.member: queue_score(still.since, still.premium)})
+
+    # Fase 2: buat session + event matched untuk pasangan yang terkonfirmasi
+    started = int(now)
+    interests_at = []
+    for a, b in confirmed:
+        session_key = make_session_key(a.user_id, b.user_id)
+        pipe.hset(session_key, mapping={"user_a": a.user_id, "user_b": b.user_id, "started": started})
+        pipe.expire(session_key, SESSION_TTL)
+        pipe.zadd(STATS_SESSIONS, {session_key: started})
+        pipe.pfadd(STATS_USERS, a.user_id, b.user_id)
+        for waiter in (a, b):
+            pipe.set(session_pointer_key(waiter.user_id), session_key)
+            pipe.delete(search_pointer_key(waiter.user_id))
+            pipe.incr(chat_count_key(waiter.user_id))
+        interests_at.append(len(pipe))
+        pipe.smembers(interests_key(a.user_id))
+        pipe.smembers(interests_key(b.user_id))
+        wait = (2 * now - (a.since + b.since) / 1000) / 2
+        emit_to(pipe, "matched", a.user_id, p=b.user_id, w=int(wait))
+    results = pipe.execute() if len(pipe) else []
+
+    matched = []
+    for (a, b), index in zip(confirmed, interests_at):
+        interests_a, interests_b = results[index], results[index + 1]
+        matched.append({
+            "a": a.user_id, "b": b.user_id,
+            "wait_a": now - a.since / 1000, "wait_b": now - b.since / 1000,
+            "premium_a": a.premium, "premium_b": b.premium,
+            "common": sorted(interests_a & interests_b)
+        })
+    return matched, [waiter.user_id for waiter in expired]
+
+# --- notifikasi ---
+async def _end_pair(bot, user_id: int, partner_id: int):
+    """User tidak bisa dikirimi pesan: akhiri session, kabari pasangannya"""
+    session_key = r.get(session_pointer_key(user_id))
+    if session_key:
+        end_session(session_key, user_id, partner_id)
+    try:
+        await bot.send_message(partner_id, "⚠️ Pasanganmu tidak aktif. Ketik /search untuk cari yang baru.")
+    except Exception:
+        pass
+
+async def notify_matches(bot, matched: List[dict], expired: List[int]):
+    """Kirim notifikasi satu batch tick dengan concurrency terbatas"""
+    semaphore = asyncio.Semaphore(MATCH_NOTIFY_CONCURRENCY)
+
+    async def send(user_id: int, text: str, partner_id: Optional[int] = None):
+        async with semaphore:
+            try:
+                await bot.send_message(user_id, text, parse_mode="Markdown")
+            except Forbidden:
+                if partner_id:
+                    await _end_pair(bot, user_id, partner_id)
+            except Exception as e:
+                logger.warning(f"Gagal kirim notifikasi match ke {user_id}: {e}")
+
+    jobs = []
+    for pair in matched:
+        text = "✅ Terhubung!"
+        if pair["common"]:
+            text += f"\n🎯 Minat sama: {', '.join(pair['common'])}"
+        jobs.append(send(pair["a"], text, pair["b"]))
+        jobs.append(send(pair["b"], text, pair["a"]))
+    for user_id in expired:
+        jobs.append(send(user_id, "⏳ Belum ada pasangan yang cocok. Ketik /search untuk coba lagi."))
+    await asyncio.gather(*jobs)
+
+def _acquire_lock() -> bool:
+    return bool(r.set(MATCHER_LOCK, INSTANCE_ID, nx=True, ex=MATCH_LOCK_TTL))
+
+def _release_lock():
+    if r.get(MATCHER_LOCK) == INSTANCE_ID:
+        r.delete(MATCHER_LOCK)
+
+async def run_matcher(bot, interval: float = MATCH_TICK_INTERVAL):
+    """Background worker: satu tick tiap `interval` detik"""
+    while True:
+        started = time.monotonic()
+        try:
+            if _acquire_lock():
+                try:
+                    matched, expired = await match_tick()
+                finally:
+                    _release_lock()
+                if matched or expired:
+                    await notify_matches(bot, matched, expired)
+        except StorageUnavailable as e:
+            # Breaker terbuka: tick berikutnya sekaligus jadi probe pemulihan
+            logger.debug(f"Tick matcher dilewati: {e}")
+        except Exception as e:
+            logger.warning(f"Tick matcher gagal: {e}")
+        await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
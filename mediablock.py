@@ -0,0 +1,161 @@
+"""Blocklist media yang sudah ditandai moderator, berdasarkan file_unique_id.
+
+Sumber kebenaran: set Redis MEDIA_BLOCKLIST. Tiap worker menyimpan salinan
+berupa Bloom filter di memori, jadi media yang tidak diblokir (hampir semua)
+lolos tanpa round trip Redis. Hasil positif Bloom dikonfirmasi dengan
+SISMEMBER, jadi false positive tidak memblokir media dan unblock cukup SREM.
+
+Penambahan juga ditulis ke stream MEDIA_BLOCKLIST_LOG. Worker lain membaca
+entry baru dari posisi terakhirnya (XRANGE), bukan memuat ulang seluruh set.
+"""
+import math
+import asyncio
+import hashlib
+import logging
+from collections import Counter
+from typing import Iterable, List
+from config import (
+    MEDIA_BLOOM_CAPACITY, MEDIA_BLOOM_ERROR_RATE, MEDIA_BLOCKLIST_REFRESH,
+    MEDIA_BLOCKLIST_LOG_MAXLEN, MEDIA_RECENT_PER_USER, MEDIA_RECENT_TTL
+)
+from utils import r
+from breaker import StorageUnavailable
+from keyschema import MEDIA_BLOCKLIST, MEDIA_BLOCKLIST_LOG, recent_media_key
+
+logger = logging.getLogger(__name__)
+
+class BloomFilter:
+    """Bloom filter bytearray dengan double hashing dari satu digest blake2b"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+def media_ids(message) -> List[str]:
+    """Semua file_unique_id media dalam pesan (semua ukuran foto)"""
+    if message.photo:
+        return [photo.file_unique_id for photo in message.photo]
+    for media in (message.voice, message.sticker, message.document):
+        if media:
+            return [media.file_unique_id]
+    return []
+
+class MediaBlocklist:
+    def __init__(self):
+        self.bloom = BloomFilter(MEDIA_BLOOM_CAPACITY, MEDIA_BLOOM_ERROR_RATE)
+        self.last_id = "0-0"
+        # SCARD blocklist (semua worker, termasuk unblock), diperbarui tiap refresh
+        self.size = 0
+        self.stats = Counter()
+
+    def load(self):
+        """Muat ulang penuh dari set Redis (saat start atau Bloom sudah penuh)"""
+        # Posisi log diambil dulu supaya penambahan selama SSCAN tidak terlewat
+        last = r.xrevrange(MEDIA_BLOCKLIST_LOG, count=1)
+        last_id = last[0][0] if last else "0-0"
+        total = r.scard(MEDIA_BLOCKLIST)
+        bloom = BloomFilter(max(MEDIA_BLOOM_CAPACITY, total * 2), MEDIA_BLOOM_ERROR_RATE)
+        for file_unique_id in r.sscan_iter(MEDIA_BLOCKLIST, count=1000):
+            bloom.add(file_unique_id)
+        self.bloom, self.last_id, self.size = bloom, last_id, total
+        self.stats["reloads"] += 1
+        logger.info(f"Blocklist media dimuat: {bloom.count} media")
+
+    def refresh(self) -> int:
+        """Tambahkan entry log baru sejak refresh terakhir"""
+        added = 0
+        while True:
+            entries = r.xrange(MEDIA_BLOCKLIST_LOG, min=f"({self.last_id}", count=1000)
+            for entry_id, fields in entries:
+                self.bloom.add(fields["id"])
+                self.last_id = entry_id
+                added += 1
+            if len(entries) < 1000:
+                break
+        if self.bloom.count > self.bloom.capacity:
+            self.load()
+        else:
+            self.size = r.scard(MEDIA_BLOCKLIST)
+        return added
+
+    def is_blocked(self, file_unique_ids: Iterable[str]) -> bool:
+        for file_unique_id in file_unique_ids:
+            if file_unique_id not in self.bloom:
+                continue
+            try:
+                confirmed = r.sismember(MEDIA_BLOCKLIST, file_unique_id)
+            except StorageUnavailable:
+                # Tidak bisa dikonfirmasi: fail-closed (false positive hanya ~0.1%)
+                confirmed = True
+            if confirmed:
+                self.stats["blocked"] += 1
+                return True
+            self.stats["false_positive"] += 1
+        return False
+
+    def block(self, file_unique_ids: Iterable[str], blocked_by: int) -> int:
+        """Blokir media, return jumlah yang baru masuk blocklist"""
+        file_unique_ids = list(dict.fromkeys(file_unique_ids))
+        if not file_unique_ids:
+            return 0
+        pipe = r.pipeline(transaction=False)
+        for file_unique_id in file_unique_ids:
+            pipe.sadd(MEDIA_BLOCKLIST, file_unique_id)
+            pipe.xadd(MEDIA_BLOCKLIST_LOG, {"id": file_unique_id, "by": blocked_by},
+                      maxlen=MEDIA_BLOCKLIST_LOG_MAXLEN, approximate=True)
+        results = pipe.execute()
+        # Worker ini langsung tahu, worker lain lewat refresh
+        for file_unique_id in file_unique_ids:
+            self.bloom.add(file_unique_id)
+        added = sum(results[0::2])
+        self.size += added
+        return added
+
+    def unblock(self, file_unique_id: str) -> bool:
+        removed = bool(r.srem(MEDIA_BLOCKLIST, file_unique_id))
+        self.size -= removed
+        return removed
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "size": self.size}
+
+def remember_media(user_id: int, file_unique_ids: List[str]):
+    """Simpan media terakhir user (list capped) supaya bisa diblokir dari laporan"""
+    key = recent_media_key(user_id)
+    pipe = r.pipeline(transaction=False)
+    pipe.lpush(key, *file_unique_ids)
+    pipe.ltrim(key, 0, MEDIA_RECENT_PER_USER - 1)
+    pipe.expire(key, MEDIA_RECENT_TTL)
+    pipe.execute()
+
+def get_recent_media(user_id: int) -> List[str]:
+    return r.lrange(recent_media_key(user_id), 0, -1)
+
+async def run_blocklist_refresher(interval: float = MEDIA_BLOCKLIST_REFRESH):
+    """Background worker: refresh inkremental Bloom filter dari log"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            media_blocklist.refresh()
+        except Exception as e:
+            logger.warning(f"Gagal refresh blocklist media: {e}")
+
+media_blocklist = MediaBlocklist()
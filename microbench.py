@@ -0,0 +1,232 @@
+"""Microbenchmark komponen hot path (tanpa Telegram, tanpa Redis).
+
+Contoh:
+    python microbench.py spam --messages 200000
+    python microbench.py spam --promo-rate 0.05 --json
+    python microbench.py media --blocked 100000
+    python microbench.py matching --searchers 10000
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+WORDS = (
+    "aku kamu dia kita halo hai apa kabar lagi ngapain dari mana umur berapa "
+    "suka main game nonton film musik makan tidur kerja kuliah sekolah rumah "
+    "kota jakarta bandung surabaya iya gak tau sih dong deh kok wkwk haha "
+    "boleh kenalan nama siapa hobi weekend besok kemarin malam pagi siang"
+).split()
+
+PROMO = [
+    "Halo kak join grup promo kita di t.me/promo{n} dapat saldo gratis {n}rb tiap hari buruan",
+    "Dapatkan followers instagram murah cuma {n} ribu chat admin wa 08{n} sekarang juga",
+    "Investasi aman profit {n} persen per minggu daftar sekarang link di bio kak",
+]
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def random_chat() -> str:
+    return " ".join(random.choices(WORDS, k=random.randint(2, 14)))
+
+def random_promo() -> str:
+    """Template promo dengan variasi kecil (angka, tanda baca, emoji)"""
+    text = random.choice(PROMO).format(n=random.randint(10, 99))
+    if random.random() < 0.5:
+        text += random.choice([" 🔥", "!!", " 💰💰", " ya"])
+    return text
+
+def bench_spam(args) -> dict:
+    from spam import SpamDetector, fingerprint
+
+    detector = SpamDetector()
+    spammers = set(random.sample(range(args.users), max(1, int(args.users * args.spammer_rate))))
+    partners = {}
+    timings = []
+    outcome = {"promo": [0, 0], "chat": [0, 0]}  # [total, ditahan/ditandai]
+
+    for _ in range(args.messages):
+        user_id = random.randrange(args.users)
+        # Spammer ganti pasangan (/next) tiap pesan, user biasa jarang
+        if user_id in spammers or random.random() < 0.02 or user_id not in partners:
+            partners[user_id] = random.randrange(args.users, args.users * 2)
+        is_promo = user_id in spammers and random.random() < args.promo_rate
+        text = random_promo() if is_promo else random_chat()
+
+        started = time.perf_counter_ns()
+        verdict = detector.check(user_id, partners[user_id], text)
+        timings.append(time.perf_counter_ns() - started)
+
+        bucket = outcome["promo" if is_promo else "chat"]
+        bucket[0] += 1
+        bucket[1] += verdict is not None
+
+    # Biaya fingerprint saja, cache fitur hangat vs teks baru
+    sample = [random_chat() for _ in range(2000)]
+    started = time.perf_counter_ns()
+    for text in sample:
+        fingerprint(text)
+    fingerprint_ns = (time.perf_counter_ns() - started) / len(sample)
+
+    return {
+        "messages": args.messages,
+        "mean_us": round(sum(timings) / len(timings) / 1000, 2),
+        "p50_us": round(percentile(timings, 50) / 1000, 2),
+        "p99_us": round(percentile(timings, 99) / 1000, 2),
+        "fingerprint_us": round(fingerprint_ns / 1000, 2),
+        "promo_messages": outcome["promo"][0],
+        "promo_caught_pct": round(100 * outcome["promo"][1] / max(1, outcome["promo"][0]), 1),
+        "chat_messages": outcome["chat"][0],
+        "chat_false_positive_pct": round(100 * outcome["chat"][1] / max(1, outcome["chat"][0]), 3),
+        "detector": detector.get_stats()
+    }
+
+def print_spam(report: dict):
+    print(f"Pesan: {report['messages']}  check(): mean {report['mean_us']} us, "
+          f"p50 {report['p50_us']} us, p99 {report['p99_us']} us")
+    print(f"fingerprint(): {report['fingerprint_us']} us/teks")
+    print(f"Promo tertangkap: {report['promo_caught_pct']}% dari {report['promo_messages']}")
+    print(f"False positive chat biasa: {report['chat_false_positive_pct']}% dari {report['chat_messages']}")
+    print(f"Detector: {report['detector']}")
+
+def bench_media(args) -> dict:
+    from mediablock import BloomFilter
+    from config import MEDIA_BLOOM_CAPACITY, MEDIA_BLOOM_ERROR_RATE
+
+    bloom = BloomFilter(max(MEDIA_BLOOM_CAPACITY, args.blocked * 2), MEDIA_BLOOM_ERROR_RATE)
+    for i in range(args.blocked):
+        bloom.add(f"AgAD{i:08d}blocked")
+
+    # Lookup media yang tidak diblokir: jalur normal relay, tanpa Redis
+    lookups = [f"AQAD{random.getrandbits(48):012x}" for _ in range(args.lookups)]
+    started = time.perf_counter_ns()
+    false_positives = sum(1 for item in lookups if item in bloom)
+    elapsed = time.perf_counter_ns() - started
+
+    return {
+        "blocked": args.blocked,
+        "bloom_kib": round(len(bloom.bits) / 1024, 1),
+        "hashes": bloom.hashes,
+        "lookup_us": round(elapsed / len(lookups) / 1000, 2),
+        "false_positive_pct": round(100 * false_positives / len(lookups), 4)
+    }
+
+def print_media(report: dict):
+    print(f"Blocklist: {report['blocked']} media, Bloom {report['bloom_kib']} KiB, {report['hashes']} hash")
+    print(f"Lookup (tidak diblokir): {report['lookup_us']} us, "
+          f"false positive {report['false_positive_pct']}% (dikonfirmasi ke Redis)")
+
+def bench_matching(args) -> dict:
+    """Steady state: jumlah pencari dijaga tetap, jam disimulasikan per tick"""
+    if args.redis_url:
+        os.environ["REDIS_URL"] = args.redis_url
+    else:
+        os.environ["STORAGE_BACKEND"] = "memory"
+    from matcher import enqueue_search, match_once
+    from config import MATCH_TICK_INTERVAL
+
+    user_ids = iter(range(10 ** 12, 10 ** 13))
+    now = 1_700_000_000.0
+
+    def arrive(count: int, spread: float):
+        for _ in range(count):
+            premium = random.random() < args.premium_rate
+            roll = random.random()
+            gender = "male" if roll < args.male_rate else ("female" if roll < 0.95 else "")
+            want = None
+            if premium and gender and random.random() < 0.7:
+                want = "female" if gender == "male" else "male"
+            # Datang kapan saja di antara dua tick
+            enqueue_search(next(user_ids), gender, want, premium,
+                           now=now - random.uniform(0, spread))
+
+    arrive(args.searchers, MATCH_TICK_INTERVAL)
+    tick_ms, pairs_total, expired_total = [], 0, 0
+    waits = {"premium": [], "free": []}
+    for _ in range(args.ticks):
+        started = time.perf_counter()
+        matched, expired = match_once(now=now)
+        tick_ms.append((time.perf_counter() - started) * 1000)
+
+        for pair in matched:
+            waits["premium" if pair["premium_a"] else "free"].append(pair["wait_a"])
+            waits["premium" if pair["premium_b"] else "free"].append(pair["wait_b"])
+        pairs_total += len(matched)
+        expired_total += len(expired)
+
+        # Tick yang lebih lama dari interval menunda tick berikutnya (dan time-to-match)
+        step = max(MATCH_TICK_INTERVAL, tick_ms[-1] / 1000)
+        now += step
+        arrive(2 * len(matched) + len(expired), step)
+
+    total_s = sum(tick_ms) / 1000
+    return {
+        "searchers": args.searchers,
+        "ticks": args.ticks,
+        "tick_ms_mean": round(sum(tick_ms) / len(tick_ms), 1),
+        "tick_ms_p99": round(percentile(tick_ms, 99), 1),
+        "pairs": pairs_total,
+        "pairs_per_s": round(pairs_total / total_s) if total_s else 0,
+        "expired": expired_total,
+        "ttm_premium_p50_s": round(percentile(waits["premium"], 50), 2),
+        "ttm_premium_p99_s": round(percentile(waits["premium"], 99), 2),
+        "ttm_free_p50_s": round(percentile(waits["free"], 50), 2),
+        "ttm_free_p99_s": round(percentile(waits["free"], 99), 2)
+    }
+
+def print_matching(report: dict):
+    print(f"Pencari: {report['searchers']}  Tick: {report['ticks']}  "
+          f"durasi tick mean {report['tick_ms_mean']} ms, p99 {report['tick_ms_p99']} ms")
+    print(f"Pasangan: {report['pairs']} ({report['pairs_per_s']} pasangan/s waktu tick), "
+          f"kedaluwarsa: {report['expired']}")
+    print(f"Time-to-match premium: p50 {report['ttm_premium_p50_s']} s, p99 {report['ttm_premium_p99_s']} s")
+    print(f"Time-to-match free:    p50 {report['ttm_free_p50_s']} s, p99 {report['ttm_free_p99_s']} s")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Microbenchmark hot path ShadowChat")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="output JSON")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    spam = sub.add_parser("spam", help="SpamDetector.check per pesan")
+    spam.add_argument("--messages", type=int, default=100000)
+    spam.add_argument("--users", type=int, default=5000)
+    spam.add_argument("--spammer-rate", type=float, default=0.01, help="porsi user yang spam")
+    spam.add_argument("--promo-rate", type=float, default=0.8, help="porsi pesan promo dari spammer")
+
+    media = sub.add_parser("media", help="lookup Bloom filter blocklist media")
+    media.add_argument("--blocked", type=int, default=100000)
+    media.add_argument("--lookups", type=int, default=200000)
+
+    matching = sub.add_parser("matching", help="tick matcher dengan N pencari simultan")
+    matching.add_argument("--searchers", type=int, default=10000)
+    matching.add_argument("--ticks", type=int, default=40)
+    matching.add_argument("--premium-rate", type=float, default=0.2)
+    matching.add_argument("--male-rate", type=float, default=0.7, help="porsi pencari laki-laki")
+    matching.add_argument("--redis-url", default=None, help="default: storage in-memory")
+    return parser.parse_args(argv)
+
+BENCHES = {
+    "spam": (bench_spam, print_spam),
+    "media": (bench_media, print_media),
+    "matching": (bench_matching, print_matching),
+}
+
+def main(argv=None):
+    args = parse_args(argv)
+    random.seed(args.seed)
+    run, show = BENCHES[args.bench]
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        show(report)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,146 @@
+"""Migrasi key Redis dari layout legacy ke layout cluster (hash tag).
+
+Jalankan terhadap Redis standalone yang masih berisi key legacy, dengan bot
+dalam keadaan mati. Setelah selesai, set KEY_SCHEMA=cluster lalu pindahkan
+datanya ke Redis Cluster (mis. redis-cli --cluster import) atau tetap
+jalankan di standalone.
+
+Contoh:
+    python migrate_keys.py --dry-run
+    python migrate_keys.py --redis-url redis://localhost:6379/0
+"""
+import os
+import time
+import argparse
+from collections import Counter
+
+# Nama tujuan selalu layout cluster, apa pun isi .env
+os.environ["KEY_SCHEMA"] = "cluster"
+
+import redis
+from config import REDIS_URL
+from keyschema import (
+    legacy_to_cluster, queue_keys, queue_key_for, active_users_keys,
+    active_users_key_for, QUEUES, LEGACY_QUEUES
+)
+
+BATCH_SIZE = 1000
+
+def migrate_renames(client, dry_run: bool, stats: Counter):
+    """RENAME semua key per-user & session ke nama cluster"""
+    batch = []
+
+    def flush():
+        if not batch:
+            return
+        pipe = client.pipeline(transaction=False)
+        pointers = []
+        for old, new in batch:
+            if not dry_run:
+                pipe.rename(old, new)
+            if new.endswith(":session") and not old.startswith("session:"):
+                pointers.append(new if not dry_run else old)
+        pipe.execute()
+
+        # Pointer session menyimpan nama session legacy -> tulis ulang
+        if pointers:
+            values = client.mget(pointers)
+            pipe = client.pipeline(transaction=False)
+            for pointer, value in zip(pointers, values):
+                renamed = legacy_to_cluster(value) if value else None
+                if renamed and not dry_run:
+                    pipe.set(pointer, renamed, keepttl=True)
+                if renamed:
+                    stats["pointers"] += 1
+            pipe.execute()
+        batch.clear()
+
+    for key in client.scan_iter(count=BATCH_SIZE):
+        new = legacy_to_cluster(key)
+        if not new:
+            continue
+        batch.append((key, new))
+        stats[key.split(":")[0]] += 1
+        if len(batch) >= BATCH_SIZE:
+            flush()
+    flush()
+
+def migrate_queues(client, dry_run: bool, stats: Counter):
+    """Pindahkan isi queue legacy ke shard queue"""
+    # Queue list FIFO versi lama: tetap list, dikonversi lifecycle saat boot
+    for queue in LEGACY_QUEUES:
+        legacy = f"queue:{queue}"
+        if legacy in queue_keys(queue) or client.type(legacy) != "list":
+            continue
+        members = client.lrange(legacy, 0, -1)
+        stats["queue"] += len(members)
+        if dry_run or not members:
+            continue
+        pipe = client.pipeline(transaction=False)
+        for user_id in members:
+            key = queue_key_for(queue, user_id)
+            pipe.rpush(key, user_id)
+            pipe.expire(key, 300)
+        pipe.delete(legacy)
+        pipe.execute()
+
+    # Queue matcher (sorted set, member "user_id|..."): waktu mulai search dipertahankan
+    for queue in QUEUES:
+        legacy = f"queue:{queue}"
+        if legacy in queue_keys(queue):
+            continue
+        entries = client.zrange(legacy, 0, -1, withscores=True)
+        stats["queue"] += len(entries)
+        if dry_run or not entries:
+            continue
+        pipe = client.pipeline(transaction=False)
+        for member, since in entries:
+            pipe.zadd(queue_key_for(queue, member.split("|", 1)[0]), {member: since})
+        pipe.delete(legacy)
+        pipe.execute()
+
+def migrate_active_users(client, dry_run: bool, stats: Counter):
+    """Pecah sorted set active_users ke shard"""
+    if "active_users" in active_users_keys():
+        return
+    batch = {}
+    for user_id, score in client.zscan_iter("active_users", count=BATCH_SIZE):
+        batch[user_id] = score
+        stats["active_users"] += 1
+        if len(batch) >= BATCH_SIZE:
+            _write_active(client, batch, dry_run)
+    _write_active(client, batch, dry_run)
+    if not dry_run:
+        client.delete("active_users")
+
+def _write_active(client, batch: dict, dry_run: bool):
+    if batch and not dry_run:
+        pipe = client.pipeline(transaction=False)
+        for user_id, score in batch.items():
+            pipe.zadd(active_users_key_for(user_id), {user_id: score})
+        pipe.execute()
+    batch.clear()
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrasi key legacy -> cluster")
+    parser.add_argument("--redis-url", default=REDIS_URL)
+    parser.add_argument("--dry-run", action="store_true", help="hitung saja, tanpa menulis")
+    args = parser.parse_args()
+
+    client = redis.from_url(args.redis_url, decode_responses=True)
+    stats = Counter()
+    started = time.perf_counter()
+
+    migrate_renames(client, args.dry_run, stats)
+    migrate_queues(client, args.dry_run, stats)
+    migrate_active_users(client, args.dry_run, stats)
+
+    elapsed = time.perf_counter() - started
+    total = sum(stats.values())
+    mode = "DRY RUN" if args.dry_run else "selesai"
+    print(f"Migrasi {mode}: {total} key/entry dalam {elapsed:.2f} s")
+    for name, count in sorted(stats.items()):
+        print(f"  {name}: {count}")
+
+if __name__ == "__main__":
+    main()
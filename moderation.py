@@ -0,0 +1,145 @@
+import time
+import asyncio
+import logging
+from typing import Optional, List
+from config import (
+    ADMIN_IDS, AUTO_BAN_REPORTS, REPORT_WINDOW,
+    MODERATION_STREAM_MAXLEN, MODERATION_BATCH_SIZE, MODERATION_POLL_INTERVAL,
+    MODERATION_DIGEST_INTERVAL, MODERATION_NOTIFY_CONCURRENCY, MODERATION_CONSUMER
+)
+from utils import r, add_report, ban_user, is_banned
+from breaker import StorageUnavailable
+from keyschema import MODERATION_STREAM, reports_key
+from streams import ensure_group, GroupReader
+
+logger = logging.getLogger(__name__)
+
+STREAM = MODERATION_STREAM
+GROUP = "moderation"
+
+# Batas baris per digest supaya tetap di bawah limit 4096 karakter Telegram
+MAX_DIGEST_LINES = 40
+
+def publish_moderation_event(event_type: str, **fields) -> str:
+    """Publish aksi moderasi (report, appeal) ke stream, tanpa menunggu consumer"""
+    fields = {"type": event_type, "ts": int(time.time()), **fields}
+    return r.xadd(STREAM, fields, maxlen=MODERATION_STREAM_MAXLEN, approximate=True)
+
+def is_duplicate_report(user_id: int, reporter_id: int) -> bool:
+    """Check apakah reporter sudah melaporkan user ini dalam REPORT_WINDOW"""
+    score = r.zscore(reports_key(user_id), reporter_id)
+    return score is not None and score > time.time() - REPORT_WINDOW
+
+def handle_event(fields: dict) -> Optional[str]:
+    """Proses satu event moderasi, return baris digest untuk admin (atau None)"""
+    event_type = fields.get("type")
+    user_id = int(fields["user_id"])
+
+    if event_type == "report":
+        reporter_id = int(fields["reporter_id"])
+        if is_duplicate_report(user_id, reporter_id):
+            return None
+
+        count = add_report(user_id, reporter_id)
+        if count >= AUTO_BAN_REPORTS and not is_banned(user_id):
+            ban_user(user_id, "Auto-ban: Multiple reports", banned_by="auto")
+            logger.info(f"Auto-ban {user_id}: {count} reports dalam 24 jam")
+            return f"🚨 Auto-ban: user `{user_id}` ({count} reports dalam 24 jam)"
+        return f"📝 Laporan: user `{user_id}` ({count} reports dalam 24 jam)"
+
+    if event_type == "appeal":
+        return f"📨 Banding: user `{user_id}` meminta pencabutan blokir"
+
+    if event_type == "spam":
+        count = int(fields.get("count", 0))
+        if fields.get("kind") == "repeat":
+            return f"🧹 Spam: user `{user_id}` mengirim teks serupa ke {count} pasangan (ditahan)"
+        return f"🧹 Spam massal: teks serupa dari {count} user, terakhir `{user_id}`"
+
+    logger.warning(f"Event moderasi tidak dikenal: {fields}")
+    return None
+
+async def send_admin_digest(bot, lines: List[str]):
+    """Kirim satu digest ke semua admin dengan concurrency terbatas"""
+    text = f"🛡 **Digest Moderasi** ({len(lines)} event)\n" + "\n".join(lines[:MAX_DIGEST_LINES])
+    if len(lines) > MAX_DIGEST_LINES:
+        text += f"\n... dan {len(lines) - MAX_DIGEST_LINES} lainnya"
+
+    semaphore = asyncio.Semaphore(MODERATION_NOTIFY_CONCURRENCY)
+
+    async def notify(admin_id: int):
+        async with semaphore:
+            try:
+                await bot.send_message(admin_id, text, parse_mode="Markdown")
+            except Exception as e:
+                logger.warning(f"Gagal kirim digest ke admin {admin_id}: {e}")
+
+    await asyncio.gather(*(notify(admin_id) for admin_id in ADMIN_IDS))
+
+async def run_moderation_consumer(bot, consumer: str = MODERATION_CONSUMER):
+    """Consumer stream moderasi: apply ban, dedup reporter, kirim digest ke admin.
+
+    Entry di-ACK setelah digest-nya terkirim, jadi kalau proses mati di tengah
+    jalan, entry pending milik consumer ini diproses ulang saat start.
+    """
+    ensure_group(STREAM, GROUP)
+    reader = GroupReader(STREAM, GROUP, consumer, MODERATION_BATCH_SIZE)
+    digest, pending_ids = [], []
+    last_digest = time.monotonic()
+
+    async def flush():
+        nonlocal digest, pending_ids, last_digest
+        if digest:
+            await send_admin_digest(bot, digest)
+            # Sudah terkirim: tidak dikirim ulang kalau ACK di bawah gagal
+            digest = []
+        if pending_ids:
+            # Kalau gagal, pending_ids tetap dan ACK dicoba lagi di flush berikutnya
+            r.xack(STREAM, GROUP, *pending_ids)
+            pending_ids = []
+        last_digest = time.monotonic()
+
+    def log_failure(action: str, e: Exception):
+        log = logger.debug if isinstance(e, StorageUnavailable) else logger.warning
+        log(f"Gagal {action} stream moderasi: {e}")
+
+    try:
+        while True:
+            try:
+                entries = reader.read()
+            except Exception as e:
+                log_failure("membaca", e)
+                await asyncio.sleep(MODERATION_POLL_INTERVAL)
+                continue
+
+            for entry_id, fields in entries:
+                pending_ids.append(entry_id)
+                if not fields:
+                    # Entry sudah ter-trim dari stream
+                    continue
+                try:
+                    line = handle_event(fields)
+                except Exception as e:
+                    logger.warning(f"Gagal memproses event moderasi {entry_id}: {e}")
+                    continue
+                if line:
+                    digest.append(line)
+
+            if pending_ids and time.monotonic() - last_digest >= MODERATION_DIGEST_INTERVAL:
+                try:
+                    await flush()
+                except Exception as e:
+                    log_failure("ACK", e)
+                    await asyncio.sleep(MODERATION_POLL_INTERVAL)
+                    continue
+
+            if reader.idle(entries):
+                await asyncio.sleep(MODERATION_POLL_INTERVAL)
+    except asyncio.CancelledError:
+        # Shutdown: kirim digest terakhir sebelum berhenti. Entry yang gagal
+        # di-ACK tetap pending dan diproses ulang saat start.
+        try:
+            await flush()
+        except Exception as e:
+            log_failure("ACK", e)
+        raise
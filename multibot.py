@@ -0,0 +1,92 @@
+"""Jalankan beberapa bot ShadowChat dalam satu proses.
+
+    BOT_TOKENS="id=123:abc,my=456:def" python multibot.py
+
+Semua bot berbagi client Redis (satu connection pool), pool HTTP keluar
+(MULTIBOT_POOL_SIZE koneksi), censor, spam detector, outbox relay dan
+blocklist media. Data bot dipisah lewat prefix key "<nama>:" (tenancy.py);
+tiap bot punya queue, matcher, consumer moderasi & analytics sendiri.
+Metrik per bot ada di /health.
+"""
+import re
+import time
+import signal
+import asyncio
+import logging
+from telegram import Update
+from telegram.request import HTTPXRequest
+from config import BOT_TOKENS, MULTIBOT_POOL_SIZE
+from tenancy import tenant_context
+from main import build_application
+from lifecycle import drain, stop_workers
+
+logger = logging.getLogger(__name__)
+
+TENANT_NAME = re.compile(r"^[a-z0-9_]+$")
+
+async def start_tenant(name: str, token: str, request: HTTPXRequest, updates_request: HTTPXRequest, shared: bool):
+    """Inisialisasi satu bot; semua task-nya (polling, handler, worker) milik tenant `name`"""
+    with tenant_context(name):
+        application = build_application(token, request=request, updates_request=updates_request)
+        application.bot_data["tenant"] = name
+        application.bot_data["shared_workers"] = shared
+        await application.initialize()
+        await application.post_init(application)
+        await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+        await application.start()
+    logger.info(f"Bot {name} (@{application.bot.username}) jalan")
+    return application
+
+async def stop_tenants(applications: dict):
+    """Hentikan polling semua bot, drain state bersama sekali, baru tutup koneksi.
+
+    post_stop tidak dipakai: drain per bot akan menunggu handler & outbox
+    bot lain yang masih jalan.
+    """
+    started = time.perf_counter()
+    for name, application in applications.items():
+        with tenant_context(name):
+            if application.updater.running:
+                await application.updater.stop()
+    for name, application in applications.items():
+        with tenant_context(name):
+            if application.running:
+                await application.stop()
+    drained = await drain()
+    for name, application in applications.items():
+        with tenant_context(name):
+            await stop_workers(application, drained, started)
+    for name, application in applications.items():
+        with tenant_context(name):
+            await application.shutdown()
+
+async def run(tokens: dict):
+    request = HTTPXRequest(connection_pool_size=MULTIBOT_POOL_SIZE)
+    # Long polling getUpdates dapat pool sendiri supaya tidak menahan koneksi kirim pesan
+    updates_request = HTTPXRequest(connection_pool_size=len(tokens) + 1, read_timeout=None)
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    applications = {}
+    try:
+        for index, (name, token) in enumerate(tokens.items()):
+            # Worker bersama (refresher blocklist media) cukup dijalankan bot pertama
+            applications[name] = await start_tenant(name, token, request, updates_request, shared=index == 0)
+        logger.info(f"✅ {len(applications)} bot ShadowChat siap dalam satu proses")
+        await stop_event.wait()
+    finally:
+        await stop_tenants(applications)
+
+def main():
+    if not BOT_TOKENS:
+        raise ValueError("BOT_TOKENS kosong! Isi dengan format nama=token,nama2=token2")
+    invalid = [name for name in BOT_TOKENS if not TENANT_NAME.match(name)]
+    if invalid:
+        raise ValueError(f"Nama bot tidak valid (hanya a-z, 0-9, _): {', '.join(invalid)}")
+    asyncio.run(run(BOT_TOKENS))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+import time
+import random
+import asyncio
+import logging
+import functools
+from datetime import timedelta
+from collections import Counter, deque
+from typing import Optional
+from telegram import InputMediaPhoto, InputMediaDocument
+from telegram.constants import ChatAction
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+from config import (
+    ALBUM_FLUSH_DELAY, ALBUM_MAX_ITEMS,
+    TYPING_INTERVAL, TYPING_DELAY, TYPING_MAX_PENDING,
+    RELAY_MAX_RETRIES, RELAY_RETRY_BASE_DELAY, RELAY_RETRY_MAX_DELAY, RELAY_MAX_QUEUE
+)
+from utils import censor_text
+from tenancy import current_tenant, tenant_context, tenant_stats
+
+logger = logging.getLogger(__name__)
+
+# Tanpa fast path, tiap pesan = typing indicator + 1 send
+BASELINE_CALLS_PER_MESSAGE = 2
+
+relay_stats = Counter()
+
+# (tenant, user_id, media_group_id) -> album yang sedang di-buffer
+_albums = {}
+
+def record_relay(messages: int, api_calls: int):
+    """Catat pesan yang di-relay dan panggilan API yang benar-benar dipakai"""
+    relay_stats["messages"] += messages
+    relay_stats["api_calls"] += api_calls
+    relay_stats["api_calls_saved"] += BASELINE_CALLS_PER_MESSAGE * messages - api_calls
+    tenant_stats[current_tenant()]["relayed"] += messages
+
+def get_relay_stats() -> dict:
+    """Statistik relay, termasuk API calls yang dihemat per pesan"""
+    messages = relay_stats["messages"]
+    return {
+        "messages": messages,
+        "api_calls": relay_stats["api_calls"],
+        "api_calls_saved": relay_stats["api_calls_saved"],
+        "albums": relay_stats["albums"],
+        "retries": relay_stats["retries"],
+        "dropped": relay_stats["dropped"],
+        "session_teardowns": relay_stats["session_teardowns"],
+        "saved_per_message": round(relay_stats["api_calls_saved"] / messages, 2) if messages else 0
+    }
+
+def _input_media(message):
+    """Ubah bagian album jadi InputMedia (pakai file_id, tanpa upload ulang)"""
+    caption = censor_text(message.caption) if message.caption else None
+    if message.photo:
+        return InputMediaPhoto(media=message.photo[-1].file_id, caption=caption)
+    if message.document:
+        return InputMediaDocument(media=message.document.file_id, caption=caption)
+    return None
+
+def buffer_album_item(bot, user_id: int, partner_id: int, message, on_error) -> bool:
+    """Buffer satu bagian album. Return False kalau tipe media tidak bisa masuk album.
+
+    on_error: coroutine function(error) yang dipanggil kalau album gagal terkirim.
+    """
+    media = _input_media(message)
+    if media is None:
+        return False
+
+    key = (current_tenant(), user_id, message.media_group_id)
+    album = _albums.get(key)
+    if album is None:
+        # Album sebelumnya dari user ini harus sampai lebih dulu
+        flush_user_albums(user_id, keep_group=message.media_group_id)
+        album = {
+            "bot": bot,
+            "partner_id": partner_id,
+            "items": [],
+            "on_error": on_error,
+            "last_added": 0.0
+        }
+        _albums[key] = album
+        album["task"] = asyncio.create_task(_flush_later(key))
+
+    album["items"].append(media)
+    album["last_added"] = time.monotonic()
+
+    if len(album["items"]) >= ALBUM_MAX_ITEMS:
+        album["task"].cancel()
+        _flush_album(key)
+    return True
+
+async def _flush_later(key):
+    """Kirim album setelah ALBUM_FLUSH_DELAY tanpa bagian baru"""
+    while key in _albums:
+        idle = time.monotonic() - _albums[key]["last_added"]
+        if idle >= ALBUM_FLUSH_DELAY:
+            await flush_album(key)
+            return
+        await asyncio.sleep(ALBUM_FLUSH_DELAY - idle)
+
+async def flush_album(key):
+    """Kirim album yang di-buffer sebagai satu send_media_group"""
+    _flush_album(key)
+
+def _flush_album(key):
+    album = _albums.pop(key, None)
+    if not album or not album["items"]:
+        return
+
+    items = album["items"]
+    send = functools.partial(album["bot"].send_media_group, chat_id=album["partner_id"], media=items)
+    # Saat shutdown semua album di-flush dari satu task: pakai tenant pemilik album
+    with tenant_context(key[0]):
+        if relay_outbox.enqueue(album["partner_id"], send, album["on_error"], messages=len(items)):
+            relay_stats["albums"] += 1
+
+def flush_user_albums(user_id: int, keep_group: Optional[str] = None) -> int:
+    """Antrikan album user yang masih di-buffer sekarang juga, supaya pesan
+    berikutnya ke pasangan yang sama tidak menyalip album. Return jumlah album"""
+    tenant = current_tenant()
+    keys = [key for key in _albums if key[0] == tenant and key[1] == user_id and key[2] != keep_group]
+    for key in keys:
+        _albums[key]["task"].cancel()
+        _flush_album(key)
+    return len(keys)
+
+async def flush_all_albums():
+    """Kirim semua album yang masih di-buffer (dipakai saat shutdown)"""
+    for key in list(_albums):
+        album = _albums.get(key)
+        if album:
+            album["task"].cancel()
+        await flush_album(key)
+
+class TypingIndicator:
+    """Typing indicator dengan debounce.
+
+    Chat action di Telegram bertahan ~5 detik dan hilang begitu pesan masuk,
+    jadi typing hanya dikirim kalau pesan asli belum terkirim setelah
+    TYPING_DELAY, dan maksimal sekali per chat per TYPING_INTERVAL.
+    State disimpan per (tenant, chat_id): chat yang sama di bot lain terpisah.
+    """
+
+    def __init__(self, interval: float = TYPING_INTERVAL, delay: float = TYPING_DELAY,
+                 max_pending: int = TYPING_MAX_PENDING):
+        self.interval = interval
+        self.delay = delay
+        self.max_pending = max_pending
+        self.stats = Counter()
+        self._last_sent = {}
+        self._pending = {}
+
+    def notify(self, bot, chat_id: int):
+        """Jadwalkan typing indicator ke chat_id (tidak menunggu API)"""
+        self.stats["requested"] += 1
+        now = time.monotonic()
+        key = (current_tenant(), chat_id)
+        if key in self._pending or now - self._last_sent.get(key, -self.interval) < self.interval:
+            self.stats["debounced"] += 1
+            return
+        # Backpressure: jangan menumpuk chat action saat outbound sibuk
+        if len(self._pending) >= self.max_pending:
+            self.stats["dropped"] += 1
+            return
+        self._pending[key] = asyncio.create_task(self._send_later(bot, key))
+
+    def cancel(self, chat_id: int):
+        """Batalkan typing yang belum terkirim karena pesan asli sudah sampai"""
+        self._cancel((current_tenant(), chat_id))
+
+    def cancel_all(self):
+        """Batalkan semua typing yang belum terkirim (dipakai saat shutdown)"""
+        for key in list(self._pending):
+            self._cancel(key)
+
+    def _cancel(self, key):
+        task = self._pending.pop(key, None)
+        if task and not task.done():
+            task.cancel()
+            self.stats["cancelled"] += 1
+
+    async def _send_later(self, bot, key):
+        try:
+            await asyncio.sleep(self.delay)
+            self._last_sent[key] = time.monotonic()
+            await bot.send_chat_action(chat_id=key[1], action=ChatAction.TYPING)
+            self.stats["sent"] += 1
+            record_relay(0, 1)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.stats["failed"] += 1
+        finally:
+            if self._pending.get(key) is asyncio.current_task():
+                del self._pending[key]
+            self._prune()
+
+    def _prune(self):
+        """Buang catatan chat yang sudah lewat interval supaya memori tidak tumbuh"""
+        if len(self._last_sent) < 10000:
+            return
+        cutoff = time.monotonic() - self.interval
+        self._last_sent = {key: ts for key, ts in self._last_sent.items() if ts > cutoff}
+
+    def get_stats(self) -> dict:
+        requested = self.stats["requested"]
+        return {
+            **self.stats,
+            "sent_ratio": round(self.stats["sent"] / requested, 3) if requested else 0
+        }
+
+typing_indicator = TypingIndicator()
+
+# Klasifikasi error kirim
+TRANSIENT = "transient"          # jaringan/flood limit: retry
+PERMANENT_SESSION = "session"    # partner blokir bot / chat hilang: akhiri sesi
+PERMANENT_MESSAGE = "message"    # pesan ini saja yang tidak valid: buang
+
+_SESSION_ERRORS = ("chat not found", "user not found", "user is deactivated", "peer_id_invalid", "bot was blocked")
+
+def classify_error(error: Exception) -> str:
+    """Tentukan apakah error kirim layak di-retry, mengakhiri sesi, atau cukup dibuang"""
+    if isinstance(error, Forbidden):
+        return PERMANENT_SESSION
+    # BadRequest adalah subclass NetworkError, jadi dicek lebih dulu
+    if isinstance(error, BadRequest):
+        text = str(error).lower()
+        if any(marker in text for marker in _SESSION_ERRORS):
+            return PERMANENT_SESSION
+        return PERMANENT_MESSAGE
+    if isinstance(error, (RetryAfter, TimedOut, NetworkError)):
+        return TRANSIENT
+    return PERMANENT_MESSAGE
+
+def _retry_after_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+class _RelayJob:
+    __slots__ = ("send", "on_failure", "on_dropped", "messages", "api_calls")
+
+    def __init__(self, send, on_failure, on_dropped, messages: int, api_calls: int):
+        self.send = send
+        self.on_failure = on_failure
+        self.on_dropped = on_dropped
+        self.messages = messages
+        self.api_calls = api_calls
+
+class RelayOutbox:
+    """Antrian kirim per chat tujuan.
+
+    Satu worker per (tenant, chat) menjaga urutan pesan. Error transient (TimedOut,
+    NetworkError, RetryAfter) di-retry dengan backoff + jitter; hanya error
+    permanen (bot diblokir, chat tidak ada) yang mengakhiri sesi.
+    """
+
+    def __init__(self, max_retries: int = RELAY_MAX_RETRIES, base_delay: float = RELAY_RETRY_BASE_DELAY,
+                 max_delay: float = RELAY_RETRY_MAX_DELAY, max_queue: int = RELAY_MAX_QUEUE):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self._queues = {}
+        self._workers = {}
+
+    def enqueue(self, chat_id: int, send, on_failure, on_dropped=None,
+                messages: int = 1, api_calls: int = 1) -> bool:
+        """Antrikan satu pengiriman. Return False kalau antrian chat sudah penuh.
+
+        send: coroutine function tanpa argumen yang memanggil API Telegram.
+        on_failure: coroutine function(error) untuk error permanen (akhiri sesi).
+        on_dropped: coroutine function(error) kalau pesan dibuang (opsional).
+        """
+        key = (current_tenant(), chat_id)
+        queue = self._queues.setdefault(key, deque())
+        if len(queue) >= self.max_queue:
+            relay_stats["outbox_full"] += 1
+            return False
+        queue.append(_RelayJob(send, on_failure, on_dropped, messages, api_calls))
+        if key not in self._workers:
+            self._workers[key] = asyncio.create_task(self._run(key, queue))
+        return True
+
+    def _backoff(self, attempt: int) -> float:
+        """Exponential backoff dengan full jitter"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def _run(self, key, queue: deque):
+        try:
+            while queue:
+                try:
+                    result = await self._deliver(key[1], queue[0])
+                except Exception as e:
+                    logger.warning(f"Pengiriman ke {key[1]} gagal tak terduga: {e}")
+                    result = None
+                finally:
+                    # Job selalu dikeluarkan supaya tidak diulang / menyumbat antrian chat
+                    queue.popleft()
+                if result == PERMANENT_SESSION and queue:
+                    # Sisa antrian ke chat yang sama pasti gagal juga
+                    relay_stats["dropped"] += len(queue)
+                    queue.clear()
+        finally:
+            del self._workers[key]
+            if not queue:
+                self._queues.pop(key, None)
+
+    async def _deliver(self, chat_id: int, job: _RelayJob) -> str:
+        attempt = 0
+        while True:
+            try:
+                await job.send()
+            except Exception as e:
+                kind = classify_error(e)
+                if kind == TRANSIENT and attempt < self.max_retries:
+                    delay = _retry_after_seconds(e) if isinstance(e, RetryAfter) else self._backoff(attempt)
+                    attempt += 1
+                    relay_stats["retries"] += 1
+                    await asyncio.sleep(delay)
+                    continue
+
+                if kind == PERMANENT_SESSION:
+                    relay_stats["session_teardowns"] += 1
+                    await self._callback(chat_id, job.on_failure, e)
+                else:
+                    relay_stats["dropped"] += 1
+                    logger.warning(f"Pesan ke {chat_id} dibuang setelah {attempt} retry: {e}")
+                    if job.on_dropped:
+                        await self._callback(chat_id, job.on_dropped, e)
+                return kind
+
+            # Tiap retry = satu panggilan API tambahan
+            record_relay(job.messages, job.api_calls + attempt)
+            typing_indicator.cancel(chat_id)
+            return "sent"
+
+    async def _callback(self, chat_id: int, callback, error: Exception):
+        """Jalankan on_failure/on_dropped; error-nya cukup dicatat"""
+        try:
+            await callback(error)
+        except Exception as e:
+            logger.warning(f"Callback outbox untuk chat {chat_id} gagal: {e}")
+
+    def pending(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def drain(self, timeout: float) -> bool:
+        """Tunggu semua antrian terkirim, return False kalau lewat deadline"""
+        deadline = time.monotonic() + timeout
+        while self._workers:
+            if time.monotonic() >= deadline:
+                logger.warning(f"Outbox drain timeout: {self.pending()} pesan belum terkirim")
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
+relay_outbox = RelayOutbox()
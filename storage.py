@@ -0,0 +1,919 @@
+"""Backend storage untuk bot.
+
+Semua modul memakai subset command redis-py (string, hash, list, set,
+sorted set, stream + consumer group, HyperLogLog, TTL, scan, pipeline). Ada tiga implementasi:
+
+- "redis": client redis-py biasa (production, multi-proses)
+- "cluster": redis.RedisCluster (pakai bersama KEY_SCHEMA="cluster")
+- "memory": MemoryStorage, pure-Python in-process (test, benchmark,
+  deployment single-node tanpa Redis)
+
+Pilih lewat STORAGE_BACKEND di config.py.
+"""
+import time
+import itertools
+import fnmatch
+import functools
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from typing import Optional
+import redis
+from redis.exceptions import ResponseError
+from config import REDIS_URL, STORAGE_BACKEND, REDIS_SOCKET_TIMEOUT, REDIS_CONNECT_TIMEOUT
+
+_WRONGTYPE = "WRONGTYPE Operation against a key holding the wrong kind of value"
+
+def _enc(value) -> str:
+    """Encode value seperti redis-py dengan decode_responses=True"""
+    if isinstance(value, bytes):
+        return value.decode("utf-8")
+    return str(value)
+
+def _parse_bound(bound):
+    """Parse batas score Redis: angka, '(angka', '-inf', '+inf'"""
+    if isinstance(bound, (int, float)):
+        return float(bound), False
+    bound = str(bound)
+    exclusive = bound.startswith("(")
+    if exclusive:
+        bound = bound[1:]
+    return float(bound), exclusive
+
+def _in_range(score: float, low, high) -> bool:
+    low_value, low_exclusive = low
+    high_value, high_exclusive = high
+    if score < low_value or (low_exclusive and score == low_value):
+        return False
+    if score > high_value or (high_exclusive and score == high_value):
+        return False
+    return True
+
+def _bounds(length: int, start: int, end: int) -> range:
+    """Index inklusif ala LRANGE/ZRANGE (support index negatif) -> range posisi"""
+    if start < 0:
+        start = max(0, length + start)
+    if end < 0:
+        end = length + end
+    return range(start, min(end + 1, length))
+
+def _slice(items: list, start: int, end: int) -> list:
+    positions = _bounds(len(items), start, end)
+    return items[positions.start:positions.stop]
+
+class _ZSet:
+    """Sorted set: dict member -> score + list (score, member) terurut"""
+    __slots__ = ("scores", "ordered")
+
+    def __init__(self):
+        self.scores = {}
+        self.ordered = []
+
+    def add(self, member: str, score: float):
+        old = self.scores.get(member)
+        if old is not None:
+            if old == score:
+                return
+            del self.ordered[bisect_left(self.ordered, (old, member))]
+        self.scores[member] = score
+        insort(self.ordered, (score, member))
+
+    def remove(self, member: str) -> bool:
+        score = self.scores.pop(member, None)
+        if score is None:
+            return False
+        del self.ordered[bisect_left(self.ordered, (score, member))]
+        return True
+
+    def by_score(self, low, high) -> list:
+        result = []
+        for index in range(bisect_left(self.ordered, (low[0],)), len(self.ordered)):
+            score, member = self.ordered[index]
+            if score > high[0]:
+                break
+            if _in_range(score, low, high):
+                result.append((member, score))
+        return result
+
+    def __len__(self):
+        return len(self.scores)
+
+def _stream_id(entry_id: str) -> tuple:
+    ms, _, seq = entry_id.partition("-")
+    return int(ms), int(seq or 0)
+
+def _format_id(entry_id: tuple) -> str:
+    return f"{entry_id[0]}-{entry_id[1]}"
+
+class _Stream:
+    """Stream: entry (id, fields) terurut + consumer group"""
+    __slots__ = ("ids", "fields", "last_id", "groups")
+
+    def __init__(self):
+        self.ids = []
+        self.fields = []
+        self.last_id = (0, 0)
+        # nama group -> {"last": id terakhir yang dikirim, "pending": {id: consumer}}
+        self.groups = {}
+
+    def add(self, requested: str, fields: dict) -> str:
+        if requested == "*":
+            ms = int(time.time() * 1000)
+            entry_id = (ms, 0) if ms > self.last_id[0] else (self.last_id[0], self.last_id[1] + 1)
+        else:
+            entry_id = _stream_id(requested)
+            if entry_id <= self.last_id:
+                raise ResponseError("The ID specified in XADD is equal or smaller than the target stream top item")
+        self.ids.append(entry_id)
+        self.fields.append({_enc(k): _enc(v) for k, v in fields.items()})
+        self.last_id = entry_id
+        return _format_id(entry_id)
+
+    def after(self, entry_id: tuple) -> int:
+        """Index entry pertama dengan id > entry_id"""
+        return bisect_left(self.ids, (entry_id[0], entry_id[1] + 1))
+
+    def entry(self, index: int) -> tuple:
+        return _format_id(self.ids[index]), dict(self.fields[index])
+
+    def trim(self, maxlen: int) -> int:
+        excess = max(0, len(self.ids) - maxlen)
+        if excess:
+            del self.ids[:excess]
+            del self.fields[:excess]
+        return excess
+
+    def __len__(self):
+        return len(self.ids)
+
+class _HyperLogLog:
+    """HyperLogLog versi exact: simpan member apa adanya (PFCOUNT selalu tepat)"""
+    __slots__ = ("members",)
+
+    def __init__(self):
+        self.members = set()
+
+    def __len__(self):
+        return len(self.members)
+
+class MemoryStorage:
+    """Storage in-memory dengan API (subset) redis-py dan semantik TTL Redis"""
+
+    # Sampling expiry aktif, mirip Redis: cek beberapa key tiap N write
+    _SWEEP_EVERY = 100
+    _SWEEP_SAMPLE = 20
+    # Iterasi SCAN yang belum selesai (snapshot key) yang disimpan
+    _MAX_SCANS = 64
+
+    def __init__(self):
+        self._data = {}
+        self._expires = {}
+        self._lock = threading.RLock()
+        self._writes = 0
+        # cursor -> (snapshot nama key, offset berikutnya)
+        self._scans = {}
+        self._scan_cursors = itertools.count(1)
+
+    # --- internal ---
+    def _alive(self, name: str) -> bool:
+        deadline = self._expires.get(name)
+        if deadline is not None and deadline <= time.time():
+            self._data.pop(name, None)
+            del self._expires[name]
+            return False
+        return name in self._data
+
+    def _get(self, name: str, kind: type):
+        if not self._alive(name):
+            return None
+        value = self._data[name]
+        if not isinstance(value, kind):
+            raise ResponseError(_WRONGTYPE)
+        return value
+
+    def _get_or_create(self, name: str, kind: type):
+        value = self._get(name, kind)
+        if value is None:
+            value = kind()
+            self._data[name] = value
+        self._touch()
+        return value
+
+    def _cleanup(self, name: str):
+        """Hapus key collection yang kosong (seperti Redis, stream tetap ada)"""
+        value = self._data.get(name)
+        if value is not None and not isinstance(value, (str, _Stream, _HyperLogLog)) and len(value) == 0:
+            self._data.pop(name, None)
+            self._expires.pop(name, None)
+
+    def _touch(self):
+        self._writes += 1
+        if self._writes % self._SWEEP_EVERY == 0 and self._expires:
+            # Cek key terdepan; yang belum expire dipindah ke belakang, jadi
+            # sweep berikutnya memeriksa key lain tanpa menyalin dict
+            now = time.time()
+            for _ in range(min(self._SWEEP_SAMPLE, len(self._expires))):
+                name = next(iter(self._expires))
+                deadline = self._expires.pop(name)
+                if deadline <= now:
+                    self._data.pop(name, None)
+                else:
+                    self._expires[name] = deadline
+
+    # --- generic ---
+    def ping(self) -> bool:
+        return True
+
+    def delete(self, *names) -> int:
+        with self._lock:
+            deleted = 0
+            for name in names:
+                if self._alive(name):
+                    del self._data[name]
+                    self._expires.pop(name, None)
+                    deleted += 1
+            return deleted
+
+    def exists(self, *names) -> int:
+        with self._lock:
+            return sum(1 for name in names if self._alive(name))
+
+    def expire(self, name: str, time_: int) -> bool:
+        return self.pexpire(name, int(time_ * 1000))
+
+    def pexpire(self, name: str, time_: int) -> bool:
+        with self._lock:
+            if not self._alive(name):
+                return False
+            self._expires[name] = time.time() + time_ / 1000
+            return True
+
+    def persist(self, name: str) -> bool:
+        with self._lock:
+            return self._alive(name) and self._expires.pop(name, None) is not None
+
+    def ttl(self, name: str) -> int:
+        pttl = self.pttl(name)
+        return pttl if pttl < 0 else int(round(pttl / 1000))
+
+    def pttl(self, name: str) -> int:
+        with self._lock:
+            if not self._alive(name):
+                return -2
+            deadline = self._expires.get(name)
+            if deadline is None:
+                return -1
+            return max(0, int((deadline - time.time()) * 1000))
+
+    def type(self, name: str) -> str:
+        with self._lock:
+            if not self._alive(name):
+                return "none"
+            value = self._data[name]
+            return {
+                str: "string", dict: "hash", deque: "list", set: "set", _ZSet: "zset",
+                _Stream: "stream", _HyperLogLog: "string"
+            }[type(value)]
+
+    def keys(self, pattern: str = "*") -> list:
+        with self._lock:
+            return [name for name in list(self._data)
+                    if self._alive(name) and fnmatch.fnmatchcase(name, pattern)]
+
+    def scan(self, cursor: int = 0, match: Optional[str] = None, count: Optional[int] = None, **kwargs):
+        with self._lock:
+            # Satu snapshot per iterasi: key yang ada sepanjang iterasi pasti
+            # terlihat meski ada key lain dihapus/ditambah di tengah jalan
+            if cursor == 0:
+                names, offset = list(self._data), 0
+            elif cursor in self._scans:
+                names, offset = self._scans.pop(cursor)
+            else:
+                return 0, []
+            end = offset + (count or 10)
+            result = [names[index] for index in range(offset, min(end, len(names)))
+                      if self._alive(names[index]) and (match is None or fnmatch.fnmatchcase(names[index], match))]
+            if end >= len(names):
+                return 0, result
+            if len(self._scans) >= self._MAX_SCANS:
+                # Iterasi yang ditinggal di tengah jalan
+                del self._scans[next(iter(self._scans))]
+            next_cursor = next(self._scan_cursors)
+            self._scans[next_cursor] = (names, end)
+            return next_cursor, result
+
+    def scan_iter(self, match: Optional[str] = None, count: Optional[int] = None, **kwargs):
+        cursor = None
+        while cursor != 0:
+            cursor, names = self.scan(cursor or 0, match=match, count=count)
+            yield from names
+
+    def dbsize(self) -> int:
+        with self._lock:
+            return sum(1 for name in list(self._data) if self._alive(name))
+
+    def flushdb(self, **kwargs) -> bool:
+        with self._lock:
+            self._data.clear()
+            self._expires.clear()
+            return True
+
+    def pipeline(self, transaction: bool = True, shard_hint=None):
+        return MemoryPipeline(self)
+
+    # --- string ---
+    def get(self, name: str) -> Optional[str]:
+        with self._lock:
+            return self._get(name, str)
+
+    def mget(self, keys, *args) -> list:
+        names = [keys] if isinstance(keys, str) else list(keys)
+        names.extend(args)
+        with self._lock:
+            return [self._get(name, str) if self._alive(name) and isinstance(self._data[name], str) else None
+                    for name in names]
+
+    def set(self, name: str, value, ex=None, px=None, nx: bool = False, xx: bool = False,
+            keepttl: bool = False, get: bool = False, **kwargs):
+        with self._lock:
+            exists = self._alive(name)
+            old = self._data.get(name) if exists else None
+            if (nx and exists) or (xx and not exists):
+                return old if get else None
+            self._data[name] = _enc(value)
+            if not keepttl:
+                self._expires.pop(name, None)
+            if ex is not None:
+                self._expires[name] = time.time() + int(ex)
+            elif px is not None:
+                self._expires[name] = time.time() + int(px) / 1000
+            self._touch()
+            return old if get else True
+
+    def setex(self, name: str, time_: int, value) -> bool:
+        return self.set(name, value, ex=time_)
+
+    def incrby(self, name: str, amount: int = 1) -> int:
+        with self._lock:
+            current = self._get(name, str)
+            try:
+                value = int(current or 0) + amount
+            except ValueError:
+                raise ResponseError("value is not an integer or out of range")
+            self._data[name] = str(value)
+            self._touch()
+            return value
+
+    def incr(self, name: str, amount: int = 1) -> int:
+        return self.incrby(name, amount)
+
+    def decr(self, name: str, amount: int = 1) -> int:
+        return self.incrby(name, -amount)
+
+    # --- hash ---
+    def hset(self, name: str, key=None, value=None, mapping: Optional[dict] = None, items=None) -> int:
+        with self._lock:
+            data = self._get_or_create(name, dict)
+            pairs = dict(mapping or {})
+            if key is not None:
+                pairs[key] = value
+            added = 0
+            for field, field_value in pairs.items():
+                field = _enc(field)
+                if field not in data:
+                    added += 1
+                data[field] = _enc(field_value)
+            return added
+
+    def hget(self, name: str, key) -> Optional[str]:
+        with self._lock:
+            data = self._get(name, dict)
+            return data.get(_enc(key)) if data else None
+
+    def hmget(self, name: str, keys, *args) -> list:
+        fields = [keys] if isinstance(keys, str) else list(keys)
+        fields.extend(args)
+        with self._lock:
+            data = self._get(name, dict) or {}
+            return [data.get(_enc(field)) for field in fields]
+
+    def hgetall(self, name: str) -> dict:
+        with self._lock:
+            return dict(self._get(name, dict) or {})
+
+    def hkeys(self, name: str) -> list:
+        with self._lock:
+            return list(self._get(name, dict) or {})
+
+    def hlen(self, name: str) -> int:
+        with self._lock:
+            return len(self._get(name, dict) or {})
+
+    def hexists(self, name: str, key) -> bool:
+        with self._lock:
+            return _enc(key) in (self._get(name, dict) or {})
+
+    def hdel(self, name: str, *keys) -> int:
+        with self._lock:
+            data = self._get(name, dict)
+            if not data:
+                return 0
+            deleted = sum(1 for key in keys if data.pop(_enc(key), None) is not None)
+            self._cleanup(name)
+            return deleted
+
+    def hincrby(self, name: str, key, amount: int = 1) -> int:
+        with self._lock:
+            data = self._get_or_create(name, dict)
+            value = int(data.get(_enc(key), 0)) + amount
+            data[_enc(key)] = str(value)
+            return value
+
+    # --- list ---
+    def rpush(self, name: str, *values) -> int:
+        with self._lock:
+            data = self._get_or_create(name, deque)
+            data.extend(_enc(value) for value in values)
+            return len(data)
+
+    def lpush(self, name: str, *values) -> int:
+        with self._lock:
+            data = self._get_or_create(name, deque)
+            data.extendleft(_enc(value) for value in values)
+            return len(data)
+
+    def lpop(self, name: str, count: Optional[int] = None):
+        with self._lock:
+            data = self._get(name, deque)
+            if not data:
+                return None
+            if count is None:
+                value = data.popleft()
+            else:
+                value = [data.popleft() for _ in range(min(count, len(data)))]
+            self._cleanup(name)
+            return value
+
+    def rpop(self, name: str, count: Optional[int] = None):
+        with self._lock:
+            data = self._get(name, deque)
+            if not data:
+                return None
+            if count is None:
+                value = data.pop()
+            else:
+                value = [data.pop() for _ in range(min(count, len(data)))]
+            self._cleanup(name)
+            return value
+
+    def llen(self, name: str) -> int:
+        with self._lock:
+            return len(self._get(name, deque) or ())
+
+    def lrange(self, name: str, start: int, end: int) -> list:
+        with self._lock:
+            return _slice(list(self._get(name, deque) or ()), start, end)
+
+    def ltrim(self, name: str, start: int, end: int) -> bool:
+        with self._lock:
+            data = self._get(name, deque)
+            if data is not None:
+                self._data[name] = deque(_slice(list(data), start, end))
+                self._cleanup(name)
+            return True
+
+    def lrem(self, name: str, count: int, value) -> int:
+        with self._lock:
+            data = self._get(name, deque)
+            if not data:
+                return 0
+            value = _enc(value)
+            items = list(data) if count >= 0 else list(reversed(data))
+            limit = abs(count) or len(items)
+            kept, removed = [], 0
+            for item in items:
+                if item == value and removed < limit:
+                    removed += 1
+                else:
+                    kept.append(item)
+            if count < 0:
+                kept.reverse()
+            self._data[name] = deque(kept)
+            self._cleanup(name)
+            return removed
+
+    # --- set ---
+    def sadd(self, name: str, *values) -> int:
+        with self._lock:
+            data = self._get_or_create(name, set)
+            before = len(data)
+            data.update(_enc(value) for value in values)
+            return len(data) - before
+
+    def srem(self, name: str, *values) -> int:
+        with self._lock:
+            data = self._get(name, set)
+            if not data:
+                return 0
+            before = len(data)
+            data.difference_update(_enc(value) for value in values)
+            removed = before - len(data)
+            self._cleanup(name)
+            return removed
+
+    def smembers(self, name: str) -> set:
+        with self._lock:
+            return set(self._get(name, set) or ())
+
+    def sismember(self, name: str, value) -> bool:
+        with self._lock:
+            return _enc(value) in (self._get(name, set) or ())
+
+    def smismember(self, name: str, values, *args) -> list:
+        members = [values] if isinstance(values, str) else list(values)
+        members.extend(args)
+        with self._lock:
+            data = self._get(name, set) or set()
+            return [_enc(member) in data for member in members]
+
+    def scard(self, name: str) -> int:
+        with self._lock:
+            return len(self._get(name, set) or ())
+
+    def sscan_iter(self, name: str, match: Optional[str] = None, count: Optional[int] = None):
+        with self._lock:
+            members = list(self._get(name, set) or ())
+        for member in members:
+            if match is None or fnmatch.fnmatchcase(member, match):
+                yield member
+
+    # --- hyperloglog ---
+    def pfadd(self, name: str, *values) -> int:
+        with self._lock:
+            created = not self._alive(name)
+            data = self._get_or_create(name, _HyperLogLog)
+            before = len(data)
+            data.members.update(_enc(value) for value in values)
+            return int(created or len(data) > before)
+
+    def pfcount(self, *sources) -> int:
+        with self._lock:
+            members = set()
+            for name in sources:
+                data = self._get(name, _HyperLogLog)
+                if data:
+                    members |= data.members
+            return len(members)
+
+    # --- sorted set ---
+    def zadd(self, name: str, mapping: dict, nx: bool = False, xx: bool = False,
+             ch: bool = False, incr: bool = False, gt: bool = False, lt: bool = False):
+        with self._lock:
+            data = self._get_or_create(name, _ZSet)
+            changed = added = 0
+            result = None
+            for member, score in mapping.items():
+                member, score = _enc(member), float(score)
+                old = data.scores.get(member)
+                if (nx and old is not None) or (xx and old is None):
+                    continue
+                if incr:
+                    score += old or 0.0
+                    result = score
+                if old is not None and ((gt and score <= old) or (lt and score >= old)):
+                    continue
+                if old is None:
+                    added += 1
+                elif old != score:
+                    changed += 1
+                data.add(member, score)
+            self._cleanup(name)
+            if incr:
+                return result
+            return added + changed if ch else added
+
+    def zincrby(self, name: str, amount: float, value) -> float:
+        return self.zadd(name, {value: amount}, incr=True)
+
+    def zrem(self, name: str, *values) -> int:
+        with self._lock:
+            data = self._get(name, _ZSet)
+            if not data:
+                return 0
+            removed = sum(1 for value in values if data.remove(_enc(value)))
+            self._cleanup(name)
+            return removed
+
+    def zscore(self, name: str, value) -> Optional[float]:
+        with self._lock:
+            data = self._get(name, _ZSet)
+            return data.scores.get(_enc(value)) if data else None
+
+    def zrevrank(self, name: str, value) -> Optional[int]:
+        with self._lock:
+            data = self._get(name, _ZSet)
+            member = _enc(value)
+            score = data.scores.get(member) if data else None
+            if score is None:
+                return None
+            return len(data.ordered) - 1 - bisect_left(data.ordered, (score, member))
+
+    def zcard(self, name: str) -> int:
+        with self._lock:
+            return len(self._get(name, _ZSet) or ())
+
+    def zcount(self, name: str, min, max) -> int:
+        with self._lock:
+            data = self._get(name, _ZSet)
+            if not data:
+                return 0
+            return len(data.by_score(_parse_bound(min), _parse_bound(max)))
+
+    def zrange(self, name: str, start: int, end: int, desc: bool = False,
+               withscores: bool = False, score_cast_func=float, **kwargs) -> list:
+        with self._lock:
+            data = self._get(name, _ZSet)
+            if not data:
+                return []
+            ordered = data.ordered
+            if desc:
+                last = len(ordered) - 1
+                items = [ordered[last - index] for index in _bounds(len(ordered), start, end)]
+            else:
+                items = _slice(ordered, start, end)
+            if withscores:
+                return [(member, score_cast_func(score)) for score, member in items]
+            return [member for _, member in items]
+
+    def zrevrange(self, name: str, start: int, end: int, withscores: bool = False,
+                  score_cast_func=float) -> list:
+        return self.zrange(name, start, end, desc=True, withscores=withscores,
+                           score_cast_func=score_cast_func)
+
+    def zrangebyscore(self, name: str, min, max, start: Optional[int] = None,
+                      num: Optional[int] = None, withscores: bool = False,
+                      score_cast_func=float) -> list:
+        with self._lock:
+            data = self._get(name, _ZSet)
+            if not data:
+                return []
+            items = data.by_score(_parse_bound(min), _parse_bound(max))
+        if start is not None and num is not None:
+            items = items[start:start + num] if num >= 0 else items[start:]
+        if withscores:
+            return [(member, score_cast_func(score)) for member, score in items]
+        return [member for member, _ in items]
+
+    def zrevrangebyscore(self, name: str, max, min, start: Optional[int] = None,
+                         num: Optional[int] = None, withscores: bool = False,
+                         score_cast_func=float) -> list:
+        items = self.zrangebyscore(name, min, max, withscores=True, score_cast_func=score_cast_func)
+        items.reverse()
+        if start is not None and num is not None:
+            items = items[start:start + num] if num >= 0 else items[start:]
+        return items if withscores else [member for member, _ in items]
+
+    def zremrangebyscore(self, name: str, min, max) -> int:
+        with self._lock:
+            data = self._get(name, _ZSet)
+            if not data:
+                return 0
+            items = data.by_score(_parse_bound(min), _parse_bound(max))
+            for member, _ in items:
+                data.remove(member)
+            self._cleanup(name)
+            return len(items)
+
+    def zpopmin(self, name: str, count: Optional[int] = None) -> list:
+        with self._lock:
+            data = self._get(name, _ZSet)
+            if not data:
+                return []
+            items = [(member, score) for score, member in data.ordered[:count or 1]]
+            for member, _ in items:
+                data.remove(member)
+            self._cleanup(name)
+            return items
+
+    # --- stream ---
+    def xadd(self, name: str, fields: dict, id: str = "*", maxlen: Optional[int] = None,
+             approximate: bool = True, nomkstream: bool = False, **kwargs) -> Optional[str]:
+        with self._lock:
+            if nomkstream and not self._alive(name):
+                return None
+            stream = self._get_or_create(name, _Stream)
+            entry_id = stream.add(id, fields)
+            if maxlen is not None:
+                stream.trim(maxlen)
+            return entry_id
+
+    def xlen(self, name: str) -> int:
+        with self._lock:
+            return len(self._get(name, _Stream) or ())
+
+    def xtrim(self, name: str, maxlen: int, approximate: bool = True, **kwargs) -> int:
+        with self._lock:
+            stream = self._get(name, _Stream)
+            return stream.trim(maxlen) if stream else 0
+
+    def xrange(self, name: str, min: str = "-", max: str = "+", count: Optional[int] = None) -> list:
+        with self._lock:
+            stream = self._get(name, _Stream)
+            if not stream:
+                return []
+            if min == "-":
+                start = 0
+            elif min.startswith("("):
+                start = bisect_right(stream.ids, _stream_id(min[1:]))
+            else:
+                start = bisect_left(stream.ids, _stream_id(min))
+            result = []
+            for index in range(start, len(stream)):
+                if max != "+":
+                    high = _stream_id(max.lstrip("("))
+                    if stream.ids[index] > high or (max.startswith("(") and stream.ids[index] == high):
+                        break
+                result.append(stream.entry(index))
+                if count is not None and len(result) >= count:
+                    break
+            return result
+
+    def xrevrange(self, name: str, max: str = "+", min: str = "-", count: Optional[int] = None) -> list:
+        with self._lock:
+            result = self.xrange(name, min, max)
+            result.reverse()
+            return result[:count] if count is not None else result
+
+    def xgroup_create(self, name: str, groupname: str, id: str = "$", mkstream: bool = False, **kwargs) -> bool:
+        with self._lock:
+            stream = self._get(name, _Stream)
+            if stream is None:
+                if not mkstream:
+                    raise ResponseError("The XGROUP subcommand requires the key to exist")
+                stream = self._get_or_create(name, _Stream)
+            if groupname in stream.groups:
+                raise ResponseError("BUSYGROUP Consumer Group name already exists")
+            last = stream.last_id if id == "$" else _stream_id(id)
+            stream.groups[groupname] = {"last": last, "pending": {}}
+            return True
+
+    def xreadgroup(self, groupname: str, consumername: str, streams: dict,
+                   count: Optional[int] = None, block: Optional[int] = None, noack: bool = False) -> list:
+        with self._lock:
+            response = []
+            for name, requested in streams.items():
+                stream = self._get(name, _Stream)
+                group = stream.groups.get(groupname) if stream else None
+                if group is None:
+                    raise ResponseError(f"NOGROUP No such key '{name}' or consumer group '{groupname}'")
+
+                entries = []
+                if requested == ">":
+                    for index in range(stream.after(group["last"]), len(stream)):
+                        if count is not None and len(entries) >= count:
+                            break
+                        entry_id, fields = stream.entry(index)
+                        group["last"] = stream.ids[index]
+                        if not noack:
+                            group["pending"][entry_id] = consumername
+                        entries.append((entry_id, fields))
+                    if entries:
+                        response.append([name, entries])
+                else:
+                    # Baca ulang entry pending milik consumer ini
+                    start = _stream_id(requested)
+                    for entry_id, owner in sorted(group["pending"].items(), key=lambda item: _stream_id(item[0])):
+                        if owner != consumername or _stream_id(entry_id) <= start:
+                            continue
+                        if count is not None and len(entries) >= count:
+                            break
+                        index = bisect_left(stream.ids, _stream_id(entry_id))
+                        if index < len(stream) and stream.ids[index] == _stream_id(entry_id):
+                            entries.append(stream.entry(index))
+                        else:
+                            entries.append((entry_id, None))
+                    response.append([name, entries])
+            return response
+
+    def xack(self, name: str, groupname: str, *ids) -> int:
+        with self._lock:
+            stream = self._get(name, _Stream)
+            group = stream.groups.get(groupname) if stream else None
+            if group is None:
+                return 0
+            return sum(1 for entry_id in ids if group["pending"].pop(entry_id, None) is not None)
+
+class MemoryPipeline:
+    """Pipeline untuk MemoryStorage: command diantrikan lalu dijalankan berurutan"""
+
+    def __init__(self, storage: MemoryStorage):
+        self._storage = storage
+        self._queued = []
+
+    def __getattr__(self, name):
+        method = getattr(self._storage, name)
+
+        def queue(*args, **kwargs):
+            self._queued.append((method, args, kwargs))
+            return self
+        return queue
+
+    def execute(self, raise_on_error: bool = True) -> list:
+        queued, self._queued = self._queued, []
+        results = []
+        with self._storage._lock:
+            for method, args, kwargs in queued:
+                try:
+                    results.append(method(*args, **kwargs))
+                except ResponseError as e:
+                    if raise_on_error:
+                        raise
+                    results.append(e)
+        return results
+
+    def reset(self):
+        self._queued = []
+
+    def __len__(self):
+        return len(self._queued)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.reset()
+
+class PipelineProxy:
+    """Dasar proxy pipeline: command diantrikan lewat _queue(), execute() bisa di-override"""
+
+    def __init__(self, pipe, parent: "ClientProxy"):
+        self._pipe = pipe
+        self._parent = parent
+
+    def _queue(self, name: str, func, args: tuple, kwargs: dict):
+        return func(*args, **kwargs)
+
+    def execute(self, *args, **kwargs):
+        return self._pipe.execute(*args, **kwargs)
+
+    def __getattr__(self, name):
+        attr = getattr(self._pipe, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        def queue(*args, **kwargs):
+            result = self._queue(name, attr, args, kwargs)
+            return self if result is self._pipe else result
+        return queue
+
+    def __enter__(self):
+        self._pipe.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._pipe.__exit__(*exc)
+
+    def __len__(self):
+        return len(self._pipe)
+
+class ClientProxy:
+    """Dasar proxy di atas client storage (tracing, breaker, tenant).
+
+    Subclass cukup override _call() untuk command biasa dan memilih
+    pipeline_class untuk pipeline. Proxy bisa ditumpuk.
+    """
+    pipeline_class = PipelineProxy
+
+    def __init__(self, client):
+        self._client = client
+
+    def _call(self, name: str, func, args: tuple, kwargs: dict):
+        return func(*args, **kwargs)
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        if name == "pipeline":
+            @functools.wraps(attr)
+            def wrapper(*args, **kwargs):
+                return self.pipeline_class(attr(*args, **kwargs), self)
+        else:
+            @functools.wraps(attr)
+            def wrapper(*args, **kwargs):
+                return self._call(name, attr, args, kwargs)
+        # Cache supaya __getattr__ tidak dipanggil lagi untuk command yang sama
+        self.__dict__[name] = wrapper
+        return wrapper
+
+def create_client(backend: str = STORAGE_BACKEND, url: str = REDIS_URL):
+    """Buat client storage sesuai STORAGE_BACKEND"""
+    if backend == "memory":
+        return MemoryStorage()
+    timeouts = {"socket_timeout": REDIS_SOCKET_TIMEOUT, "socket_connect_timeout": REDIS_CONNECT_TIMEOUT}
+    if backend == "redis":
+        return redis.from_url(url, decode_responses=True, **timeouts)
+    if backend == "cluster":
+        return redis.RedisCluster.from_url(url, decode_responses=True, **timeouts)
+    raise ValueError(f"STORAGE_BACKEND tidak dikenal: {backend} (pilih 'redis', 'cluster' atau 'memory')")
@@ -0,0 +1,42 @@
+"""Helper consumer group stream (dipakai moderation.py & analytics.py).
+
+Consumer mulai dari entry pending miliknya sendiri (ID "0"): entry yang
+sudah dibaca tapi belum di-ACK sebelum proses mati diproses ulang. Setelah
+pending habis baru lanjut ke entry baru (">").
+"""
+from typing import List
+from redis.exceptions import ResponseError
+from utils import r
+
+def ensure_group(stream: str, group: str):
+    """Buat consumer group kalau belum ada"""
+    try:
+        r.xgroup_create(stream, group, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+class GroupReader:
+    """Baca stream lewat consumer group: pending milik consumer dulu, lalu entry baru"""
+
+    def __init__(self, stream: str, group: str, consumer: str, count: int):
+        self.stream = stream
+        self.group = group
+        self.consumer = consumer
+        self.count = count
+        self.read_id = "0"
+        # True kalau read() terakhir masih membaca entry pending
+        self.catching_up = True
+
+    def read(self) -> List[tuple]:
+        """Satu XREADGROUP, return [(entry_id, fields)]"""
+        response = r.xreadgroup(self.group, self.consumer, {self.stream: self.read_id}, count=self.count)
+        entries = response[0][1] if response else []
+        self.catching_up = self.read_id != ">"
+        if self.catching_up:
+            self.read_id = entries[-1][0] if entries else ">"
+        return entries
+
+    def idle(self, entries: List[tuple]) -> bool:
+        """True kalau tidak ada yang perlu dibaca lagi (waktunya poll interval)"""
+        return not entries and not self.catching_up
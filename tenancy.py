@@ -0,0 +1,114 @@
+"""Tenant (bot) aktif untuk hosting beberapa bot dalam satu proses.
+
+Tenant disimpan di ContextVar dan diwarisi semua task asyncio yang dibuat di
+dalamnya (polling, handler, worker). NamespacedRedis menambahkan prefix
+"<tenant>:" ke key setiap command dan membuangnya lagi dari nama key yang
+dikembalikan (KEYS, SCAN, XREADGROUP), jadi modul lain tetap memakai nama
+dari keyschema. Tenant default ("") tanpa prefix: satu bot = layout lama.
+
+Key di SHARED_KEYS (blocklist media) dipakai bersama semua bot.
+"""
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from keyschema import MEDIA_BLOCKLIST, MEDIA_BLOCKLIST_LOG
+from storage import ClientProxy, PipelineProxy
+
+_current_tenant: ContextVar[str] = ContextVar("tenant", default="")
+
+SHARED_KEYS = frozenset({MEDIA_BLOCKLIST, MEDIA_BLOCKLIST_LOG})
+
+# Command dengan semua argumen posisi berupa key; selain ini key = argumen pertama
+_MULTI_KEY = frozenset({"delete", "exists", "pfcount", "unlink", "touch", "mget"})
+_NO_KEY = frozenset({"ping", "info", "dbsize", "flushdb", "time"})
+
+tenant_stats = defaultdict(Counter)
+
+def current_tenant() -> str:
+    return _current_tenant.get()
+
+@contextmanager
+def tenant_context(name: str):
+    """Semua command & task yang dibuat di dalam blok milik tenant `name`"""
+    token = _current_tenant.set(name)
+    try:
+        yield
+    finally:
+        _current_tenant.reset(token)
+
+def record_handler(duration: float, failed: bool):
+    """Metrik per tenant untuk satu update (dipanggil tracked_handler)"""
+    stats = tenant_stats[current_tenant()]
+    stats["updates"] += 1
+    stats["errors"] += failed
+    stats["handler_ms"] += int(duration * 1000)
+
+def get_tenant_stats() -> dict:
+    return {tenant or "-": dict(stats) for tenant, stats in tenant_stats.items()}
+
+def _key(prefix: str, key):
+    if key in SHARED_KEYS:
+        return key
+    return prefix + key
+
+def _rewrite(name: str, prefix: str, args: tuple, kwargs: dict):
+    if name in ("keys", "scan_iter"):
+        field = "pattern" if name == "keys" else "match"
+        if args:
+            return (prefix + args[0],) + args[1:], kwargs
+        return args, {**kwargs, field: prefix + (kwargs.get(field) or "*")}
+    if name == "scan":
+        # Argumen pertama cursor, bukan key: yang diberi prefix pola match
+        if len(args) > 1:
+            return (args[0], prefix + (args[1] or "*")) + args[2:], kwargs
+        return args, {**kwargs, "match": prefix + (kwargs.get("match") or "*")}
+    if name == "xreadgroup":
+        args = list(args)
+        if len(args) > 2:
+            args[2] = {_key(prefix, stream): entry_id for stream, entry_id in args[2].items()}
+        else:
+            kwargs = {**kwargs, "streams": {_key(prefix, s): i for s, i in kwargs["streams"].items()}}
+        return tuple(args), kwargs
+    if name in _NO_KEY or not args:
+        return args, kwargs
+    if name == "mget" and args and not isinstance(args[0], (str, bytes)):
+        return ([_key(prefix, key) for key in args[0]],) + args[1:], kwargs
+    if name in _MULTI_KEY:
+        return tuple(_key(prefix, key) for key in args), kwargs
+    return (_key(prefix, args[0]),) + args[1:], kwargs
+
+def _strip(name: str, prefix: str, result):
+    size = len(prefix)
+    if name == "keys":
+        return [key[size:] for key in result]
+    if name == "scan_iter":
+        return (key[size:] for key in result)
+    if name == "scan":
+        cursor, keys = result
+        return cursor, [key[size:] for key in keys]
+    if name == "xreadgroup" and result:
+        return [[stream[size:] if stream.startswith(prefix) else stream, entries] for stream, entries in result]
+    return result
+
+class _NamespacedPipeline(PipelineProxy):
+    """Pipeline dengan prefix tenant yang diambil saat command diantrikan"""
+
+    def _queue(self, name: str, func, args: tuple, kwargs: dict):
+        tenant = _current_tenant.get()
+        if tenant:
+            tenant_stats[tenant]["redis_commands"] += 1
+            args, kwargs = _rewrite(name, tenant + ":", args, kwargs)
+        return func(*args, **kwargs)
+
+class NamespacedRedis(ClientProxy):
+    """Proxy client storage: key diberi prefix tenant aktif"""
+    pipeline_class = _NamespacedPipeline
+
+    def _call(self, name: str, func, args: tuple, kwargs: dict):
+        tenant = _current_tenant.get()
+        if not tenant:
+            return func(*args, **kwargs)
+        tenant_stats[tenant]["redis_commands"] += 1
+        prefix = tenant + ":"
+        args, kwargs = _rewrite(name, prefix, args, kwargs)
+        return _strip(name, prefix, func(*args, **kwargs))
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Test jalan tanpa Redis: semua modul bot memakai MemoryStorage
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+# Client storage dibungkus TracedRedis supaya budget round-trip bisa dicek
+os.environ.setdefault("REDIS_TRACE", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
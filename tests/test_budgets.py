@@ -0,0 +1,89 @@
+"""Budget round-trip Redis per update untuk handler hot path (lihat tracing.py)."""
+import asyncio
+import itertools
+from types import SimpleNamespace
+import pytest
+import main
+import relay
+from utils import r
+from matcher import match_once
+from tracing import check_budgets, reset_trace, get_trace_report
+
+# Round-trip maksimum per update; naikkan hanya dengan alasan jelas
+BUDGETS = {
+    "search": 10,
+    "forward_to_partner": 10,
+    "stop": 9,
+}
+
+_ids = itertools.count(1)
+
+class FakeBot:
+    """context.bot palsu: semua panggilan API berhasil tanpa jaringan"""
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        async def api_call(*args, **kwargs):
+            return SimpleNamespace(message_id=next(_ids))
+        return api_call
+
+class FakeMessage:
+    def __init__(self, user_id: int, text: str):
+        self.chat_id = user_id
+        self.text = text
+        self.caption = None
+        self.photo = []
+        self.voice = None
+        self.sticker = None
+        self.document = None
+        self.media_group_id = None
+
+    async def reply_text(self, text, **kwargs):
+        return SimpleNamespace(message_id=next(_ids))
+
+def make_update(user_id: int, text: str):
+    message = FakeMessage(user_id, text)
+    return SimpleNamespace(
+        update_id=next(_ids),
+        effective_user=SimpleNamespace(id=user_id, first_name="test", username=None),
+        effective_chat=SimpleNamespace(id=user_id),
+        message=message,
+        effective_message=message,
+        callback_query=None
+    )
+
+@pytest.fixture
+def context():
+    return SimpleNamespace(bot=FakeBot(), args=[], application=None)
+
+def run(handler, update, context):
+    asyncio.run(main.handler(handler)(update, context))
+
+async def _relay(context, updates):
+    for update in updates:
+        await main.handler(main.forward_to_partner)(update, context)
+    await relay.relay_outbox.drain(5)
+
+def test_hot_path_roundtrip_budgets(context):
+    r.flushdb()
+    reset_trace()
+    users = [10 ** 12 + i for i in range(20)]
+
+    for user_id in users:
+        run(main.search, make_update(user_id, "/search"), context)
+    matched, _ = match_once()
+    assert matched
+
+    paired = [pair["a"] for pair in matched] + [pair["b"] for pair in matched]
+    updates = [make_update(user_id, f"halo {i}") for i, user_id in enumerate(paired)]
+    asyncio.run(_relay(context, updates))
+
+    for pair in matched:
+        run(main.stop, make_update(pair["a"], "/stop"), context)
+
+    report = get_trace_report()
+    for handler in BUDGETS:
+        assert report[handler]["updates"] > 0, f"{handler} tidak jalan"
+    assert check_budgets(BUDGETS) == []
@@ -0,0 +1,179 @@
+"""Paritas MemoryStorage vs Redis (fakeredis): skenario yang sama harus
+memberi hasil yang sama di kedua backend."""
+import time
+import pytest
+from storage import MemoryStorage
+
+fakeredis = pytest.importorskip("fakeredis")
+
+@pytest.fixture
+def clients():
+    return MemoryStorage(), fakeredis.FakeRedis(decode_responses=True)
+
+def run_both(clients, scenario):
+    memory, redis_client = clients
+    return scenario(memory), scenario(redis_client)
+
+def assert_parity(clients, scenario):
+    memory_result, redis_result = run_both(clients, scenario)
+    assert memory_result == redis_result
+
+# --- sorted set ---
+def test_zset_add_flags_and_ranges(clients):
+    def scenario(c):
+        return [
+            c.zadd("z", {"a": 1, "b": 2, "c": 2, "d": 3}),
+            c.zadd("z", {"a": 5, "e": 0}, nx=True),
+            c.zadd("z", {"a": 4, "f": 9}, xx=True),
+            c.zadd("z", {"b": 7}, ch=True),
+            c.zrange("z", 0, -1, withscores=True),
+            c.zrange("z", 1, 2),
+            c.zrevrange("z", 0, 1, withscores=True),
+            c.zrange("z", -2, -1),
+            c.zcard("z"),
+            c.zscore("z", "b"),
+            c.zscore("z", "missing"),
+        ]
+    assert_parity(clients, scenario)
+
+def test_zset_score_ranges_with_ties(clients):
+    def scenario(c):
+        c.zadd("z", {f"m{i}": i // 3 for i in range(12)})
+        return [
+            c.zrangebyscore("z", 1, 2, withscores=True),
+            c.zrangebyscore("z", "(1", "+inf"),
+            c.zrangebyscore("z", "-inf", 2, start=1, num=3),
+            c.zrevrangebyscore("z", 3, 1),
+            c.zrevrangebyscore("z", "+inf", "(2", start=0, num=2, withscores=True),
+            c.zcount("z", "(0", 2),
+            c.zrevrank("z", "m4"),
+            c.zrevrank("z", "missing"),
+            c.zremrangebyscore("z", 0, "(1"),
+            c.zpopmin("z", 2),
+            c.zincrby("z", 2.5, "m5"),
+            c.zrem("z", "m5", "missing"),
+            c.zrange("z", 0, -1, withscores=True),
+        ]
+    assert_parity(clients, scenario)
+
+# --- stream & consumer group ---
+def test_stream_ranges_and_trim(clients):
+    def scenario(c):
+        ids = [c.xadd("s", {"n": i}, id=f"{1000 + i}-0") for i in range(10)]
+        return [
+            ids,
+            c.xlen("s"),
+            c.xrange("s", min="1003-0", max="1005-0"),
+            c.xrange("s", min="(1007-0", count=5),
+            c.xrevrange("s", count=2),
+            c.xtrim("s", maxlen=4, approximate=False),
+            c.xrange("s"),
+        ]
+    assert_parity(clients, scenario)
+
+def test_xreadgroup_pending_then_new(clients):
+    def scenario(c):
+        out = [c.xgroup_create("s", "g", id="0", mkstream=True)]
+        for i in range(5):
+            c.xadd("s", {"n": i}, id=f"{1000 + i}-0")
+        # Baru: dibaca sekali oleh c1, lalu tidak terlihat lagi dengan ">"
+        out.append(c.xreadgroup("g", "c1", {"s": ">"}, count=3))
+        out.append(c.xreadgroup("g", "c1", {"s": ">"}, count=10))
+        out.append(c.xreadgroup("g", "c1", {"s": ">"}, count=10))
+        # Pending milik c1 dibaca ulang dari "0"; consumer lain tidak melihatnya
+        out.append(c.xreadgroup("g", "c1", {"s": "0"}, count=10))
+        out.append(c.xreadgroup("g", "c2", {"s": "0"}, count=10))
+        out.append(c.xack("s", "g", "1000-0", "1001-0", "9999-0"))
+        out.append(c.xreadgroup("g", "c1", {"s": "0"}, count=2))
+        out.append(c.xreadgroup("g", "c1", {"s": "1002-0"}, count=10))
+        return out
+    assert_parity(clients, scenario)
+
+def test_xgroup_create_existing_group_is_busygroup(clients):
+    for c in clients:
+        c.xgroup_create("s", "g", id="0", mkstream=True)
+        with pytest.raises(Exception, match="BUSYGROUP"):
+            c.xgroup_create("s", "g", id="0", mkstream=True)
+
+# --- TTL ---
+def test_ttl_semantics(clients):
+    def scenario(c):
+        c.set("plain", 1)
+        c.set("ex", 1, ex=100)
+        c.set("setex", 1, ex=50)
+        c.set("nx", 1, nx=True, ex=30)
+        c.hset("h", "f", 1)
+        c.expire("h", 60)
+        return [
+            c.ttl("plain"),
+            c.ttl("missing"),
+            c.ttl("ex"),
+            c.ttl("setex"),
+            c.ttl("nx"),
+            c.ttl("h"),
+            c.persist("h"),
+            c.ttl("h"),
+            c.expire("missing", 10),
+            c.set("ex", 2),
+            c.ttl("ex"),
+        ]
+    assert_parity(clients, scenario)
+
+def test_expired_keys_disappear(clients):
+    def scenario(c):
+        c.set("short", 1, px=30)
+        c.sadd("set", "a")
+        c.pexpire("set", 30)
+        c.set("long", 1, ex=100)
+        time.sleep(0.08)
+        return [c.get("short"), c.exists("short", "set", "long"), c.smembers("set"), sorted(c.keys("*"))]
+    assert_parity(clients, scenario)
+
+def test_pttl_close(clients):
+    for c in clients:
+        c.set("k", 1, px=5000)
+    memory, redis_client = clients
+    assert abs(memory.pttl("k") - redis_client.pttl("k")) < 100
+
+# --- lain-lain ---
+def test_scan_and_pipeline(clients):
+    def scenario(c):
+        for i in range(30):
+            c.set(f"user:{i}:premium", 1)
+        c.set("other", 1)
+        pipe = c.pipeline(transaction=False)
+        pipe.incr("counter").incr("counter").get("counter").hset("h", mapping={"a": 1, "b": 2}).hgetall("h")
+        return [sorted(c.scan_iter(match="user:*:premium", count=7)), pipe.execute()]
+    assert_parity(clients, scenario)
+
+def test_hyperloglog_counts(clients):
+    def scenario(c):
+        c.pfadd("hll", *range(1000))
+        c.pfadd("hll2", *range(500, 1500))
+        return round(c.pfcount("hll") / 100), round(c.pfcount("hll", "hll2") / 100)
+    assert_parity(clients, scenario)
+
+def test_scan_survives_deletes_during_iteration(clients):
+    def scenario(c):
+        for i in range(50):
+            c.set(f"k{i}", 1)
+        seen, cursor = set(), None
+        while cursor != 0:
+            cursor, names = c.scan(cursor or 0, count=7)
+            seen.update(names)
+            # Hapus key yang sudah terlihat: key sisanya tetap harus muncul
+            if names:
+                c.delete(*names)
+        return sorted(seen)
+    assert_parity(clients, scenario)
+
+def test_expiry_sweep_without_reads():
+    memory = MemoryStorage()
+    for i in range(200):
+        memory.set(f"short{i}", 1, px=1)
+    memory.set("long", 1, ex=100)
+    time.sleep(0.01)
+    for i in range(2000):
+        memory.set(f"plain{i}", 1)
+    # Sweep aktif membuang key expire yang tidak pernah dibaca lagi
+    assert list(memory._expires) == ["long"]
@@ -0,0 +1,23 @@
+"""NamespacedRedis: command dengan key diberi prefix tenant aktif."""
+from storage import MemoryStorage
+from tenancy import NamespacedRedis, tenant_context
+
+def test_scan_prefixes_match_and_strips_keys():
+    memory = MemoryStorage()
+    client = NamespacedRedis(memory)
+    for i in range(25):
+        memory.set(f"id:user:{i}:premium", 1)
+        memory.set(f"my:user:{i}:premium", 1)
+    memory.set("id:session:1:2", 1)
+
+    with tenant_context("id"):
+        seen, cursor = [], None
+        while cursor != 0:
+            cursor, keys = client.scan(cursor or 0, match="user:*", count=7)
+            seen.extend(keys)
+        positional = client.scan(0, "session:*", 100)
+        every = client.scan(0, count=100)[1]
+
+    assert sorted(seen) == sorted(f"user:{i}:premium" for i in range(25))
+    assert positional == (0, ["session:1:2"])
+    assert len(every) == 26 and not any(key.startswith("id:") for key in every)
@@ -0,0 +1,182 @@
+import re
+import time
+import logging
+import functools
+from collections import defaultdict, deque, Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, List
+from config import REDIS_TRACE, REDIS_TRACE_SLOW_MS, REDIS_TRACE_SLOW_LOG_SIZE
+from storage import ClientProxy, PipelineProxy
+
+logger = logging.getLogger(__name__)
+
+# Handler & update yang sedang diproses (per task asyncio)
+_current_handler: ContextVar[Optional[str]] = ContextVar("trace_handler", default=None)
+_current_update: ContextVar[Optional[int]] = ContextVar("trace_update", default=None)
+_current_counter: ContextVar[Optional[list]] = ContextVar("trace_counter", default=None)
+
+# Segmen key yang mengandung angka dianggap ID, mis. user:123:premium -> user:*:premium
+_ID_SEGMENT = re.compile(r"[^:{}]*\d[^:{}]*")
+
+_stats = defaultdict(lambda: {
+    "updates": 0,
+    "roundtrips": 0,
+    "max_per_update": 0,
+    "time": 0.0,
+    "commands": Counter()
+})
+_slow_log = deque(maxlen=REDIS_TRACE_SLOW_LOG_SIZE)
+
+def key_pattern(key) -> str:
+    """Ubah nama key jadi pola tanpa ID"""
+    if not isinstance(key, str):
+        return "-"
+    return _ID_SEGMENT.sub("*", key)
+
+def _record(command: str, keys: List[str], duration: float):
+    """Catat satu round-trip ke Redis"""
+    handler = _current_handler.get() or "-"
+    stats = _stats[handler]
+    stats["roundtrips"] += 1
+    stats["time"] += duration
+    for name, key in keys:
+        stats["commands"][f"{name} {key_pattern(key)}"] += 1
+
+    counter = _current_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+    duration_ms = duration * 1000
+    if duration_ms >= REDIS_TRACE_SLOW_MS:
+        entry = {
+            "ts": int(time.time()),
+            "handler": handler,
+            "update_id": _current_update.get(),
+            "command": command,
+            "pattern": key_pattern(keys[0][1]) if keys else "-",
+            "ms": round(duration_ms, 2)
+        }
+        _slow_log.append(entry)
+        logger.warning(f"Slow Redis command: {entry}")
+
+class _TracedPipeline(PipelineProxy):
+    """Pipeline Redis yang dicatat sebagai satu round-trip saat execute()"""
+
+    def __init__(self, pipe, parent):
+        super().__init__(pipe, parent)
+        self._queued = []
+
+    def _queue(self, name: str, func, args: tuple, kwargs: dict):
+        self._queued.append((name.upper(), args[0] if args else None))
+        return func(*args, **kwargs)
+
+    def execute(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._pipe.execute(*args, **kwargs)
+        finally:
+            _record("PIPELINE", self._queued, time.perf_counter() - start)
+            self._queued = []
+
+class TracedRedis(ClientProxy):
+    """Proxy tipis di atas client Redis yang mencatat setiap command"""
+    pipeline_class = _TracedPipeline
+
+    def _call(self, name: str, func, args: tuple, kwargs: dict):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            command = name.upper()
+            _record(command, [(command, args[0] if args else None)], time.perf_counter() - start)
+
+@contextmanager
+def trace_context(handler: str, update_id: Optional[int] = None):
+    """Tandai semua command Redis di dalam blok dengan nama handler & update id"""
+    counter = [0]
+    tokens = (
+        _current_handler.set(handler),
+        _current_update.set(update_id),
+        _current_counter.set(counter)
+    )
+    try:
+        yield
+    finally:
+        _current_counter.reset(tokens[2])
+        _current_update.reset(tokens[1])
+        _current_handler.reset(tokens[0])
+
+        stats = _stats[handler]
+        stats["updates"] += 1
+        stats["max_per_update"] = max(stats["max_per_update"], counter[0])
+
+def traced_handler(func):
+    """Decorator handler PTB: tag command Redis dengan nama handler & update id"""
+    if not REDIS_TRACE:
+        return func
+
+    @functools.wraps(func)
+    async def wrapper(update, context):
+        with trace_context(func.__name__, getattr(update, "update_id", None)):
+            return await func(update, context)
+    return wrapper
+
+def get_trace_report() -> dict:
+    """Ringkasan command Redis per handler"""
+    report = {}
+    for handler, stats in _stats.items():
+        updates = stats["updates"]
+        report[handler] = {
+            "updates": updates,
+            "roundtrips": stats["roundtrips"],
+            "avg_per_update": round(stats["roundtrips"] / updates, 2) if updates else 0,
+            "max_per_update": stats["max_per_update"],
+            "total_ms": round(stats["time"] * 1000, 2),
+            "commands": dict(stats["commands"].most_common())
+        }
+    return report
+
+def get_slow_commands() -> List[dict]:
+    """Daftar command Redis yang lebih lambat dari REDIS_TRACE_SLOW_MS"""
+    return list(_slow_log)
+
+def check_budgets(budgets: dict) -> List[str]:
+    """Cek budget round-trip per update, return daftar pelanggaran (untuk CI)"""
+    violations = []
+    for handler, budget in budgets.items():
+        worst = _stats[handler]["max_per_update"] if handler in _stats else 0
+        if worst > budget:
+            violations.append(f"{handler}: {worst} round-trip per update (budget {budget})")
+    return violations
+
+def format_trace_report(top: int = 5) -> str:
+    """Format laporan tracing untuk dikirim ke admin"""
+    report = get_trace_report()
+    if not report:
+        return "Belum ada command Redis yang tercatat."
+
+    lines = []
+    ordered = sorted(report.items(), key=lambda item: item[1]["roundtrips"], reverse=True)
+    for handler, stats in ordered:
+        lines.append(
+            f"{handler}: {stats['updates']} update, {stats['roundtrips']} round-trip "
+            f"(avg {stats['avg_per_update']}, max {stats['max_per_update']}, {stats['total_ms']} ms)"
+        )
+        for command, count in list(stats["commands"].items())[:top]:
+            lines.append(f"  {command}: {count}")
+
+    slow = get_slow_commands()
+    if slow:
+        lines.append(f"\nSlow commands (>= {REDIS_TRACE_SLOW_MS} ms):")
+        for entry in slow[-top:]:
+            lines.append(
+                f"  {entry['command']} {entry['pattern']} {entry['ms']} ms "
+                f"({entry['handler']}, update {entry['update_id']})"
+            )
+    return "\n".join(lines)
+
+def reset_trace():
+    """Reset semua statistik tracing"""
+    _stats.clear()
+    _slow_log.clear()
@@ -3,16 +3,34 @@ import unicodedata
 import time
 import random
 import string
-from typing import Optional, List
-import redis
+from typing import Optional, List, Tuple
 from config import (
-    REDIS_URL, BAD_WORDS, DANGEROUS_EXTENSIONS, 
+    BAD_WORDS, DANGEROUS_EXTENSIONS, 
     RATE_LIMIT_WINDOW, RATE_LIMIT_MAX_MSGS,
-    AUTO_BAN_REPORTS, REPORT_WINDOW
+    AUTO_BAN_REPORTS, REPORT_WINDOW, REDIS_TRACE, BANNED_PAGE_SIZE, BREAKER_ENABLED, BOT_TOKENS,
+    SESSION_TTL
 )
+from tracing import TracedRedis
+from breaker import BreakerRedis, storage_breaker
+from tenancy import NamespacedRedis
+from keyschema import (
+    rate_key, search_cooldown_key, payment_key, payment_pointer_key, reports_key,
+    banned_key, premium_key, gender_key, interests_key, chat_count_key,
+    session_pointer_key, queue_keys, active_users_keys, active_users_key_for, QUEUES,
+    user_id_from_key, PREMIUM_PATTERN, BANNED_PATTERN, CHAT_COUNT_PATTERN, SESSION_PATTERN,
+    BANNED_INDEX, BANNED_BY, STATS_SESSIONS, STATS_PREMIUM, STATS_USERS, STATS_INDEXED
+)
+from storage import create_client
 
-# Redis client dengan support localhost & production
-r = redis.from_url(REDIS_URL, decode_responses=True)
+# Client storage: Redis (localhost & production) atau in-memory, lihat STORAGE_BACKEND
+r = create_client()
+if REDIS_TRACE:
+    r = TracedRedis(r)
+if BREAKER_ENABLED:
+    r = BreakerRedis(r, storage_breaker)
+# Multi-bot: satu client (satu connection pool) untuk semua bot, key per tenant
+if BOT_TOKENS:
+    r = NamespacedRedis(r)
 
 def normalize_text(text: str) -> str:
     """Normalize text untuk deteksi kata kasar yang di-obfuscate"""
@@ -54,7 +72,7 @@ def is_dangerous_file(filename: str) -> bool:
 
 def is_rate_limited(user_id: int) -> bool:
     """Check apakah user sedang rate limited"""
-    key = f"rate:{user_id}"
+    key = rate_key(user_id)
     now = int(time.time())
     
     # Remove old entries
@@ -73,7 +91,7 @@ def is_rate_limited(user_id: int) -> bool:
 
 def is_search_cooldown(user_id: int, cooldown: int = 3) -> bool:
     """Check apakah user masih dalam cooldown /search"""
-    key = f"cooldown:search:{user_id}"
+    key = search_cooldown_key(user_id)
     if r.exists(key):
         return True
     r.setex(key, cooldown, "1")
@@ -86,7 +104,7 @@ def generate_payment_code() -> str:
 def create_payment_code(user_id: int, days: int, amount: int) -> str:
     """Create dan simpan kode pembayaran untuk user"""
     code = f"PAY-{generate_payment_code()}"
-    key = f"payment:{code}"
+    key = payment_key(code)
     
     r.hset(key, mapping={
         "user_id": user_id,
@@ -95,12 +113,18 @@ def create_payment_code(user_id: int, days: int, amount: int) -> str:
         "created_at": int(time.time())
     })
     r.expire(key, 3600)  # Expire dalam 1 jam
+    # Pointer per user supaya verifikasi tidak perlu scan semua payment:*
+    r.setex(payment_pointer_key(user_id), 3600, code)
     
     return code
 
+def get_user_payment_code(user_id: int) -> Optional[str]:
+    """Kode pembayaran aktif milik user (kalau ada)"""
+    return r.get(payment_pointer_key(user_id))
+
 def verify_payment_code(code: str) -> Optional[dict]:
     """Verify dan retrieve payment code data"""
-    key = f"payment:{code}"
+    key = payment_key(code)
     if not r.exists(key):
         return None
     
@@ -116,12 +140,15 @@ def verify_payment_code(code: str) -> Optional[dict]:
 
 def delete_payment_code(code: str):
     """Delete payment code setelah diverifikasi"""
-    key = f"payment:{code}"
+    key = payment_key(code)
+    user_id = r.hget(key, "user_id")
     r.delete(key)
+    if user_id:
+        r.delete(payment_pointer_key(user_id))
 
 def add_report(user_id: int, reporter_id: int) -> int:
     """Add report untuk user, return jumlah report dalam 24 jam"""
-    key = f"reports:{user_id}"
+    key = reports_key(user_id)
     now = int(time.time())
     
     # Remove old reports (lebih dari 24 jam)
@@ -134,34 +161,110 @@ def add_report(user_id: int, reporter_id: int) -> int:
     # Count total reports
     return r.zcard(key)
 
-def ban_user(user_id: int, reason: str = "Multiple reports"):
-    """Ban user"""
-    r.set(f"user:{user_id}:banned", reason)
+def ban_user(user_id: int, reason: str = "Multiple reports", banned_by: str = "system"):
+    """Ban user dan catat di index banned (waktu ban + siapa yang ban)"""
+    pipe = r.pipeline(transaction=False)
+    pipe.set(banned_key(user_id), reason)
+    pipe.zadd(BANNED_INDEX, {user_id: int(time.time() * 1000)})
+    pipe.hset(BANNED_BY, user_id, banned_by)
+    pipe.execute()
 
 def is_banned(user_id: int) -> bool:
     """Check apakah user dibanned"""
-    return r.exists(f"user:{user_id}:banned")
+    return r.exists(banned_key(user_id))
 
 def unban_user(user_id: int):
     """Unban user"""
-    r.delete(f"user:{user_id}:banned")
-    r.delete(f"reports:{user_id}")
+    pipe = r.pipeline(transaction=False)
+    pipe.delete(banned_key(user_id))
+    pipe.delete(reports_key(user_id))
+    pipe.zrem(BANNED_INDEX, user_id)
+    pipe.hdel(BANNED_BY, user_id)
+    pipe.execute()
+
+def get_banned_page(cursor: Optional[str] = None, limit: int = BANNED_PAGE_SIZE) -> Tuple[List[dict], Optional[str]]:
+    """Satu halaman user banned, terbaru dulu.
+
+    cursor = "<score>:<user_id>" dari entry terakhir halaman sebelumnya, jadi
+    halaman tetap stabil walau ada ban baru. Return (entries, cursor berikutnya).
+    """
+    if cursor:
+        last_score, last_id = cursor.split(":")
+        pipe = r.pipeline(transaction=False)
+        pipe.zrevrank(BANNED_INDEX, last_id)
+        pipe.zscore(BANNED_INDEX, last_id)
+        rank, score = pipe.execute()
+        if rank is not None and int(score) == int(last_score):
+            # Entry terakhir masih di posisinya: lanjut tepat setelahnya, O(log n + halaman)
+            rows = r.zrevrange(BANNED_INDEX, rank + 1, rank + 1 + limit, withscores=True)
+        else:
+            # Entry terakhir sudah di-unban: lanjut dari score-nya. Score sama diurutkan
+            # leksikografis menurun, sisa entry seri = member < last_id (jarang, lihat
+            # rebuild_banned_index)
+            ties = r.zrevrangebyscore(BANNED_INDEX, last_score, last_score, withscores=True)
+            rows = [(member, score) for member, score in ties if member < last_id][:limit + 1]
+            if len(rows) <= limit:
+                rows += r.zrevrangebyscore(
+                    BANNED_INDEX, f"({last_score}", "-inf", start=0, num=limit + 1 - len(rows), withscores=True
+                )
+    else:
+        rows = r.zrevrange(BANNED_INDEX, 0, limit, withscores=True)
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not rows:
+        return [], None
+
+    pipe = r.pipeline(transaction=False)
+    for member, _ in rows:
+        pipe.get(banned_key(member))
+    pipe.hmget(BANNED_BY, [member for member, _ in rows])
+    results = pipe.execute()
+    banned_by = results[-1]
+
+    entries = [
+        {"user_id": member, "banned_at": int(score) // 1000, "reason": results[i] or "-", "banned_by": banned_by[i] or "-"}
+        for i, (member, score) in enumerate(rows)
+    ]
+    next_cursor = f"{int(rows[-1][1])}:{rows[-1][0]}" if has_more else None
+    return entries, next_cursor
+
+def rebuild_banned_index() -> int:
+    """Isi index banned dari key user:*:banned (sekali, untuk data lama).
+
+    Waktu ban asli tidak diketahui; tiap entry dapat score berbeda (mundur 1 ms)
+    supaya paging tidak perlu menyaring ribuan entry seri.
+    """
+    now = int(time.time() * 1000)
+    added = 0
+    batch = {}
+    for key in r.scan_iter(match=BANNED_PATTERN, count=1000):
+        user_id = user_id_from_key(key)
+        if user_id:
+            now -= 1
+            batch[user_id] = now
+        if len(batch) >= 1000:
+            added += r.zadd(BANNED_INDEX, batch, nx=True)
+            batch = {}
+    if batch:
+        added += r.zadd(BANNED_INDEX, batch, nx=True)
+    return added
 
 def get_active_users(hours: int = 24) -> List[int]:
     """Get list user ID yang aktif dalam X jam terakhir"""
-    key = "active_users"
     now = int(time.time())
     cutoff = now - (hours * 3600)
     
-    # Get users aktif
-    user_ids = r.zrangebyscore(key, cutoff, now)
+    # Get users aktif (dari semua shard)
+    user_ids = []
+    for key in active_users_keys():
+        user_ids.extend(r.zrangebyscore(key, cutoff, now))
     return [int(uid) for uid in user_ids]
 
 def update_user_activity(user_id: int):
     """Update last activity user"""
-    key = "active_users"
     now = int(time.time())
-    r.zadd(key, {user_id: now})
+    r.zadd(active_users_key_for(user_id), {user_id: now})
 
 def get_free_users() -> List[int]:
     """Get list user yang tidak punya premium"""
@@ -169,7 +272,7 @@ def get_free_users() -> List[int]:
     free_users = []
     
     for user_id in active_users:
-        if not r.exists(f"user:{user_id}:premium"):
+        if not r.exists(premium_key(user_id)):
             free_users.append(user_id)
     
     return free_users
@@ -177,45 +280,82 @@ def get_free_users() -> List[int]:
 def get_user_stats(user_id: int) -> dict:
     """Get statistics untuk user"""
     stats = {
-         "total_chats": int(r.get(f"stats:{user_id}:total_chats") or 0),
-         "premium": r.exists(f"user:{user_id}:premium"),
-         "gender": r.get(f"user:{user_id}:gender") or "not_set",
-         "interests": r.smembers(f"user:{user_id}:interests") or set()
+         "total_chats": int(r.get(chat_count_key(user_id)) or 0),
+         "premium": r.exists(premium_key(user_id)),
+         "gender": r.get(gender_key(user_id)) or "not_set",
+         "interests": r.smembers(interests_key(user_id)) or set()
     }
     
     if stats["premium"]:
-        ttl = r.ttl(f"user:{user_id}:premium")
+        ttl = r.ttl(premium_key(user_id))
         stats["premium_days_left"] = ttl // 86400 if ttl > 0 else 0
     
     return stats
 
 def increment_chat_count(user_id: int):
     """Increment total chat count untuk user"""
-    key = f"stats:{user_id}:total_chats"
+    key = chat_count_key(user_id)
     r.incr(key)
 
+def set_premium(user_id: int, days: int):
+    """Beri premium `days` hari + catat di index /adminstats"""
+    pipe = r.pipeline(transaction=False)
+    pipe.setex(premium_key(user_id), days * 86400, "1")
+    pipe.zadd(STATS_PREMIUM, {user_id: int(time.time()) + days * 86400})
+    pipe.pfadd(STATS_USERS, user_id)
+    pipe.execute()
+
+def end_session(session_key: str, *user_ids: int):
+    """Hapus session + pointer user-nya dalam satu round trip"""
+    pipe = r.pipeline(transaction=False)
+    pipe.delete(session_key, *(session_pointer_key(user_id) for user_id in user_ids))
+    pipe.zrem(STATS_SESSIONS, session_key)
+    pipe.execute()
+
+def rebuild_stats_indexes() -> dict:
+    """Isi index /adminstats dari key lama (sekali, lewat SCAN).
+
+    Waktu mulai session lama tidak diketahui; dicatat sekarang, jadi session
+    yang sudah expire terhapus dari index paling lambat SESSION_TTL lagi.
+    """
+    now = int(time.time())
+    counts = {"sessions": 0, "premium": 0}
+    for key in r.scan_iter(match=SESSION_PATTERN, count=1000):
+        counts["sessions"] += r.zadd(STATS_SESSIONS, {key: now}, nx=True)
+    for key in r.scan_iter(match=PREMIUM_PATTERN, count=1000):
+        user_id = user_id_from_key(key)
+        ttl = r.ttl(key)
+        if user_id and ttl > 0:
+            counts["premium"] += r.zadd(STATS_PREMIUM, {user_id: now + ttl}, nx=True)
+            r.pfadd(STATS_USERS, user_id)
+    for key in r.scan_iter(match=CHAT_COUNT_PATTERN, count=1000):
+        user_id = user_id_from_key(key)
+        if user_id:
+            r.pfadd(STATS_USERS, user_id)
+    r.set(STATS_INDEXED, now)
+    return counts
+
 def get_global_stats() -> dict:
-    """Get global statistics (untuk admin)"""
-    all_users = r.keys("user:*:premium") + r.keys("stats:*:total_chats")
-    unique_users = set()
-    
-    for key in all_users:
-        parts = key.split(":")
-        if len(parts) >= 2 and parts[1].isdigit():
-            unique_users.add(parts[1])
-    
-    active_sessions = len(r.keys("session:*"))
-    queue_free = r.llen("queue:free")
-    queue_premium_male = r.llen("queue:premium:male")
-    queue_premium_female = r.llen("queue:premium:female")
-    
-    total_premium = len(r.keys("user:*:premium"))
-    total_banned = len(r.keys("user:*:banned"))
-    
+    """Get global statistics (untuk admin), satu round trip dari index"""
+    now = int(time.time())
+    pipe = r.pipeline(transaction=False)
+    # Buang entry yang sudah expire (session/premium habis tanpa lewat end_session)
+    pipe.zremrangebyscore(STATS_SESSIONS, "-inf", now - SESSION_TTL)
+    pipe.zremrangebyscore(STATS_PREMIUM, "-inf", now)
+    pipe.pfcount(STATS_USERS)
+    pipe.zcard(STATS_SESSIONS)
+    pipe.zcard(STATS_PREMIUM)
+    pipe.zcard(BANNED_INDEX)
+    for queue in QUEUES:
+        for key in queue_keys(queue):
+            pipe.zcard(key)
+    results = pipe.execute()
+    total_users, active_sessions, total_premium, total_banned = results[2:6]
+
     return {
-        "total_users": len(unique_users),
+        "total_users": total_users,
         "active_sessions": active_sessions,
-        "queue_waiting": queue_free + queue_premium_male + queue_premium_female,
+        "queue_waiting": sum(results[6:]),
         "total_premium": total_premium,
         "total_banned": total_banned
     }